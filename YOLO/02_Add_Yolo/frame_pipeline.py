@@ -0,0 +1,276 @@
+"""
+프레임 파이프라인 엔진 (캡처 -> 추론 -> 후처리 -> 그리기 -> 인코딩)
+
+- 단계마다 전용 스레드, 단계 사이는 크기 제한 큐로 연결
+  -> 한 프레임의 인코딩이 다음 프레임의 추론과 겹쳐서, 처리량이 단계 시간의 합이 아니라 가장 느린 단계에 가까워진다.
+- 큐가 가득 찼을 때 정책
+  - "block": 앞 단계가 기다림 (역압)
+  - "drop_oldest": 가장 오래된 항목을 버림 (라이브 유지)
+- 보통 캡처 바로 뒤 큐만 drop_oldest 로 두면, 뒤쪽이 밀릴 때 역압이 캡처 앞까지 전달되고 거기서 오래된 프레임이 버려진다.
+- FramePool 로 캡처 버퍼를 재사용하면 (cap.read(image=...)) 정상 상태에서 프레임 크기 할당이 거의 없다.
+  소비자가 다음 항목을 꺼낼 때, 또는 중간에 버려질 때 Packet.release() 로 버퍼가 풀에 돌아간다.
+
+사용 예:
+    pipeline = FramePipeline(capture_frames, [
+        Stage("infer", infer_stage, policy="drop_oldest"),
+        Stage("render", render_stage),
+        Stage("encode", encode_stage),
+    ]).start()
+    try:
+        for packet in pipeline:
+            ...
+    finally:
+        pipeline.close()
+"""
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop_oldest")
+_END = object()  # 스트림 끝 표시 (단계를 따라 끝까지 전달된다)
+
+
+class FramePool:
+    """
+    스트림별 캡처 프레임 버퍼 풀 (cap.read(image=...) 로 채워서 프레임마다 새로 할당하지 않는다)
+    해상도가 바뀌면 이전 버퍼는 버린다. max_free 개 넘게 반납되면 나머지는 버린다.
+    """
+
+    def __init__(self, max_free=16):
+        self.max_free = max_free
+        self.shape = None
+        self.allocated = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """재사용할 버퍼 (아직 해상도를 모르면 None)"""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            if self.shape is None:
+                return None
+            self.allocated += 1
+            shape = self.shape
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer):
+        with self._lock:
+            if buffer.shape != self.shape:
+                self.shape = buffer.shape
+                self._free.clear()
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+    def read(self, cap):
+        """풀 버퍼로 cap.read() -> (ret, frame) (HlsCapture 처럼 image 를 무시하는 캡처도 그대로 동작)"""
+        buffer = self.acquire()
+        ret, frame = cap.read(buffer) if buffer is not None else cap.read()
+        if buffer is not None and (not ret or frame is not buffer):
+            self.release(buffer)
+        return ret, frame
+
+
+class Packet:
+    """
+    단계 사이를 흐르는 프레임 하나 (각 단계가 필요한 필드를 붙인다: detections, jpeg, ...)
+    pool 이 있으면 처음 받은 frame 버퍼를 release() 때 풀에 돌려준다 (이후 frame 을 쓰면 안 된다).
+    """
+
+    def __init__(self, frame, captured_at=None, pool=None, **fields):
+        self.frame = frame
+        self.captured_at = time.time() if captured_at is None else captured_at
+        self._pool = pool
+        self._buffer = frame if pool is not None else None
+        self.__dict__.update(fields)
+
+    def release(self):
+        if self._buffer is not None:
+            self._pool.release(self._buffer)
+            self._buffer = None
+
+
+class Stage:
+    """
+    파이프라인 단계 하나
+
+    fn: Packet -> Packet (None 을 반환하면 그 프레임은 여기서 버림)
+    maxsize: 이 단계 입력 큐 크기
+    policy: 입력 큐가 가득 찼을 때 "block" 또는 "drop_oldest"
+    """
+
+    def __init__(self, name, fn, maxsize=2, policy="block"):
+        if policy not in POLICIES:
+            raise ValueError(f"policy 는 {POLICIES} 중 하나: {policy}")
+        self.name = name
+        self.fn = fn
+        self.maxsize = maxsize
+        self.policy = policy
+        self.processed = 0
+        self.dropped = 0      # 입력 큐에서 버려진 프레임 수 (drop_oldest)
+        self.errors = 0
+        self.busy_sec = 0.0
+
+    def stats(self):
+        return {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "avg_ms": round(self.busy_sec / self.processed * 1000, 2) if self.processed else None,
+        }
+
+
+class FramePipeline:
+    """
+    source: Packet 을 만드는 제너레이터 함수 (캡처 단계, 전용 스레드에서 실행)
+            연결 실패/재시도 중에는 None 을 yield 하면 그때마다 중지 요청을 확인한다.
+    stages: [Stage, ...] 순서대로 실행
+    output_size / output_policy: 마지막 단계와 소비자(HTTP 응답) 사이 큐
+    cancel: 외부 중지 요청 이벤트 (set 되면 프레임이 안 나와도 __iter__ 가 끝난다, 정리는 close())
+    """
+
+    def __init__(self, source, stages, name="pipeline", output_size=2, output_policy="block", cancel=None):
+        if output_policy not in POLICIES:
+            raise ValueError(f"output_policy 는 {POLICIES} 중 하나: {output_policy}")
+        self.source = source
+        self.stages = list(stages)
+        self.name = name
+        self.captured = 0
+        self._policies = [stage.policy for stage in self.stages] + [output_policy]
+        self._queues = [queue.Queue(maxsize=stage.maxsize) for stage in self.stages]
+        self._queues.append(queue.Queue(maxsize=output_size))
+        self._stop_event = threading.Event()
+        self._cancel = cancel
+        self._threads = []
+        self._output_dropped = 0
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._run_source, daemon=True,
+                                              name=f"{self.name}-capture"))
+        for index, stage in enumerate(self.stages):
+            self._threads.append(threading.Thread(target=self._run_stage, args=(index,), daemon=True,
+                                                  name=f"{self.name}-{stage.name}"))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __iter__(self):
+        """마지막 단계 결과를 순서대로 꺼낸다 (스트림이 끝나거나 close() 되면 종료)"""
+        output = self._queues[-1]
+        while not self._stop_event.is_set():
+            if self._cancel is not None and self._cancel.is_set():
+                return
+            try:
+                packet = output.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if packet is _END:
+                return
+            try:
+                yield packet
+            finally:
+                packet.release()
+
+    def close(self, timeout=2.0):
+        """모든 단계 스레드 종료 요청 (캡처가 read() 에서 막혀 있으면 기다리지 않는다)"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        deadline = time.time() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.time()))
+        for pending in self._queues:
+            while True:
+                try:
+                    packet = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if packet is not _END:
+                    packet.release()
+        logger.info(f"{self.name} 종료: {self.stats()}")
+
+    def stats(self):
+        stages = {"capture": {"processed": self.captured}}
+        for stage in self.stages:
+            stages[stage.name] = stage.stats()
+        stages["output"] = {"dropped": self._output_dropped}
+        return stages
+
+    # ----------------------------
+    # 내부
+    # ----------------------------
+    def _put(self, index, item):
+        """index 번째 큐에 넣기 (정책에 따라 대기 또는 가장 오래된 항목 버림), 중지되면 False"""
+        target = self._queues[index]
+        policy = self._policies[index]
+        while not self._stop_event.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if policy != "drop_oldest":
+                    continue
+                try:
+                    dropped = target.get_nowait()
+                except queue.Empty:
+                    continue
+                if dropped is not _END:
+                    dropped.release()
+                if index < len(self.stages):
+                    self.stages[index].dropped += 1
+                else:
+                    self._output_dropped += 1
+        return False
+
+    def _run_source(self):
+        frames = self.source()
+        try:
+            for packet in frames:
+                if packet is None:
+                    if self._stop_event.is_set():
+                        break
+                    continue
+                self.captured += 1
+                if not self._put(0, packet):
+                    packet.release()
+                    break
+        except Exception as e:
+            logger.error(f"{self.name} 캡처 단계 오류: {e}")
+        finally:
+            frames.close()
+            self._put(0, _END)
+
+    def _run_stage(self, index):
+        stage = self.stages[index]
+        source = self._queues[index]
+        while not self._stop_event.is_set():
+            try:
+                packet = source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if packet is _END:
+                self._put(index + 1, _END)
+                return
+
+            started = time.perf_counter()
+            try:
+                result = stage.fn(packet)
+            except Exception as e:
+                stage.errors += 1
+                logger.error(f"{self.name} {stage.name} 단계 오류: {e}")
+                packet.release()
+                continue
+            finally:
+                stage.busy_sec += time.perf_counter() - started
+            stage.processed += 1
+
+            if result is None:
+                packet.release()
+            elif not self._put(index + 1, result):
+                result.release()
+                return
@@ -0,0 +1,283 @@
+"""
+오프라인 배치 처리 공용 모듈 (batch_process.py 에서 사용)
+
+- 입력: 동영상 파일 / 이미지 디렉토리를 프레임 소스로 변환
+- 병렬 디코딩: 소스마다 리더 스레드가 크기 제한 큐로 미리 디코딩 (이미지는 스레드 풀로 동시 디코딩)
+  큐는 프레임 수(prefetch)와 바이트(max_bytes) 둘 다로 제한 -> 동시에 도는 리더 (read_ahead + 1)개 x 제한이 메모리 상한
+- 출력: 프레임별 결과를 JSONL 또는 Parquet 으로 기록
+"""
+import json
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTS = {".mp4", ".avi", ".mkv", ".mov", ".ts", ".m4v", ".webm"}
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+_END = object()  # 리더 스레드 종료 표시
+
+
+class FrameSource:
+    """동영상 파일 하나 또는 이미지 디렉토리 하나"""
+
+    def __init__(self, path, kind, images=None):
+        self.path = Path(path)
+        self.kind = kind            # "video" / "images"
+        self.images = images or []  # kind == "images" 일 때 정렬된 파일 목록
+        self.name = self.path.stem if kind == "video" else self.path.name
+
+    def __repr__(self):
+        return f"FrameSource({self.kind}: {self.path})"
+
+
+def discover_sources(paths):
+    """명령행 경로 목록을 FrameSource 목록으로 변환 (디렉토리는 동영상/이미지를 찾아 펼침)"""
+    sources = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_file():
+            if path.suffix.lower() in VIDEO_EXTS:
+                sources.append(FrameSource(path, "video"))
+            elif path.suffix.lower() in IMAGE_EXTS:
+                sources.append(FrameSource(path.parent, "images", [path]))
+            else:
+                logger.warning(f"지원하지 않는 파일 형식: {path}")
+        elif path.is_dir():
+            files = sorted(p for p in path.iterdir() if p.is_file())
+            videos = [p for p in files if p.suffix.lower() in VIDEO_EXTS]
+            images = [p for p in files if p.suffix.lower() in IMAGE_EXTS]
+            sources.extend(FrameSource(p, "video") for p in videos)
+            if images:
+                sources.append(FrameSource(path, "images", images))
+        else:
+            logger.warning(f"경로를 찾을 수 없습니다: {path}")
+    return sources
+
+
+def _read_video(source, stride):
+    """(프레임 번호, 시각(초), 프레임) 생성. 건너뛰는 프레임은 grab() 만 해서 디코딩 생략"""
+    cap = cv2.VideoCapture(str(source.path))
+    if not cap.isOpened():
+        raise IOError(f"동영상을 열 수 없습니다: {source.path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    index = 0
+    try:
+        while True:
+            if index % stride != 0:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, (index / fps if fps > 0 else None), frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def _read_images(source, stride, decode_workers):
+    """이미지 목록을 스레드 풀로 병렬 디코딩 (cv2.imread 는 GIL 을 놓는다)"""
+    files = source.images[::stride]
+    with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+        for i, frame in enumerate(pool.map(lambda p: cv2.imread(str(p)), files)):
+            if frame is None:
+                logger.warning(f"이미지 읽기 실패: {files[i]}")
+                continue
+            yield i * stride, None, frame
+
+
+class PrefetchReader(threading.Thread):
+    """
+    소스 하나를 백그라운드에서 디코딩해 크기 제한 큐에 넣는 스레드
+    prefetch: 큐에 쌓아 둘 최대 프레임 수
+    max_bytes: 큐에 쌓인 프레임의 최대 바이트 (None 이면 프레임 수로만 제한, 비어 있으면 한 장은 항상 넣는다)
+    """
+
+    def __init__(self, source, stride=1, prefetch=16, decode_workers=4, max_bytes=None):
+        super().__init__(daemon=True, name=f"reader-{source.name}")
+        self.source = source
+        self.stride = max(1, stride)
+        self.decode_workers = decode_workers
+        self.max_bytes = max_bytes
+        self.frames = queue.Queue(maxsize=max(1, prefetch))
+        self.error = None
+        self._stop_event = threading.Event()
+        self._queued_bytes = 0
+        self._bytes_cond = threading.Condition()
+
+    def _reserve(self, nbytes):
+        """큐에 쌓인 바이트가 max_bytes 안에 들 때까지 대기 후 예약 (중지되면 False)"""
+        with self._bytes_cond:
+            while (self.max_bytes is not None and self._queued_bytes
+                   and self._queued_bytes + nbytes > self.max_bytes):
+                if self._stop_event.is_set():
+                    return False
+                self._bytes_cond.wait(0.5)
+            self._queued_bytes += nbytes
+        return True
+
+    def _release(self, nbytes):
+        with self._bytes_cond:
+            self._queued_bytes -= nbytes
+            self._bytes_cond.notify()
+
+    def run(self):
+        reader = None
+        try:
+            if self.source.kind == "video":
+                reader = _read_video(self.source, self.stride)
+            else:
+                reader = _read_images(self.source, self.stride, self.decode_workers)
+            for item in reader:
+                if not self._reserve(item[2].nbytes):
+                    break
+                while not self._stop_event.is_set():
+                    try:
+                        self.frames.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop_event.is_set():
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            if reader is not None:
+                reader.close()  # 캡처 해제 / 디코딩 스레드 풀 종료
+            if not self._stop_event.is_set():
+                self.frames.put(_END)
+
+    def stop(self):
+        self._stop_event.set()
+        with self._bytes_cond:
+            self._bytes_cond.notify()
+
+    def close(self, timeout=2.0):
+        """디코딩 중지 후 스레드 종료 대기 (시작하지 않은 리더도 호출 가능)"""
+        self.stop()
+        if self.is_alive():
+            self.join(timeout)
+
+    def __iter__(self):
+        while True:
+            item = self.frames.get()
+            if item is _END:
+                break
+            self._release(item[2].nbytes)
+            yield item
+        if self.error is not None:
+            raise self.error
+
+
+def open_sources(sources, stride=1, prefetch=16, decode_workers=4, read_ahead=1, max_bytes=None):
+    """
+    소스를 순서대로 (source, reader) 로 돌려준다.
+    현재 소스를 처리하는 동안 다음 read_ahead 개 소스도 미리 디코딩을 시작한다.
+    리더마다 prefetch 프레임 / max_bytes 바이트까지 쌓으므로 디코딩 버퍼는 최대 (read_ahead + 1) x 그 크기.
+    중간에 예외가 나거나 제너레이터가 닫히면 미리 시작한 리더도 모두 정리한다.
+    """
+    pending = []
+    remaining = list(sources)
+    try:
+        while remaining or pending:
+            while remaining and len(pending) < read_ahead + 1:
+                reader = PrefetchReader(remaining.pop(0), stride, prefetch, decode_workers, max_bytes)
+                pending.append(reader)
+                reader.start()
+            reader = pending.pop(0)
+            try:
+                yield reader.source, reader
+            finally:
+                reader.close()
+    finally:
+        for reader in pending:
+            reader.close()
+
+
+def iter_batches(items, batch_size):
+    """이터레이터를 batch_size 개씩 묶기"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ResultWriter:
+    """
+    프레임별 결과 기록기 (확장자가 .parquet 이면 Parquet, 그 외는 JSONL)
+
+    record 형식: {"source", "frame", "time_sec", "counts": {이름: 개수}, "objects": [dict, ...]}
+    object_fields: Parquet 스키마용 객체 필드 목록 [(이름, pyarrow 타입 이름), ...]
+                   ("box" 는 list<float32> 로 항상 포함)
+    """
+
+    def __init__(self, path, object_fields=(), flush_rows=1000):
+        self.path = Path(path)
+        self.parquet = self.path.suffix.lower() == ".parquet"
+        self.flush_rows = flush_rows
+        self.rows = 0
+        self._buffer = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet 출력에는 pyarrow 가 필요합니다 (pip install pyarrow)")
+            self._pa = pa
+            fields = [pa.field("box", pa.list_(pa.float32()))]
+            fields += [pa.field(name, getattr(pa, type_name)()) for name, type_name in object_fields]
+            self.schema = pa.schema([
+                pa.field("source", pa.string()),
+                pa.field("frame", pa.int64()),
+                pa.field("time_sec", pa.float64()),
+                pa.field("counts", pa.map_(pa.string(), pa.int64())),
+                pa.field("objects", pa.list_(pa.struct(fields))),
+            ])
+            self._writer = pq.ParquetWriter(str(self.path), self.schema)
+        else:
+            self._file = open(self.path, "w", encoding="utf-8")
+
+    def write(self, record):
+        self.rows += 1
+        if self.parquet:
+            row = dict(record)
+            row["counts"] = list(record["counts"].items())
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_rows:
+                self._flush()
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _flush(self):
+        if self._buffer:
+            table = self._pa.Table.from_pylist(self._buffer, schema=self.schema)
+            self._writer.write_table(table)
+            self._buffer = []
+
+    def close(self):
+        if self.parquet:
+            self._flush()
+            self._writer.close()
+        else:
+            self._file.close()
+        logger.info(f"결과 {self.rows}행 기록: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,224 @@
+"""
+녹화 영상 / 이미지 오프라인 배치 처리 (객체 추적 + 영역 진입 카운트)
+
+실시간 스트림 대신 로컬 파일을 최대 속도로 처리한다.
+- 소스별 백그라운드 디코딩 + 다음 소스 미리 디코딩
+- 연속 프레임을 묶어서 한 번에 추적 (--batch, 소스마다 추적기 초기화)
+- 기본은 그리기 없음, --render 를 주면 주석 영상/이미지 저장
+
+사용 예:
+    python batch_process.py recordings/ --zone "100,400 900,400 900,700 100,700"
+    python batch_process.py cam1.mp4 --zone-file zone.json --output counts.parquet --render annotated/
+"""
+import argparse
+import json
+import logging
+import time
+from contextlib import closing
+from collections import defaultdict
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+import main
+from batch_io import ResultWriter, discover_sources, iter_batches, open_sources
+from inference_worker import extract_detections
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("batch_process")
+
+# Parquet 출력용 객체 필드 (JSONL 은 같은 키를 그대로 기록)
+OBJECT_FIELDS = [
+    ("track_id", "int64"),
+    ("name", "string"),
+    ("confidence", "float32"),
+    ("inside", "bool_"),
+    ("entered", "bool_"),
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="녹화 영상 영역 진입 카운트 배치 처리")
+    parser.add_argument("inputs", nargs="+", help="동영상 파일 또는 동영상/이미지 디렉토리")
+    parser.add_argument("--output", default="results.jsonl", help="결과 파일 (.jsonl 또는 .parquet)")
+    parser.add_argument("--model", default=main.MODEL_PATH, help="YOLO 모델")
+    parser.add_argument("--zone", default=None, help='감지 영역 좌표 "x1,y1 x2,y2 x3,y3 ..."')
+    parser.add_argument("--zone-file", default=None, help='/set_zone 과 같은 형식의 JSON 파일 {"points": [[x, y], ...]}')
+    parser.add_argument("--batch", type=int, default=8, help="한 번에 추적할 프레임 수")
+    parser.add_argument("--imgsz", type=int, default=640, help="추론 입력 크기")
+    parser.add_argument("--conf", type=float, default=0.25, help="모델 신뢰도 임계값")
+    parser.add_argument("--classes", type=lambda v: [int(c) for c in v.split(",")], default=None,
+                        help="처리할 클래스 ID (쉼표 구분, 없으면 전체)")
+    parser.add_argument("--device", default=None, help="추론 장치 (예: cpu, 0)")
+    parser.add_argument("--stride", type=int, default=1, help="N 프레임마다 1장만 처리")
+    parser.add_argument("--decode-workers", type=int, default=4, help="이미지 디코딩 스레드 수")
+    parser.add_argument("--prefetch", type=int, default=16, help="소스별 미리 디코딩할 최대 프레임 수")
+    parser.add_argument("--prefetch-mb", type=float, default=128, help="소스별 미리 디코딩한 프레임의 최대 메모리 (MB)")
+    parser.add_argument("--read-ahead", type=int, default=1, help="처리 중인 소스 외에 미리 디코딩을 시작할 소스 수")
+    parser.add_argument("--render", default=None, help="주석 영상/이미지를 저장할 디렉토리")
+    return parser.parse_args(argv)
+
+
+def load_zone(args):
+    """명령행 인자에서 감지 영역 다각형 읽기 (3점 미만이면 None)"""
+    points = []
+    if args.zone_file:
+        with open(args.zone_file, "r", encoding="utf-8") as f:
+            points = json.load(f).get("points", [])
+    elif args.zone:
+        points = [[int(float(v)) for v in pair.split(",")] for pair in args.zone.split()]
+    if len(points) < 3:
+        if points:
+            print("⚠️  영역 좌표는 최소 3점 필요, 영역 판정 없이 진행")
+        return None
+    return np.array(points, np.int32)
+
+
+def build_record(source, index, time_sec, objects, count):
+    """프레임 하나의 결과 레코드 (counts 는 소스 시작부터 누적된 진입 횟수)"""
+    return {
+        "source": str(source.path),
+        "frame": index,
+        "time_sec": round(time_sec, 3) if time_sec is not None else None,
+        "counts": dict(count),
+        "objects": [
+            {
+                "track_id": obj["track_id"],
+                "name": obj["cls"],
+                "confidence": round(obj["conf"], 4),
+                "box": [round(v, 1) for v in obj["box"]],
+                "inside": obj["inside"],
+                "entered": obj["entered"],
+            }
+            for obj in objects
+        ],
+    }
+
+
+class Renderer:
+    """주석 프레임 저장 (동영상 소스는 mp4, 이미지 소스는 jpg)"""
+
+    def __init__(self, output_dir, fps=15.0, stride=1):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.default_fps = fps
+        self.stride = max(1, stride)
+        self.fps = fps / self.stride
+        self.writer = None
+        self.source = None
+
+    def open(self, source):
+        self.close()
+        self.source = source
+        if source.kind == "video":
+            cap = cv2.VideoCapture(str(source.path))
+            # stride 프레임마다 1장만 쓰므로 재생 속도가 원본과 같도록 fps 도 stride 로 나눈다
+            self.fps = (cap.get(cv2.CAP_PROP_FPS) or self.default_fps) / self.stride
+            cap.release()
+        else:
+            (self.output_dir / source.name).mkdir(parents=True, exist_ok=True)
+
+    def write(self, index, frame, zone_pts, detections, objects, count):
+        if zone_pts is not None:
+            cv2.polylines(frame, [zone_pts], True, (0,255,0), 2)
+        if detections.ids is not None:
+            main.draw_zone_objects(frame, objects)
+        elif len(detections.cls) > 0:
+            frame = main.draw_plain_boxes(frame, detections)
+        main.draw_counts(frame, count)
+
+        if self.source.kind == "images":
+            name = self.source.images[index].stem if index < len(self.source.images) else str(index)
+            cv2.imwrite(str(self.output_dir / self.source.name / f"{name}.jpg"), frame)
+            return
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            path = self.output_dir / f"{self.source.name}_annotated.mp4"
+            self.writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+def reset_tracker(model):
+    """
+    이전 소스의 추적기 상태(추적 ID 포함) 버리기
+    ultralytics 는 첫 track() 호출 때 추적기/콜백을 만들고 그때의 persist 값을 계속 쓴다.
+    persist=False 로 초기화하면 이후 배치마다(이미지 경로가 바뀔 때마다) 추적기가 초기화되므로,
+    항상 persist=True 로 호출하고 소스가 바뀔 때만 여기서 직접 초기화한다.
+    """
+    predictor = getattr(model, "predictor", None)
+    for tracker in getattr(predictor, "trackers", None) or []:
+        tracker.reset()
+
+
+def process_source(model, source, reader, zone_pts, args, writer, renderer):
+    """소스 하나 처리, 처리한 프레임 수 반환"""
+    tracks = {}
+    count = defaultdict(int)
+    frames_done = 0
+    reset_tracker(model)
+    for batch in iter_batches(reader, args.batch):
+        frames = [frame for _, _, frame in batch]
+        results = model.track(frames, persist=True, verbose=False, imgsz=args.imgsz,
+                              conf=args.conf, classes=args.classes, device=args.device,
+                              batch=len(frames))
+
+        for (index, time_sec, frame), result in zip(batch, results):
+            detections = extract_detections(result)
+            objects = main.update_zone_state(detections, zone_pts, tracks, count)
+            writer.write(build_record(source, index, time_sec, objects, count))
+            if renderer is not None:
+                renderer.write(index, frame, zone_pts, detections, objects, count)
+        frames_done += len(batch)
+    return frames_done
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    zone_pts = load_zone(args)
+
+    sources = discover_sources(args.inputs)
+    if not sources:
+        logger.error("처리할 입력이 없습니다.")
+        return 1
+    logger.info(f"{len(sources)}개 소스 처리 시작: {sources}")
+
+    model = YOLO(args.model)
+    renderer = Renderer(args.render, stride=args.stride) if args.render else None
+    started = time.time()
+    total = 0
+
+    # 중간에 예외로 빠져나가도 미리 디코딩 중인 리더까지 정리되도록 제너레이터를 바로 닫는다
+    opened = closing(open_sources(sources, args.stride, args.prefetch, args.decode_workers,
+                                  read_ahead=args.read_ahead, max_bytes=int(args.prefetch_mb * 2**20)))
+    with ResultWriter(args.output, OBJECT_FIELDS) as writer, opened as readers:
+        for source, reader in readers:
+            source_started = time.time()
+            if renderer is not None:
+                renderer.open(source)
+            try:
+                frames_done = process_source(model, source, reader, zone_pts, args, writer, renderer)
+            except Exception as e:
+                logger.error(f"소스 처리 실패 ({source.path}): {e}")
+                continue
+            finally:
+                if renderer is not None:
+                    renderer.close()
+            elapsed = time.time() - source_started
+            total += frames_done
+            logger.info(f"{source.name}: {frames_done}프레임, {elapsed:.1f}초 "
+                        f"({frames_done / max(elapsed, 1e-6):.1f} FPS)")
+
+    elapsed = time.time() - started
+    logger.info(f"완료: 총 {total}프레임, {elapsed:.1f}초 ({total / max(elapsed, 1e-6):.1f} FPS)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run())
@@ -0,0 +1,271 @@
+"""
+점유 히트맵 & 영역 체류 시간 (스트림별, 프레임마다 누적 - 과거 프레임을 다시 보지 않는다)
+
+- OccupancyHeatmap: 클래스별 축소 격자(float32, cell 픽셀당 한 칸)에 박스 중심(세그멘테이션 모델이면 마스크)을 더한다.
+  값 단위는 "객체·초" (프레임 간격만큼 가중, 마스크는 객체 하나의 합이 같도록 나눔) 이고, half_life 초마다 절반으로 줄어드는 지수 감쇠.
+  감쇠는 벽시계 경과 시간 기준이라 스트림이 멈춘 동안에도 계속된다 (조회할 때 그 시각까지 감쇠).
+  격자 전체를 (클래스, gy, gx) 한 배열로 두고 감쇠는 곱셈 한 번, 중심 누적은 np.add.at 한 번.
+- DwellTimes: 추적 ID별로 영역 안에 머문 시간을 누적, 사라진 추적은 클래스별 방문 통계로 정리
+  expire 보다 짧은 간격(프레임 드롭)은 그대로 체류로 세고, 그보다 길면 그 사이는 안 본 시간이라 새 방문으로 나눈다.
+- persist_path 가 있으면 save_interval 초마다 np.savez 로 저장하고, 시작할 때 불러온다.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAME_GAP = 1.0  # 프레임 간격이 이보다 길면 (끊김/재연결) 이만큼만 점유 누적 (초, 감쇠는 실제 경과 시간)
+
+
+class OccupancyHeatmap:
+    """
+    cell: 격자 한 칸 크기 (원본 프레임 픽셀)
+    half_life: 감쇠 반감기 (초, None 이면 감쇠 없이 계속 누적)
+    persist_path: 저장 파일 (.npz, None 이면 저장 안 함)
+    save_interval: 저장 주기 (초)
+    """
+
+    def __init__(self, cell=16, half_life=600.0, persist_path=None, save_interval=60.0):
+        self.cell = cell
+        self.half_life = half_life
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.save_interval = save_interval
+        self.names = {}
+        self.frame_size = None   # (height, width)
+        self._grid = None        # (클래스 수, gy, gx) float32
+        self._last_update = None
+        self._decayed_at = None  # 격자가 이 시각까지 감쇠된 상태
+        self._last_save = time.time()
+        self._lock = threading.Lock()
+        if self.persist_path is not None and self.persist_path.exists():
+            self.load()
+
+    def _ensure_grid(self, height, width, names):
+        """
+        프레임 크기/클래스 수에 맞는 격자 준비 (모델의 전체 클래스 이름 기준으로 한 번에 잡는다)
+        해상도가 바뀌면 처음부터, 클래스만 늘어나면 (저장 파일이 더 적은 클래스로 만들어졌을 때 등) 누적 값을 유지한 채 늘린다.
+        """
+        num_classes = max(names) + 1 if names else 1
+        shape = (num_classes, -(-height // self.cell), -(-width // self.cell))
+        if self._grid is None or self.frame_size != (height, width):
+            if self._grid is not None:
+                logger.info(f"히트맵 격자 재생성: {self._grid.shape} -> {shape}")
+            self._grid = np.zeros(shape, dtype=np.float32)
+            self.frame_size = (height, width)
+        elif self._grid.shape[0] < num_classes:
+            self._grid = np.pad(self._grid, ((0, num_classes - self._grid.shape[0]), (0, 0), (0, 0)))
+        self.names = {**self.names, **names}
+
+    def update(self, detections, frame_shape, timestamp):
+        """프레임 하나 반영 (Detections, 원본 프레임 shape, 캡처 시각)"""
+        height, width = frame_shape[:2]
+        with self._lock:
+            self._ensure_grid(height, width, detections.names)
+            grid = self._grid
+            step = 0.0
+            if self._last_update is not None:
+                step = min(max(timestamp - self._last_update, 0.0), MAX_FRAME_GAP)
+            self._decay_to(timestamp)
+            self._last_update = timestamp
+
+            if step > 0 and len(detections.cls) > 0:
+                if detections.masks is not None:
+                    self._add_masks(grid, detections, step)
+                else:
+                    self._add_centers(grid, detections, step)
+
+        if self.persist_path is not None and time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    def _decay_to(self, now):
+        """마지막 감쇠 시각부터 now 까지 경과 시간만큼 감쇠 (끊김/조회 사이 시간도 포함, lock 잡고 호출)"""
+        if self._decayed_at is not None and now > self._decayed_at and self.half_life and self._grid is not None:
+            self._grid *= np.float32(0.5 ** ((now - self._decayed_at) / self.half_life))
+        if self._decayed_at is None or now > self._decayed_at:
+            self._decayed_at = now
+
+    def _add_centers(self, grid, detections, weight):
+        """박스 중심이 속한 칸에 weight 를 더한다 (클래스/칸 평탄 인덱스로 한 번에, 같은 칸 중복도 누적)"""
+        _, gy, gx = grid.shape
+        xyxy = detections.xyxy
+        cx = ((xyxy[:, 0] + xyxy[:, 2]) * (0.5 / self.cell)).astype(np.intp)
+        cy = ((xyxy[:, 1] + xyxy[:, 3]) * (0.5 / self.cell)).astype(np.intp)
+        np.clip(cx, 0, gx - 1, out=cx)
+        np.clip(cy, 0, gy - 1, out=cy)
+        flat = (detections.cls.astype(np.intp) * gy + cy) * gx + cx
+        np.add.at(grid.reshape(-1), flat, np.float32(weight))
+
+    def _add_masks(self, grid, detections, weight):
+        """
+        세그멘테이션 마스크를 격자 크기로 줄여서 객체마다 합이 weight 가 되도록 나눠 더한다 (중심 누적과 같은 단위)
+        마스크는 모델 입력(레터박스) 크기라 패딩을 잘라내고 원본 비율 부분만 쓴다 (05 resize_mask_to_frame 과 같은 계산)
+        """
+        _, gy, gx = grid.shape
+        height, width = self.frame_size
+        mask_h, mask_w = detections.masks.shape[1:3]
+        gain = min(mask_h / height, mask_w / width)
+        pad_x = (mask_w - width * gain) / 2
+        pad_y = (mask_h - height * gain) / 2
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        bottom, right = int(round(mask_h - pad_y + 0.1)), int(round(mask_w - pad_x + 0.1))
+        for mask, class_id in zip(detections.masks, detections.cls.tolist()):
+            coverage = cv2.resize(mask[top:bottom, left:right].astype(np.float32), (gx, gy),
+                                  interpolation=cv2.INTER_AREA)
+            total = float(coverage.sum())
+            if total > 0:
+                grid[class_id] += coverage * np.float32(weight / total)
+
+    def grid(self, cls=None):
+        """(gy, gx) 격자 복사본 - cls 는 클래스 이름 (None 이면 전체 클래스 합)"""
+        with self._lock:
+            if self._grid is None:
+                return None
+            self._decay_to(time.time())
+            if cls is None:
+                return self._grid.sum(axis=0)
+            class_id = self.class_id(cls)
+            if class_id is None or class_id >= self._grid.shape[0]:
+                raise KeyError(cls)
+            return self._grid[class_id].copy()
+
+    def class_id(self, name):
+        for class_id, class_name in self.names.items():
+            if class_name == name:
+                return class_id
+        return None
+
+    def classes(self):
+        """누적 값이 있는 클래스 이름 -> 합계 (초)"""
+        with self._lock:
+            if self._grid is None:
+                return {}
+            self._decay_to(time.time())
+            totals = self._grid.reshape(self._grid.shape[0], -1).sum(axis=1)
+            return {self.names.get(class_id, f"Class_{class_id}"): round(float(totals[class_id]), 2)
+                    for class_id in np.flatnonzero(totals).tolist()}
+
+    def render(self, cls=None, background=None, alpha=0.5):
+        """
+        컬러맵 이미지 (BGR, 원본 프레임 크기)
+        background: 같이 겹칠 BGR 프레임 (크기가 다르면 히트맵을 그 크기로 맞춘다)
+        """
+        grid = self.grid(cls)
+        if grid is None:
+            return None
+        peak = float(grid.max())
+        scaled = cv2.convertScaleAbs(grid, alpha=255.0 / peak if peak > 0 else 0.0)
+        height, width = background.shape[:2] if background is not None else self.frame_size
+        image = cv2.applyColorMap(cv2.resize(scaled, (width, height), interpolation=cv2.INTER_LINEAR),
+                                  cv2.COLORMAP_JET)
+        if background is not None:
+            image = cv2.addWeighted(background, 1.0 - alpha, image, alpha, 0.0)
+        return image
+
+    def reset(self):
+        with self._lock:
+            if self._grid is not None:
+                self._grid.fill(0)
+
+    def save(self):
+        """persist_path 에 저장 (임시 파일에 쓰고 교체 -> 저장 중에 죽어도 이전 파일 유지)"""
+        self._last_save = time.time()
+        with self._lock:
+            if self._grid is None:
+                return
+            grid = self._grid.copy()
+            names = np.array([self.names.get(i, f"Class_{i}") for i in range(grid.shape[0])])
+            frame_size = np.array(self.frame_size)
+            timestamp = self._decayed_at
+        try:
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.persist_path.with_name(self.persist_path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(f, grid=grid, names=names, frame_size=frame_size, cell=self.cell,
+                         timestamp=timestamp or 0.0)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(f"히트맵 저장 실패 ({self.persist_path}): {e}")
+
+    def load(self):
+        """저장 파일 불러오기 (격자 크기가 다르면 무시, 저장 후 꺼져 있던 시간만큼은 다음 조회/갱신 때 감쇠)"""
+        try:
+            with np.load(self.persist_path) as data:
+                if int(data["cell"]) != self.cell:
+                    logger.warning(f"히트맵 격자 크기가 달라서 불러오지 않음: {self.persist_path}")
+                    return
+                self._grid = data["grid"].astype(np.float32)
+                self.names = {i: str(name) for i, name in enumerate(data["names"].tolist())}
+                self.frame_size = tuple(int(v) for v in data["frame_size"])
+                self._decayed_at = float(data["timestamp"]) or None
+            logger.info(f"히트맵 불러옴: {self.persist_path} {self._grid.shape}")
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"히트맵 불러오기 실패 ({self.persist_path}): {e}")
+
+
+class DwellTimes:
+    """
+    추적 ID별 영역 체류 시간
+    expire: 이 시간(초) 동안 안 보인 추적은 끝난 것으로 보고 클래스별 방문 통계에 합친다
+    """
+
+    def __init__(self, expire=5.0):
+        self.expire = expire
+        self._tracks = {}   # {track_id: [cls, 영역 안 누적 초, 마지막으로 본 시각, 직전 프레임에 안이었는지]}
+        self._visits = {}   # {cls: [방문 수, 총 체류 초, 최대 체류 초]}
+        self._lock = threading.Lock()
+
+    def update(self, objects, timestamp):
+        """update_zone_state() 의 객체 리스트(track_id / cls / inside) 반영"""
+        with self._lock:
+            for obj in objects:
+                state = self._tracks.get(obj["track_id"])
+                if state is None:
+                    self._tracks[obj["track_id"]] = [obj["cls"], 0.0, timestamp, obj["inside"]]
+                    continue
+                if timestamp - state[2] > self.expire:
+                    # expire 보다 오래 못 봤으면 (스트림 중단 등) 이전 방문은 끝내고 새로 시작
+                    self._finish(obj["track_id"])
+                    self._tracks[obj["track_id"]] = [obj["cls"], 0.0, timestamp, obj["inside"]]
+                    continue
+                # 직전 프레임과 이번 프레임 모두 영역 안이면 그 간격만큼 체류 (expire 이하 간격은 끊김 없이 있던 것으로 본다)
+                if state[3] and obj["inside"]:
+                    state[1] += max(timestamp - state[2], 0.0)
+                state[2] = timestamp
+                state[3] = obj["inside"]
+            self._expire(timestamp)
+
+    def _expire(self, now):
+        for track_id in [tid for tid, state in self._tracks.items() if now - state[2] > self.expire]:
+            self._finish(track_id)
+
+    def _finish(self, track_id):
+        """추적 하나를 끝내고 체류가 있었으면 클래스별 방문 통계에 합친다"""
+        cls, dwell, _, _ = self._tracks.pop(track_id)
+        if dwell > 0:
+            visits = self._visits.setdefault(cls, [0, 0.0, 0.0])
+            visits[0] += 1
+            visits[1] += dwell
+            visits[2] = max(visits[2], dwell)
+
+    def reset(self):
+        with self._lock:
+            self._tracks.clear()
+            self._visits.clear()
+
+    def summary(self):
+        """현재 추적별 체류 시간 + 끝난 방문의 클래스별 통계 (스트림이 멈춰 있어도 expire 지난 추적은 끝난 것으로)"""
+        with self._lock:
+            self._expire(time.time())
+            active = [{"track_id": tid, "cls": state[0], "dwell_sec": round(state[1], 2), "inside": state[3]}
+                      for tid, state in self._tracks.items() if state[1] > 0 or state[3]]
+            visits = {cls: {"visits": n, "total_sec": round(total, 2), "avg_sec": round(total / n, 2),
+                            "max_sec": round(longest, 2)}
+                      for cls, (n, total, longest) in self._visits.items()}
+        active.sort(key=lambda obj: obj["dwell_sec"], reverse=True)
+        return {"active": active, "completed": visits}
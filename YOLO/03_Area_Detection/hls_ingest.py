@@ -0,0 +1,329 @@
+"""
+HLS 직접 수신 백엔드 (cv2.VideoCapture(STREAM_URL) 대체)
+
+- 플레이리스트를 직접 폴링 (EXT-X-TARGETDURATION 의 절반 주기)
+- 세그먼트는 keep-alive 연결 풀(httpx.Client, 프로세스 전체 공유)로 받고, 다음 세그먼트를 미리 받아 둔다
+- 처음 연결/재연결 시 항상 라이브 엣지(마지막 세그먼트)부터 시작
+- PyAV 로 프로세스 안에서 디코딩
+- 디코딩한 프레임은 PTS(없으면 세그먼트 길이/프레임 레이트) 기준 실제 재생 속도로 내보낸다
+  (세그먼트를 받자마자 한꺼번에 쏟아내지 않도록, 불연속/재연결/너무 뒤처지면 기준 시각을 다시 잡음)
+- cv2.VideoCapture 와 같은 isOpened() / read() / release() 인터페이스
+"""
+import io
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import av
+import httpx
+
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # 폴링 요청마다 INFO 로그가 찍히지 않도록
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """프로세스 전체에서 공유하는 keep-alive HTTP 클라이언트 (재연결해도 TCP/TLS 연결 재사용)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0),
+                follow_redirects=True,
+            )
+    return _client
+
+
+class Segment:
+    __slots__ = ("seq", "duration", "url", "discontinuity")
+
+    def __init__(self, seq, duration, url, discontinuity=False):
+        self.seq = seq
+        self.duration = duration
+        self.url = url
+        self.discontinuity = discontinuity
+
+
+class Playlist:
+    """m3u8 파싱 결과 (마스터면 variants, 미디어면 segments 가 채워진다)"""
+
+    def __init__(self):
+        self.variants = []          # [(bandwidth, url), ...]
+        self.segments = []          # [Segment, ...]
+        self.target_duration = 2.0
+        self.media_sequence = 0
+        self.init_url = None        # EXT-X-MAP (fMP4 초기화 세그먼트)
+        self.endlist = False
+
+
+def parse_playlist(text, base_url):
+    playlist = Playlist()
+    seq = None
+    duration = None
+    discontinuity = False
+    bandwidth = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            bandwidth = 0
+            for attr in line.split(":", 1)[1].split(","):
+                if attr.startswith("BANDWIDTH="):
+                    bandwidth = int(attr.split("=", 1)[1])
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            playlist.target_duration = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            playlist.media_sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MAP:"):
+            uri = line.split("URI=", 1)[1].split(",")[0].strip('"')
+            playlist.init_url = urljoin(base_url, uri)
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",")[0])
+        elif line.startswith("#EXT-X-DISCONTINUITY"):
+            discontinuity = True
+        elif line.startswith("#EXT-X-ENDLIST"):
+            playlist.endlist = True
+        elif not line.startswith("#"):
+            url = urljoin(base_url, line)
+            if bandwidth is not None:
+                playlist.variants.append((bandwidth, url))
+                bandwidth = None
+            else:
+                if seq is None:
+                    seq = playlist.media_sequence
+                playlist.segments.append(Segment(seq, duration or playlist.target_duration, url, discontinuity))
+                seq += 1
+                duration = None
+                discontinuity = False
+    return playlist
+
+
+class HlsCapture:
+    """
+    HLS 라이브 스트림 캡처
+
+    url: 마스터 또는 미디어 플레이리스트 (마스터면 variant 에 따라 하나 선택)
+    prefetch: 디코딩 중인 세그먼트 외에 미리 받아 둘 세그먼트 수
+    live_edge_segments: 시작 시 라이브 엣지에서 몇 개 세그먼트 앞부터 재생할지
+    max_frames: 디코딩된 프레임 큐 크기 (가득 차면 가장 오래된 프레임을 버려서 지연을 제한)
+    realtime: 프레임을 PTS 에 맞춰 실제 재생 속도로 내보낼지 (False 면 디코딩되는 대로)
+    max_lag: 재생 시각보다 이만큼(초) 넘게 늦어지면 기다리지 않고 기준 시각을 지금으로 다시 잡는다
+    """
+
+    def __init__(self, url, prefetch=2, live_edge_segments=1, max_frames=30,
+                 variant="highest", read_timeout=10.0, max_failures=5, realtime=True, max_lag=1.0):
+        self.url = url
+        self.prefetch = max(1, prefetch)
+        self.live_edge_segments = max(1, live_edge_segments)
+        self.variant = variant
+        self.read_timeout = read_timeout
+        self.max_failures = max_failures
+        self.realtime = realtime
+        self.max_lag = max_lag
+
+        self.client = get_http_client()
+        self.frames = queue.Queue(maxsize=max_frames)
+        self.dropped_frames = 0
+        self._media_url = None
+        self._init_data = None
+        self._clock = None          # (기준 벽시계 시각, 그때의 미디어 시각) - 재생 속도 맞추기용
+        self._media_time = 0.0      # 마지막으로 디코딩한 프레임의 미디어 시각 (초)
+        self._pts_offset = 0.0      # PTS 를 미디어 시각으로 바꿀 때 더하는 값
+        self._opened = False
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix="hls-fetch")
+
+        started = time.time()
+        try:
+            playlist = self._load_playlist()
+        except Exception as e:
+            logger.warning(f"HLS 플레이리스트 로딩 실패: {e}")
+            self._executor.shutdown(wait=False)
+            return
+
+        self._opened = True
+        self._thread = threading.Thread(target=self._run, args=(playlist,), daemon=True, name="hls-ingest")
+        self._thread.start()
+        logger.info(f"HLS 연결 ({(time.time() - started) * 1000:.0f}ms): {self._media_url}")
+
+    # ----------------------------
+    # cv2.VideoCapture 호환 인터페이스
+    # ----------------------------
+    def isOpened(self):
+        return self._opened and not self._closed.is_set()
+
+    def read(self, image=None):
+        if not self.isOpened():
+            return False, None
+        try:
+            frame = self.frames.get(timeout=self.read_timeout)
+        except queue.Empty:
+            return False, None
+        if frame is None:  # 수신 스레드 종료
+            self._opened = False
+            return False, None
+        return True, frame
+
+    def set(self, prop_id, value):
+        return False
+
+    def get(self, prop_id):
+        return 0.0
+
+    def release(self):
+        self._closed.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ----------------------------
+    # 플레이리스트 / 세그먼트
+    # ----------------------------
+    def _fetch(self, url):
+        response = self.client.get(url)
+        response.raise_for_status()
+        return response.content
+
+    def _load_playlist(self):
+        if self._media_url is None:
+            playlist = parse_playlist(self._fetch(self.url).decode("utf-8", "replace"), self.url)
+            if playlist.variants:
+                variants = sorted(playlist.variants)
+                self._media_url = variants[-1][1] if self.variant == "highest" else variants[0][1]
+            else:
+                self._media_url = self.url
+                return playlist
+        return parse_playlist(self._fetch(self._media_url).decode("utf-8", "replace"), self._media_url)
+
+    def _decode(self, segment, data):
+        """세그먼트 하나를 디코딩해서 프레임 큐에 넣기 (realtime 이면 재생 시각까지 기다렸다가)"""
+        if self._init_data is not None:
+            data = self._init_data + data
+        if segment.discontinuity:
+            self._clock = None
+        with av.open(io.BytesIO(data), format=None if self._init_data else "mpegts") as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            interval = 1.0 / float(stream.average_rate or 30)
+            for frame in container.decode(stream):
+                if self._closed.is_set():
+                    return
+                self._media_time = self._frame_time(frame, interval, segment.duration)
+                image = frame.to_ndarray(format="bgr24")
+                if self.realtime and self._pace(self._media_time):
+                    return
+                self._put(image)
+
+    def _frame_time(self, frame, interval, segment_duration):
+        """
+        프레임의 미디어 시각 (초)
+        PTS 가 없거나, 멈추거나 거꾸로 가거나 크게 건너뛰면 (세그먼트마다 0부터/랩어라운드/불연속 태그 누락)
+        직전 프레임 + 프레임 간격으로 이어 붙이고 그 차이를 이후 PTS 에도 적용
+        """
+        expected = self._media_time + interval
+        if frame.time is None:
+            return expected
+        if self._clock is None:
+            self._pts_offset = 0.0
+            return frame.time
+        media_time = frame.time + self._pts_offset
+        if not self._media_time < media_time <= self._media_time + segment_duration * 2:
+            self._pts_offset = expected - frame.time
+            return expected
+        return media_time
+
+    def _pace(self, media_time):
+        """media_time 프레임의 재생 시각까지 대기 (닫히면 True)"""
+        now = time.time()
+        if self._clock is not None:
+            delay = self._clock[0] + (media_time - self._clock[1]) - now
+            # 너무 늦어졌으면 (디코딩/다운로드 지연) 기다리지 않고 기준 다시 잡기
+            if delay >= -self.max_lag:
+                return delay > 0 and self._closed.wait(delay)
+            if delay < 0:
+                logger.debug(f"HLS 재생 시각보다 {-delay:.2f}초 늦음, 기준 시각 재설정")
+        self._clock = (now, media_time)
+        return False
+
+    def _put(self, item):
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()  # 가장 오래된 프레임 버림 (라이브 유지)
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self, playlist):
+        pending = deque()   # (Segment, future) - 다운로드 중/완료된 세그먼트 (재생 순서)
+        next_seq = None     # 다음에 다운로드를 예약할 세그먼트 번호
+        last_reload = time.time()
+        failures = 0
+
+        while not self._closed.is_set():
+            try:
+                if playlist.init_url and self._init_data is None:
+                    self._init_data = self._fetch(playlist.init_url)
+
+                segments = playlist.segments
+                if segments:
+                    live_edge = segments[-1].seq
+                    # 처음이거나 너무 뒤처졌으면(세그먼트가 목록에서 빠짐) 라이브 엣지로 점프
+                    if next_seq is None or next_seq < segments[0].seq:
+                        if next_seq is not None:
+                            logger.info(f"HLS 라이브 엣지로 이동 ({next_seq} -> {live_edge})")
+                            pending.clear()
+                            self._clock = None
+                        next_seq = live_edge - self.live_edge_segments + 1
+
+                    for segment in segments:
+                        if segment.seq >= next_seq and len(pending) <= self.prefetch:
+                            pending.append((segment, self._executor.submit(self._fetch, segment.url)))
+                            next_seq = segment.seq + 1
+
+                if pending:
+                    segment, future = pending.popleft()
+                    self._decode(segment, future.result())
+                    failures = 0
+                elif playlist.endlist:
+                    logger.info("HLS 스트림 종료 (EXT-X-ENDLIST)")
+                    break
+                else:
+                    # 새 세그먼트가 없으면 다음 폴링 시점까지 대기
+                    wait = last_reload + playlist.target_duration / 2 - time.time()
+                    if wait > 0 and self._closed.wait(wait):
+                        break
+
+                # 다운로드 예약이 비어 가면 플레이리스트 다시 읽기 (최소 target_duration/2 간격)
+                if len(pending) <= self.prefetch and time.time() - last_reload >= playlist.target_duration / 2:
+                    playlist = self._load_playlist()
+                    last_reload = time.time()
+            except Exception as e:
+                if self._closed.is_set():
+                    break
+                failures += 1
+                logger.warning(f"HLS 수신 오류 ({failures}/{self.max_failures}): {e}")
+                if failures >= self.max_failures:
+                    break
+                # 다음 시도는 라이브 엣지부터
+                pending.clear()
+                next_seq = None
+                self._clock = None
+                if self._closed.wait(min(0.2 * failures, 1.0)):
+                    break
+                try:
+                    playlist = self._load_playlist()
+                    last_reload = time.time()
+                except Exception:
+                    continue
+
+        self._put(None)
@@ -0,0 +1,188 @@
+"""
+로컬 HLS 대역(stand-in) 서버
+
+로컬 동영상을 TS 세그먼트로 한 번 잘라 두고, 시계에 맞춰 움직이는 라이브 플레이리스트로 무한 반복 재생한다.
+safecity 스트림 없이 STREAM_URL 을 이 서버로 바꿔서 수신 백엔드/앱을 테스트할 때 사용.
+
+사용 예:
+    python hls_standin.py sample.mp4 --port 8080
+    STREAM_URL=http://localhost:8080/live/index.m3u8 STREAM_BACKEND=hls uvicorn main:app
+"""
+import argparse
+import logging
+import math
+import tempfile
+import threading
+import time
+from fractions import Fraction
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import av
+
+logger = logging.getLogger(__name__)
+
+
+def segment_video(video_path, output_dir, segment_duration=2.0, max_width=None):
+    """
+    동영상을 H.264 TS 세그먼트로 재인코딩 (세그먼트마다 새 인코더 -> 각 세그먼트가 키프레임으로 시작)
+    반환: [(파일 경로, 길이(초)), ...]
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    segments = []
+
+    with av.open(str(video_path)) as source:
+        in_stream = source.streams.video[0]
+        fps = float(in_stream.average_rate or 15)
+        frames_per_segment = max(1, int(round(fps * segment_duration)))
+
+        out = None
+        out_stream = None
+        count = 0
+
+        def close_segment():
+            for packet in out_stream.encode():
+                out.mux(packet)
+            out.close()
+            segments.append((path, count / fps))
+
+        for frame in source.decode(in_stream):
+            if max_width and frame.width > max_width:
+                height = int(frame.height * max_width / frame.width) // 2 * 2
+                frame = frame.reformat(width=max_width, height=height)
+            if out is None or count >= frames_per_segment:
+                if out is not None:
+                    close_segment()
+                path = output_dir / f"seg_{len(segments):05d}.ts"
+                out = av.open(str(path), mode="w", format="mpegts")
+                out_stream = out.add_stream("libx264", rate=Fraction(fps).limit_denominator(1000))
+                out_stream.width = frame.width // 2 * 2
+                out_stream.height = frame.height // 2 * 2
+                out_stream.pix_fmt = "yuv420p"
+                out_stream.options = {"preset": "ultrafast", "tune": "zerolatency"}
+                count = 0
+            frame.pts = None
+            for packet in out_stream.encode(frame.reformat(width=out_stream.width, height=out_stream.height,
+                                                            format="yuv420p")):
+                out.mux(packet)
+            count += 1
+        if out is not None:
+            close_segment()
+
+    logger.info(f"{len(segments)}개 세그먼트 생성 ({segment_duration}초): {output_dir}")
+    return segments
+
+
+class LiveLoop:
+    """세그먼트 목록을 시계에 맞춰 무한 반복하는 라이브 플레이리스트"""
+
+    def __init__(self, segments, list_size=5):
+        self.segments = segments
+        self.list_size = list_size
+        self.target_duration = math.ceil(max(d for _, d in segments))
+        self.cycle = sum(d for _, d in segments)
+        self.started = time.time()
+
+    def current_index(self):
+        """지금까지 '방송된' 전역 세그먼트 번호"""
+        elapsed = time.time() - self.started
+        loops, offset = divmod(elapsed, self.cycle)
+        index = int(loops) * len(self.segments)
+        for _, duration in self.segments:
+            if offset < duration:
+                break
+            offset -= duration
+            index += 1
+        return index
+
+    def playlist(self):
+        last = self.current_index()
+        first = max(0, last - self.list_size + 1)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first}",
+        ]
+        for index in range(first, last + 1):
+            local = index % len(self.segments)
+            if local == 0 and index > 0:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{self.segments[local][1]:.3f},")
+            lines.append(f"seg_{index}.ts")
+        return "\n".join(lines) + "\n"
+
+    def segment_path(self, index):
+        return self.segments[index % len(self.segments)][0]
+
+
+def make_handler(loop):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/live/index.m3u8":
+                self._send(loop.playlist().encode(), "application/vnd.apple.mpegurl")
+            elif path.startswith("/live/seg_") and path.endswith(".ts"):
+                try:
+                    index = int(path[len("/live/seg_"):-len(".ts")])
+                except ValueError:
+                    self.send_error(404)
+                    return
+                self._send(loop.segment_path(index).read_bytes(), "video/mp2t")
+            else:
+                self.send_error(404)
+
+    return Handler
+
+
+def start_standin(video_path, host="127.0.0.1", port=8080, segment_duration=2.0, list_size=5,
+                  max_width=None, work_dir=None):
+    """대역 서버를 백그라운드 스레드로 시작 -> (server, 플레이리스트 URL)"""
+    work_dir = work_dir or tempfile.mkdtemp(prefix="hls_standin_")
+    segments = segment_video(video_path, work_dir, segment_duration, max_width)
+    if not segments:
+        raise ValueError(f"세그먼트를 만들 수 없습니다: {video_path}")
+    server = ThreadingHTTPServer((host, port), make_handler(LiveLoop(segments, list_size)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="hls-standin").start()
+    url = f"http://{host}:{server.server_address[1]}/live/index.m3u8"
+    logger.info(f"HLS 대역 서버 시작: {url}")
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 동영상을 반복 재생하는 HLS 라이브 대역 서버")
+    parser.add_argument("video", help="반복 재생할 동영상")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--segment", type=float, default=2.0, help="세그먼트 길이(초)")
+    parser.add_argument("--list-size", type=int, default=5, help="플레이리스트에 노출할 세그먼트 수")
+    parser.add_argument("--max-width", type=int, default=None, help="이보다 넓으면 축소해서 인코딩")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server, url = start_standin(args.video, args.host, args.port, args.segment, args.list_size, args.max_width)
+    print(f"STREAM_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
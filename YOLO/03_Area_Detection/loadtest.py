@@ -0,0 +1,365 @@
+"""
+/video_feed 동시 시청자 부하 테스트
+
+1. 로컬 동영상을 HLS 대역 서버로 반복 재생 (STREAM_URL 대체)
+2. 앱(uvicorn main:app)을 하위 프로세스로 실행
+3. MJPEG 클라이언트 수를 단계적으로 늘리며 (일부는 일부러 느리게 읽는 클라이언트)
+   클라이언트별 수신 FPS, 종단 지연(X-Capture-Time 기준), 서버 CPU/RSS, 실패 지점을 측정
+
+사용 예:
+    python loadtest.py sample.mp4 --clients 1,2,4,8,16 --duration 20 --output loadtest.json
+    python loadtest.py sample.mp4 --app-dir ../03_Area_Detection --slow-ratio 0.5 --slow-kbps 100
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from hls_standin import start_standin
+
+logger = logging.getLogger("loadtest")
+
+BOUNDARY = b"--frame\r\n"
+
+
+class MjpegClient(threading.Thread):
+    """
+    /video_feed 를 읽는 가상 시청자
+    slow_kbps 가 있으면 그 속도로만 소켓을 읽는다 (느린 네트워크의 시청자 흉내)
+    """
+
+    def __init__(self, host, port, path="/video_feed", slow_kbps=None, chunk_size=16384, secure=False):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.secure = secure
+        self.path = path
+        self.slow_kbps = slow_kbps
+        self.chunk_size = chunk_size
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []
+        self.first_frame_sec = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        self.started = time.time()
+        conn = None
+        try:
+            connection = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            conn = connection(self.host, self.port, timeout=30)
+            conn.request("GET", self.path)
+            response = conn.getresponse()
+            if response.status != 200:
+                raise IOError(f"HTTP {response.status}")
+
+            buffer = b""
+            while not self._stop_event.is_set():
+                chunk = response.read1(self.chunk_size)
+                if not chunk:
+                    raise IOError("서버가 연결을 닫음")
+                self.bytes += len(chunk)
+                buffer += chunk
+                buffer = self._parse(buffer)
+                if self.slow_kbps:
+                    time.sleep(len(chunk) * 8 / (self.slow_kbps * 1000))
+        except Exception as e:
+            if not self._stop_event.is_set():
+                self.error = str(e) or type(e).__name__
+        finally:
+            self.finished = time.time()
+            if conn is not None:
+                conn.close()
+
+    def _parse(self, buffer):
+        """완성된 파트마다 프레임 수/지연 기록, 남은(미완성) 버퍼 반환"""
+        while True:
+            start = buffer.find(BOUNDARY)
+            if start < 0:
+                return buffer
+            end = buffer.find(BOUNDARY, start + len(BOUNDARY))
+            if end < 0:
+                return buffer[start:]
+            part = buffer[start + len(BOUNDARY):end]
+            received = time.time()
+            header_end = part.find(b"\r\n\r\n")
+            for line in part[:header_end].split(b"\r\n"):
+                if line.lower().startswith(b"x-capture-time:"):
+                    self.latencies.append(received - float(line.split(b":", 1)[1]))
+            if self.first_frame_sec is None:
+                self.first_frame_sec = received - self.started
+            self.frames += 1
+            buffer = buffer[end:]
+
+    def summary(self):
+        elapsed = max((self.finished or time.time()) - self.started, 1e-6)
+        latencies = np.array(self.latencies) if self.latencies else None
+        return {
+            "slow": bool(self.slow_kbps),
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 2),
+            "mbps": round(self.bytes * 8 / elapsed / 1e6, 2),
+            "first_frame_sec": round(self.first_frame_sec, 2) if self.first_frame_sec is not None else None,
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies is not None else None,
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies is not None else None,
+            "error": self.error,
+        }
+
+
+class ProcessSampler(threading.Thread):
+    """서버 프로세스(+ 추론 워커 등 자식 프로세스)의 CPU% / RSS 를 주기적으로 기록"""
+
+    def __init__(self, pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        try:
+            import psutil
+            self._psutil = psutil
+        except ImportError:
+            logger.warning("psutil 이 없어서 서버 CPU/RSS 를 측정하지 않습니다 (pip install psutil)")
+            self._psutil = None
+
+    def _processes(self):
+        root = self._psutil.Process(self.pid)
+        return [root] + root.children(recursive=True)
+
+    def run(self):
+        if self._psutil is None:
+            return
+        known = {}
+        while not self._stop_event.is_set():
+            try:
+                cpu = 0.0
+                rss = 0
+                for proc in self._processes():
+                    if proc.pid not in known:
+                        known[proc.pid] = proc
+                        proc.cpu_percent(None)  # 첫 호출은 기준점
+                        continue
+                    cpu += known[proc.pid].cpu_percent(None)
+                    rss += proc.memory_info().rss
+                self.samples.append((time.time(), cpu, rss))
+            except self._psutil.Error:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def window(self, start, end):
+        selected = [(cpu, rss) for t, cpu, rss in self.samples if start <= t <= end]
+        if not selected:
+            return {"cpu_percent": None, "rss_mb": None}
+        cpus, rsss = zip(*selected)
+        return {"cpu_percent": round(float(np.mean(cpus)), 1), "rss_mb": round(max(rsss) / 2**20, 1)}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_app_url(url):
+    """--url 을 (host, port, https 여부) 로 (포트가 없으면 스킴 기본 포트 80 / 443)"""
+    parts = urlsplit(url if "://" in url else f"http://{url}")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise SystemExit(f"잘못된 앱 주소: {url}")
+    secure = parts.scheme == "https"
+    return parts.hostname, parts.port or (443 if secure else 80), secure
+
+
+def log_tail(path, lines=40):
+    """앱 로그 마지막 lines 줄"""
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+def launch_app(app_dir, port, stream_url, backend, extra_env, log_path, timeout=120.0):
+    """uvicorn main:app 실행 후 응답할 때까지 대기 (앱 stdout/stderr 는 log_path 에, 시작 실패 시 마지막 부분 출력)"""
+    env = dict(os.environ, STREAM_URL=stream_url, STREAM_BACKEND=backend, **extra_env)
+    with open(log_path, "wb") as log_file:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=app_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+        )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            logger.error(f"앱 로그 ({log_path}):\n{log_tail(log_path)}")
+            raise RuntimeError(f"앱 프로세스가 종료됨 (exit {process.returncode})")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/init")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    logger.error(f"앱 로그 ({log_path}):\n{log_tail(log_path)}")
+    raise TimeoutError("앱이 시작되지 않았습니다.")
+
+
+def warm_up(host, port, secure=False, timeout=60.0):
+    """첫 프레임이 나올 때까지 대기 (스트림 연결/모델 로딩 시간이 측정에 섞이지 않도록)"""
+    client = MjpegClient(host, port, secure=secure)
+    client.start()
+    deadline = time.time() + timeout
+    while client.frames == 0 and client.is_alive() and time.time() < deadline:
+        time.sleep(0.2)
+    client.stop()
+    client.join(timeout=5)
+    if client.frames == 0:
+        raise RuntimeError(f"첫 프레임을 받지 못했습니다: {client.error or 'timeout'}")
+    logger.info(f"첫 프레임 수신 ({client.first_frame_sec:.1f}초), 측정 시작")
+
+
+def run_step(host, port, n_clients, slow_ratio, slow_kbps, duration, sampler, secure=False):
+    """동시 시청자 n_clients 명으로 duration 초 측정"""
+    n_slow = int(round(n_clients * slow_ratio))
+    clients = [MjpegClient(host, port, slow_kbps=slow_kbps if i < n_slow else None, secure=secure)
+               for i in range(n_clients)]
+    started = time.time()
+    for client in clients:
+        client.start()
+    time.sleep(duration)
+    for client in clients:
+        client.stop()
+    for client in clients:
+        client.join(timeout=5)
+    ended = time.time()
+
+    summaries = [c.summary() for c in clients]
+    normal = [s for s in summaries if not s["slow"]] or summaries
+    latencies = [s["latency_p50_ms"] for s in normal if s["latency_p50_ms"] is not None]
+    step = {
+        "clients": n_clients,
+        "slow_clients": n_slow,
+        "fps_min": min(s["fps"] for s in normal),
+        "fps_median": float(np.median([s["fps"] for s in normal])),
+        "latency_p50_ms": round(float(np.median(latencies)), 1) if latencies else None,
+        "latency_p95_ms": max((s["latency_p95_ms"] or 0) for s in normal) if latencies else None,
+        "errors": sum(1 for s in summaries if s["error"]),
+        "per_client": summaries,
+    }
+    if sampler is not None:
+        step.update(sampler.window(started, ended))
+    return step
+
+
+def print_step(step):
+    print(f"clients={step['clients']:>4} (slow {step['slow_clients']:>3})  "
+          f"fps median={step['fps_median']:>6.2f} min={step['fps_min']:>6.2f}  "
+          f"latency p50={step['latency_p50_ms']}ms p95={step['latency_p95_ms']}ms  "
+          f"cpu={step.get('cpu_percent')}%  rss={step.get('rss_mb')}MB  errors={step['errors']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="/video_feed 동시 시청자 부하 테스트")
+    parser.add_argument("video", nargs="?", help="HLS 대역 서버로 반복 재생할 동영상 (--url 을 쓰면 생략)")
+    parser.add_argument("--app-dir", default=str(Path(__file__).resolve().parent), help="main.py 가 있는 앱 디렉토리")
+    parser.add_argument("--url", default=None, help="이미 실행 중인 앱 주소 (예: http://127.0.0.1:8000), 앱을 띄우지 않음")
+    parser.add_argument("--pid", type=int, default=None, help="--url 사용 시 CPU/RSS 를 측정할 서버 PID")
+    parser.add_argument("--backend", default="opencv", help="앱의 STREAM_BACKEND (opencv / hls)")
+    parser.add_argument("--env", action="append", default=[], help="앱에 넘길 환경 변수 KEY=VALUE (여러 번 사용 가능)")
+    parser.add_argument("--app-log", default=None, help="띄운 앱의 stdout/stderr 저장 파일 (기본: 임시 파일)")
+    parser.add_argument("--clients", default="1,2,4,8,16", help="단계별 동시 시청자 수")
+    parser.add_argument("--duration", type=float, default=20.0, help="단계별 측정 시간(초)")
+    parser.add_argument("--slow-ratio", type=float, default=0.25, help="느린 클라이언트 비율")
+    parser.add_argument("--slow-kbps", type=float, default=200.0, help="느린 클라이언트 읽기 속도 (kbit/s)")
+    parser.add_argument("--min-fps", type=float, default=5.0, help="이보다 낮으면 실패로 판정")
+    parser.add_argument("--segment", type=float, default=2.0, help="대역 서버 세그먼트 길이(초)")
+    parser.add_argument("--output", default=None, help="결과 JSON 파일")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    steps = [int(n) for n in args.clients.split(",")]
+
+    app = None
+    server = None
+    try:
+        secure = False
+        if args.url:
+            host, port, secure = parse_app_url(args.url)
+            pid = args.pid
+        else:
+            if not args.video:
+                raise SystemExit("동영상 경로 또는 --url 이 필요합니다.")
+            server, stream_url = start_standin(args.video, port=0, segment_duration=args.segment)
+            host, port = "127.0.0.1", free_port()
+            extra_env = dict(item.split("=", 1) for item in args.env)
+            log_path = args.app_log or os.path.join(tempfile.gettempdir(), f"loadtest_app_{port}.log")
+            app = launch_app(args.app_dir, port, stream_url, args.backend, extra_env, log_path)
+            pid = app.pid
+            logger.info(f"앱 실행: http://{host}:{port} (pid {pid}, 스트림 {stream_url}, 로그 {log_path})")
+
+        warm_up(host, port, secure)
+
+        sampler = None
+        if pid is not None:
+            sampler = ProcessSampler(pid)
+            sampler.start()
+
+        results = []
+        failure_point = None
+        for n_clients in steps:
+            step = run_step(host, port, n_clients, args.slow_ratio, args.slow_kbps, args.duration, sampler, secure)
+            print_step(step)
+            results.append(step)
+            if failure_point is None and (step["errors"] or step["fps_min"] < args.min_fps):
+                failure_point = n_clients
+                reason = "에러" if step["errors"] else f"FPS < {args.min_fps}"
+                print(f"⚠️  실패 지점: 동시 시청자 {n_clients}명 ({reason})")
+
+        if sampler is not None:
+            sampler.stop()
+        if failure_point is None:
+            print(f"✅ 최대 {steps[-1]}명까지 FPS >= {args.min_fps}, 에러 없음")
+
+        if args.output:
+            report = {"app_dir": args.app_dir, "backend": args.backend, "min_fps": args.min_fps,
+                      "failure_point": failure_point, "steps": results}
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            logger.info(f"결과 저장: {args.output}")
+    finally:
+        if app is not None:
+            app.terminate()
+            try:
+                app.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                app.kill()
+        if server is not None:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run())
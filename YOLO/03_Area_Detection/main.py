@@ -1,26 +1,74 @@
 #============================================
 # 라이브러리 임포트
 #============================================
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 import cv2
 import numpy as np
 from ultralytics import YOLO
 from collections import defaultdict
+from functools import partial
+import io
+import os
+import threading
+import time
+from typing import List, Optional
+from batch_predictor import BatchPredictor, ImageDecodeError, ImagePredictError, ImageTooLargeError
+from frame_pipeline import FramePipeline, FramePool, Packet, Stage
+from heatmap import DwellTimes, OccupancyHeatmap
+from inference_worker import (InferencePool, count_classes, extract_detections, predict_config_from_env,
+                              predict_untracked)
+from snapshot_cache import RENDITIONS, SnapshotCache, SnapshotProducer
 
 #============================================
 # FastAPI 앱 및 전역 설정
 #============================================
 app = FastAPI()
-STREAM_URL = "https://safecity.busan.go.kr/playlist/cnRzcDovL2d1ZXN0Omd1ZXN0QDEwLjEuMjEwLjIxMDo1NTQvdXM2NzZyM0RMY0RuczYwdE1ESXdMVEk9/index.m3u8"
+STREAM_URL = os.environ.get("STREAM_URL", "https://safecity.busan.go.kr/playlist/cnRzcDovL2d1ZXN0Omd1ZXN0QDEwLjEuMjEwLjIxMDo1NTQvdXM2NzZyM0RMY0RuczYwdE1ESXdMVEk9/index.m3u8")
+# 스트림 수신 방식: "opencv" (cv2.VideoCapture / FFmpeg) 또는 "hls" (플레이리스트 직접 폴링 + PyAV 디코딩)
+STREAM_BACKEND = os.environ.get("STREAM_BACKEND", "opencv")
+STREAM_NAME = os.environ.get("STREAM_NAME", "default")  # /snapshot?stream= 에 쓰는 이름
+SNAPSHOT_MAX_AGE = 2.0  # 이보다 오래된 스냅샷이면 백그라운드 생성 시작 (초)
+MODEL_PATH = "yolov8n.pt"
+# 0이면 웹 프로세스 안에서 추적, 1 이상이면 별도 프로세스 워커 풀 사용
+# (추적기 상태 때문에 같은 스트림은 항상 같은 워커로 간다)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+INFERENCE_SLOTS = int(os.environ.get("INFERENCE_SLOTS", "4"))
+# 워커 슬롯 프레임 크기 (이보다 큰 프레임/이미지는 비율 유지하며 줄여서 추론, 박스는 원본 좌표로 되돌림)
+INFERENCE_MAX_WIDTH = int(os.environ.get("INFERENCE_MAX_WIDTH", "1920"))
+INFERENCE_MAX_HEIGHT = int(os.environ.get("INFERENCE_MAX_HEIGHT", "1080"))
+# 스트림별 모델 호출 인자 (DETECT_CLASSES / DETECT_CONF / DETECT_IMGSZ, 없으면 모델 기본값)
+PREDICT_CONFIG = {STREAM_NAME: predict_config_from_env()}
+PIPELINE_QUEUE_SIZE = 2  # 파이프라인 단계 사이 큐 크기 (작을수록 지연이 짧다)
+# /predict: 동시에 들어온 이미지를 최대 PREDICT_MAX_BATCH 장까지 묶어서 추론 (묶으려고 최대 PREDICT_MAX_WAIT_MS 대기)
+PREDICT_MAX_BATCH = int(os.environ.get("PREDICT_MAX_BATCH", "8"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "20"))
+PREDICT_MAX_PIXELS = int(os.environ.get("PREDICT_MAX_PIXELS", "40000000"))  # 이보다 큰 업로드 이미지는 413 (약 8K)
+# 점유 히트맵: 격자 한 칸 크기(픽셀) / 감쇠 반감기(초, 0이면 감쇠 없음) / 저장 디렉토리(없으면 저장 안 함)
+HEATMAP_CELL = int(os.environ.get("HEATMAP_CELL", "16"))
+HEATMAP_HALF_LIFE = float(os.environ.get("HEATMAP_HALF_LIFE", "600"))
+HEATMAP_DIR = os.environ.get("HEATMAP_DIR", "")
+HEATMAP_SAVE_INTERVAL = 60.0  # 히트맵 저장 주기 (초)
 
 #============================================
 # 전역 변수 (영역 감지 관련)
 #============================================
 model = None
+model_lock = threading.Lock()  # 프로세스 내 모델 호출 직렬화 (스트림 추적 + /predict)
+inference_pool = None
+inference_pool_lock = threading.Lock()
 zone = []  # ROI 좌표
 tracks = {}  # {id: "in"/"out"}
 count = defaultdict(int)  # 진입 카운트
+snapshot_cache = SnapshotCache()  # 스트림별 최신 JPEG
+detection_summaries = {}  # 스트림별 최근 프레임 클래스별 감지 개수
+heatmaps = {STREAM_NAME: OccupancyHeatmap(
+    cell=HEATMAP_CELL,
+    half_life=HEATMAP_HALF_LIFE or None,
+    persist_path=os.path.join(HEATMAP_DIR, f"{STREAM_NAME}.npz") if HEATMAP_DIR else None,
+    save_interval=HEATMAP_SAVE_INTERVAL,
+)}  # 스트림별 클래스별 점유 히트맵
+dwell_times = {STREAM_NAME: DwellTimes()}  # 스트림별 추적 ID 영역 체류 시간
 
 #============================================
 # YOLO 모델 로딩
@@ -28,9 +76,136 @@ count = defaultdict(int)  # 진입 카운트
 def get_model():
     global model
     if model is None:
-        model = YOLO("yolov8n.pt")
+        model = YOLO(MODEL_PATH)
     return model
 
+#============================================
+# 추론 워커 풀 (별도 프로세스)
+#============================================
+def get_inference_pool():
+    global inference_pool
+    with inference_pool_lock:
+        if inference_pool is None:
+            inference_pool = InferencePool(
+                MODEL_PATH,
+                workers=INFERENCE_WORKERS,
+                slots=INFERENCE_SLOTS,
+                max_width=INFERENCE_MAX_WIDTH,
+                max_height=INFERENCE_MAX_HEIGHT,
+                mode="track",
+                predict_kwargs=PREDICT_CONFIG[STREAM_NAME],
+            ).start()
+    return inference_pool
+
+def run_tracking(frame):
+    """프레임 추적 후 Detections 반환 (INFERENCE_WORKERS 설정에 따라 프로세스 내/워커 풀)"""
+    if INFERENCE_WORKERS > 0:
+        return get_inference_pool().infer(frame, key=STREAM_URL)
+    with model_lock:
+        return extract_detections(get_model().track(frame, persist=True, verbose=False,
+                                                    **PREDICT_CONFIG[STREAM_NAME])[0])
+
+def predict_batch(frames):
+    """
+    정지 이미지 여러 장 추론 (스트림과 같은 모델, 추적기 상태는 건드리지 않음)
+    워커 풀을 쓰면 웹 프로세스에 모델을 따로 올리지 않고 추적 없는 작업으로 워커에 나눠 보낸다.
+    """
+    if INFERENCE_WORKERS > 0:
+        return get_inference_pool().infer_many(frames, mode="predict", return_exceptions=True)
+    with model_lock:
+        results = predict_untracked(get_model(), frames, verbose=False, **PREDICT_CONFIG[STREAM_NAME])
+    return [extract_detections(result) for result in results]
+
+# /predict 요청 묶음 처리
+predictor = BatchPredictor(predict_batch, max_batch=PREDICT_MAX_BATCH, max_wait=PREDICT_MAX_WAIT_MS / 1000,
+                           max_pixels=PREDICT_MAX_PIXELS)
+
+#============================================
+# 영역 내부 판정 & 진입 카운트 (그리기 없음)
+#============================================
+def update_zone_state(detections, zone_pts, tracks, count):
+    """
+    추적 결과로 tracks/count 를 갱신하고 객체별 정보 리스트 반환
+    zone_pts: (N, 2) int32 다각형 (None 이면 영역 판정 생략)
+    """
+    objects = []
+    if detections.ids is None:
+        return objects
+    for i, tid in enumerate(detections.ids.tolist()):
+        try:
+            box = detections.xyxy[i].tolist()
+            cx, cy = int((box[0]+box[2])/2), int((box[1]+box[3])/2)
+            cls = detections.names[int(detections.cls[i])]
+            conf = float(detections.conf[i])
+            
+            # 영역 내부 판정
+            inside = False
+            entered = False
+            if zone_pts is not None:
+                inside = cv2.pointPolygonTest(zone_pts, (cx,cy), False) >= 0
+                state = "in" if inside else "out"
+                
+                # 진입 이벤트
+                if tid not in tracks:
+                    tracks[tid] = state
+                elif tracks[tid] == "out" and state == "in":
+                    count[cls] += 1
+                    entered = True
+                tracks[tid] = state
+            
+            objects.append({"track_id": tid, "cls": cls, "conf": conf, "box": box,
+                            "inside": inside, "entered": entered})
+        except Exception as e:
+            print(f"⚠️  객체 처리 에러: {e}")
+            continue
+    return objects
+
+def zone_inside(detections, zone_pts):
+    """객체별 박스 중심이 영역 안인지 (추적 없이, 진입 카운트 갱신 없음)"""
+    if zone_pts is None:
+        return [False] * len(detections.cls)
+    centers = ((detections.xyxy[:, :2] + detections.xyxy[:, 2:]) / 2).astype(int).tolist()
+    return [cv2.pointPolygonTest(zone_pts, (cx, cy), False) >= 0 for cx, cy in centers]
+
+def draw_zone_objects(frame, objects):
+    for obj in objects:
+        box = obj["box"]
+        # 박스 색상: 영역 내부=빨강, 외부=초록
+        color = (0, 0, 255) if obj["inside"] else (0, 255, 0)
+        
+        # 바운딩 박스 그리기
+        cv2.rectangle(frame, 
+                     (int(box[0]), int(box[1])), 
+                     (int(box[2]), int(box[3])), 
+                     color, 2)
+        
+        # 라벨 (클래스, ID, 신뢰도)
+        label = f"{obj['cls']} ID:{obj['track_id']} {obj['conf']:.2f}"
+        cv2.putText(frame, label, 
+                   (int(box[0]), int(box[1])-10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
+def draw_counts(frame, count):
+    y = 30
+    for cls, cnt in count.items():
+        cv2.putText(frame, f"{cls}: {cnt}", (10,y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,255), 2)
+        y += 30
+    return frame
+
+#============================================
+# 추적 ID 없는 객체 기본 표시
+#============================================
+def draw_plain_boxes(frame, detections):
+    for box, cls_id, conf in zip(detections.xyxy.astype(int).tolist(),
+                                 detections.cls.tolist(),
+                                 detections.conf.tolist()):
+        cls = detections.names.get(cls_id, str(cls_id))
+        cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), (0, 255, 0), 2)
+        cv2.putText(frame, f"{cls} {conf:.2f}", (box[0], box[1]-10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return frame
+
 #============================================
 # API: 감지 영역 설정
 #============================================
@@ -38,162 +213,194 @@ def get_model():
 async def set_zone(request: Request):
     global zone
     zone = (await request.json()).get("points", [])
+    dwell_times[STREAM_NAME].reset()  # 영역이 바뀌면 체류 시간은 처음부터
     return {"ok": True}
 
 #============================================
-# 비디오 프레임 생성 (스트리밍 처리)
+# MJPEG 파트 생성
 #============================================
-def gen_frames():
-    import time
+def frame_part(jpeg, captured_at):
+    """
+    MJPEG 파트 하나 (X-Capture-Time: 프레임 캡처 시각, 종단 지연 측정용)
+    jpeg: bytes 또는 cv2.imencode 결과 버퍼 - 파트를 만들 때 한 번만 복사한다
+    """
+    header = (b'--frame\r\n'
+              b'Content-Type: image/jpeg\r\n'
+              b'X-Capture-Time: ' + f'{captured_at:.3f}'.encode() + b'\r\n\r\n')
+    return b''.join((header, jpeg, b'\r\n'))
+
+#============================================
+# 스트림 연결
+#============================================
+def create_video_capture():
+    if STREAM_BACKEND == "hls":
+        # 라이브 엣지부터 바로 시작, 연결 풀 재사용 (재연결 1초 이내)
+        from hls_ingest import HlsCapture
+        return HlsCapture(STREAM_URL)
+    
+    cap = cv2.VideoCapture(STREAM_URL)
+    
+    # VideoCapture 설정 (중요!)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)  # 버퍼 크기 줄임
+    cap.set(cv2.CAP_PROP_FPS, 15)  # FPS 제한
+    return cap
+
+#============================================
+# 파이프라인 캡처 단계 (스트림 연결/재연결)
+#============================================
+def capture_frames(pool):
+    """pool: 스트림별 FramePool (cap.read(image=...) 로 프레임 버퍼 재사용)"""
     cap = None
     retry_count = 0
     fail_count = 0
     
-    while True:
-        try:
-            #--------------------------------------------
-            # 1. 스트림 연결 및 재연결 처리
-            #--------------------------------------------
-            if cap is None or not cap.isOpened():
-                if cap is not None:
-                    cap.release()
-                
-                print(f"🔄 스트림 연결 중... (시도 {retry_count + 1})")
-                cap = cv2.VideoCapture(STREAM_URL)
-                
-                # VideoCapture 설정 (중요!)
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)  # 버퍼 크기 줄임
-                cap.set(cv2.CAP_PROP_FPS, 15)  # FPS 제한
-                
-                if not cap.isOpened():
-                    retry_count += 1
-                    print(f"❌ 연결 실패 (재시도 대기 중...)")
-                    time.sleep(2)
-                    if retry_count > 10:
-                        retry_count = 0
-                        time.sleep(5)
-                    continue
-                
-                print("✅ 스트림 연결 성공!")
-                retry_count = 0
-                fail_count = 0
-            
-            #--------------------------------------------
-            # 2. 프레임 읽기 및 실패 처리
-            #--------------------------------------------
-            ret, frame = cap.read()
-            
-            if not ret:
-                fail_count += 1
-                print(f"⚠️  프레임 읽기 실패 ({fail_count}회)")
-                
-                # 3회 연속 실패 시 재연결
-                if fail_count >= 3:
-                    print("🔄 재연결 필요...")
+    try:
+        while True:
+            try:
+                #--------------------------------------------
+                # 1. 스트림 연결 및 재연결 처리
+                #--------------------------------------------
+                if cap is None or not cap.isOpened():
                     if cap is not None:
                         cap.release()
-                    cap = None
+                    
+                    print(f"🔄 스트림 연결 중... (시도 {retry_count + 1})")
+                    cap = create_video_capture()
+                    
+                    if not cap.isOpened():
+                        retry_count += 1
+                        print(f"❌ 연결 실패 (재시도 대기 중...)")
+                        time.sleep(2)
+                        if retry_count > 10:
+                            retry_count = 0
+                            time.sleep(5)
+                        yield None  # 재시도 중에도 파이프라인 중지 요청 확인
+                        continue
+                    
+                    print("✅ 스트림 연결 성공!")
+                    retry_count = 0
                     fail_count = 0
                 
-                time.sleep(0.1)
-                continue
-            
-            fail_count = 0  # 성공 시 리셋
+                #--------------------------------------------
+                # 2. 프레임 읽기 및 실패 처리
+                #--------------------------------------------
+                ret, frame = pool.read(cap)
+                
+                if not ret:
+                    fail_count += 1
+                    print(f"⚠️  프레임 읽기 실패 ({fail_count}회)")
+                    
+                    # 3회 연속 실패 시 재연결
+                    if fail_count >= 3:
+                        print("🔄 재연결 필요...")
+                        if cap is not None:
+                            cap.release()
+                        cap = None
+                        fail_count = 0
+                    
+                    time.sleep(0.1)
+                    yield None
+                    continue
+                
+                fail_count = 0  # 성공 시 리셋
+                yield Packet(frame, time.time(), pool=pool)
             
-            #--------------------------------------------
-            # 3. YOLO 객체 추적 (핵심!)
-            #--------------------------------------------
-            try:
-                results = get_model().track(frame, persist=True, verbose=False)
             except Exception as e:
-                print(f"⚠️  YOLO 추적 에러: {e}")
-                # 기본 프레임 전송
-                _, buffer = cv2.imencode('.jpg', frame)
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                print(f"❌ 예상치 못한 에러: {e}")
+                time.sleep(0.1)
+                yield None
                 continue
-            
-            #--------------------------------------------
-            # 4. ROI(관심 영역) 그리기
-            #--------------------------------------------
-            if len(zone) >= 3:
-                pts = np.array(zone, np.int32)
-                cv2.polylines(frame, [pts], True, (0,255,0), 2)
-            
-            #--------------------------------------------
-            # 5. 객체 바운딩 박스 그리기 & 진입 감지
-            #--------------------------------------------
-            if results[0].boxes is not None and len(results[0].boxes) > 0 and results[0].boxes.id is not None:
-                for i, tid in enumerate(results[0].boxes.id.int().tolist()):
-                    try:
-                        box = results[0].boxes.xyxy[i].tolist()
-                        cx, cy = int((box[0]+box[2])/2), int((box[1]+box[3])/2)
-                        cls = results[0].names[int(results[0].boxes.cls[i])]
-                        conf = results[0].boxes.conf[i]
-                        
-                        # 영역 내부 판정
-                        inside = False
-                        if len(zone) >= 3:
-                            inside = cv2.pointPolygonTest(pts, (cx,cy), False) >= 0
-                            state = "in" if inside else "out"
-                            
-                            # 진입 이벤트
-                            if tid not in tracks:
-                                tracks[tid] = state
-                            elif tracks[tid] == "out" and state == "in":
-                                count[cls] += 1
-                            tracks[tid] = state
-                        
-                        # 박스 색상: 영역 내부=빨강, 외부=초록
-                        color = (0, 0, 255) if inside else (0, 255, 0)
-                        
-                        # 바운딩 박스 그리기
-                        cv2.rectangle(frame, 
-                                     (int(box[0]), int(box[1])), 
-                                     (int(box[2]), int(box[3])), 
-                                     color, 2)
-                        
-                        # 라벨 (클래스, ID, 신뢰도)
-                        label = f"{cls} ID:{tid} {conf:.2f}"
-                        cv2.putText(frame, label, 
-                                   (int(box[0]), int(box[1])-10),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                    except Exception as e:
-                        print(f"⚠️  객체 처리 에러: {e}")
-                        continue
-            elif results[0].boxes is not None and len(results[0].boxes) > 0:
-                # 추적 ID 없을 때 기본 표시
-                frame = results[0].plot()
-            
-            # 카운트 표시
-            y = 30
-            for cls, cnt in count.items():
-                cv2.putText(frame, f"{cls}: {cnt}", (10,y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,255), 2)
-                y += 30
-            
-            #--------------------------------------------
-            # 7. 프레임 인코딩 및 전송
-            #--------------------------------------------
-            success, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            if success:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            else:
-                print("⚠️  프레임 인코딩 실패")
-        
-        #--------------------------------------------
-        # 8. 예외 처리
-        #--------------------------------------------
-        except GeneratorExit:
-            print("🛑 클라이언트 연결 종료")
-            if cap is not None:
-                cap.release()
-            break
-        
-        except Exception as e:
-            print(f"❌ 예상치 못한 에러: {e}")
-            time.sleep(0.1)
-            continue
+    finally:
+        if cap is not None:
+            cap.release()
+
+#============================================
+# 파이프라인 단계 (추적 -> 영역 판정 -> 그리기 -> 인코딩)
+#============================================
+def track_stage(packet):
+    """3. YOLO 객체 추적 (핵심!) - 실패하면 박스 없이 원본 프레임 전송"""
+    try:
+        packet.detections = run_tracking(packet.frame)
+    except Exception as e:
+        print(f"⚠️  YOLO 추적 에러: {e}")
+        packet.detections = None
+    return packet
+
+def zone_stage(packet):
+    """4. 영역 내부 판정 & 진입 감지 (그리기 없음)"""
+    detections = packet.detections
+    packet.zone_pts = np.array(zone, np.int32) if len(zone) >= 3 else None
+    packet.objects = None
+    if detections is None:
+        return packet
+    
+    detection_summaries[STREAM_NAME] = {
+        "timestamp": packet.captured_at,
+        "total": int(len(detections.cls)),
+        "counts": count_classes(detections),
+    }
+    heatmaps[STREAM_NAME].update(detections, packet.frame.shape, packet.captured_at)
+    if len(detections.cls) > 0 and detections.ids is not None:
+        packet.objects = update_zone_state(detections, packet.zone_pts, tracks, count)
+    dwell_times[STREAM_NAME].update(packet.objects or [], packet.captured_at)
+    return packet
+
+def render_stage(packet):
+    """5. ROI / 객체 바운딩 박스 / 카운트 그리기"""
+    if packet.detections is None:
+        return packet
+    frame = packet.frame
+    if packet.zone_pts is not None:
+        cv2.polylines(frame, [packet.zone_pts], True, (0,255,0), 2)
+    
+    if packet.objects is not None:
+        draw_zone_objects(frame, packet.objects)
+    elif len(packet.detections.cls) > 0:
+        # 추적 ID 없을 때 기본 표시
+        frame = draw_plain_boxes(frame, packet.detections)
+    
+    # 카운트 표시
+    packet.frame = draw_counts(frame, count)
+    return packet
+
+def encode_stage(packet):
+    """7. 프레임 인코딩 -> MJPEG 파트 (+ 스냅샷 캐시는 파트 안의 JPEG 를 복사 없이 참조)"""
+    if packet.detections is None:
+        _, buffer = cv2.imencode('.jpg', packet.frame)
+        packet.part = frame_part(buffer, packet.captured_at)
+        return packet
+    success, buffer = cv2.imencode('.jpg', packet.frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not success:
+        print("⚠️  프레임 인코딩 실패")
+        return None
+    packet.part = frame_part(buffer, packet.captured_at)
+    snapshot_cache.put(STREAM_NAME, memoryview(packet.part)[-2 - len(buffer):-2])
+    return packet
+
+def build_pipeline(cancel=None):
+    # 추적 입력 큐만 drop_oldest (라이브 유지), 나머지는 역압 / 프레임 버퍼 풀은 파이프라인마다 하나
+    return FramePipeline(partial(capture_frames, FramePool()), [
+        Stage("track", track_stage, maxsize=PIPELINE_QUEUE_SIZE, policy="drop_oldest"),
+        Stage("zone", zone_stage, maxsize=PIPELINE_QUEUE_SIZE),
+        Stage("render", render_stage, maxsize=PIPELINE_QUEUE_SIZE),
+        Stage("encode", encode_stage, maxsize=PIPELINE_QUEUE_SIZE),
+    ], name=f"pipeline-{STREAM_NAME}", cancel=cancel)
+
+#============================================
+# 비디오 프레임 생성 (스트리밍 처리)
+#============================================
+def gen_frames(cancel=None):
+    """cancel: 공유 생성기 중지 이벤트"""
+    pipeline = build_pipeline(cancel).start()
+    try:
+        for packet in pipeline:
+            yield packet.part
+    finally:
+        pipeline.close()
+        print("🛑 스트림 파이프라인 종료")
+
+# 스트림당 파이프라인 하나 (/video_feed 시청자와 /snapshot 이 같이 쓴다 -> 진입 카운트/히트맵/체류 시간은 프레임당 한 번)
+snapshot_producer = SnapshotProducer(gen_frames)
 
 #============================================
 # API: HTML UI 페이지
@@ -210,6 +417,7 @@ def init():
         </div>
         <button onclick="done()">완료</button>
         <button onclick="reset()">초기화</button>
+        <button onclick="window.open('/heatmap?overlay=true')">히트맵</button>
         <script>
         let pts=[], c=document.getElementById('c'), ctx=c.getContext('2d'), s=document.getElementById('s');
         s.onload=()=>{c.width=s.offsetWidth;c.height=s.offsetHeight};
@@ -241,10 +449,162 @@ def init():
     </html>
     """
 
+#============================================
+# 앱 종료 시 추론 워커 정리
+#============================================
+@app.on_event("shutdown")
+def shutdown_inference_pool():
+    if inference_pool is not None:
+        inference_pool.close()
+
+@app.on_event("shutdown")
+def shutdown_predictor():
+    predictor.close()
+
+@app.on_event("shutdown")
+def save_heatmaps():
+    for heatmap in heatmaps.values():
+        if heatmap.persist_path is not None:
+            heatmap.save()
+
 #============================================
 # API: 비디오 스트리밍 피드
 #============================================
 @app.get("/video_feed")
 def video_feed():
-    return StreamingResponse(gen_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+    # 시청자마다 파이프라인을 돌리지 않고 공유 파이프라인의 프레임을 받아 간다
+    return StreamingResponse(snapshot_producer.viewer(),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
+
+#============================================
+# API: 최신 프레임 스냅샷 (캐시)
+#============================================
+@app.get("/snapshot")
+def snapshot(request: Request, stream: str = STREAM_NAME, rendition: str = "full"):
+    if stream != STREAM_NAME:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    if rendition not in RENDITIONS:
+        raise HTTPException(status_code=400, detail=f"렌디션은 {list(RENDITIONS)} 중 하나")
+    
+    snap = snapshot_cache.get(stream, rendition)
+    # 시청자가 없어서 캐시가 비었거나 오래됐으면 백그라운드 생성기를 돌려서 채운다
+    if snapshot_producer.running or snap is None or snap.age() > SNAPSHOT_MAX_AGE:
+        snapshot_producer.touch()
+    if snap is None:
+        snap = snapshot_cache.wait(stream, rendition, timeout=10.0)
+    if snap is None:
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    
+    headers = {
+        "ETag": snap.etag,
+        "Last-Modified": snap.last_modified,
+        "Cache-Control": "no-cache",
+    }
+    if snap.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snap.body, media_type="image/jpeg", headers=headers)
+
+#============================================
+# API: 정지 이미지 감지 (여러 요청을 배치로 묶어서 추론)
+#============================================
+@app.post("/predict")
+def predict(files: List[UploadFile] = File(...)):
+    datas = [upload.file.read() for upload in files]
+    try:
+        frames = predictor.decode(datas)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"이미지로 읽을 수 없는 파일: {files[e.index].filename}")
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"이미지가 너무 큽니다 ({e.width}x{e.height}, "
+                                                    f"최대 {PREDICT_MAX_PIXELS} 픽셀): {files[e.index].filename}")
+    try:
+        detections_list = predictor.predict(frames)
+    except ImagePredictError as e:
+        # 추론 워커가 바쁘면 503, 그 밖의 실패는 500 (어느 파일인지 알려 준다)
+        status = 503 if isinstance(e.error, TimeoutError) else 500
+        raise HTTPException(status_code=status, detail=f"추론 실패: {files[e.index].filename}: {e.error}")
+    
+    # 현재 설정된 감지 영역 (픽셀 좌표 그대로 적용)
+    zone_pts = np.array(zone, np.int32) if len(zone) >= 3 else None
+    results = []
+    for upload, frame, detections in zip(files, frames, detections_list):
+        height, width = frame.shape[:2]
+        objects = []
+        for box, cls_id, conf, inside in zip(detections.xyxy.tolist(), detections.cls.tolist(),
+                                             detections.conf.tolist(), zone_inside(detections, zone_pts)):
+            # 05 /predict, 배치 처리 레코드와 같은 키
+            objects.append({"class_id": cls_id, "name": detections.names.get(cls_id, f"Class_{cls_id}"),
+                            "confidence": round(conf, 4), "box": [round(v, 1) for v in box], "inside": inside})
+        results.append({
+            "filename": upload.filename,
+            "width": width,
+            "height": height,
+            "counts": count_classes(detections),
+            "objects": objects,
+        })
+    return {"results": results}
 
+#============================================
+# API: 점유 히트맵 / 영역 체류 시간
+#============================================
+@app.get("/heatmap")
+def heatmap_image(stream: str = STREAM_NAME, cls: Optional[str] = None, format: str = "png",
+                  overlay: bool = False):
+    """
+    누적 점유 히트맵 (cls: 클래스 이름, 없으면 전체 합)
+    format=png: 컬러맵 이미지 (overlay=true 면 최신 스냅샷 위에 겹침) / format=npy: float32 격자 (값 단위 초)
+    """
+    if stream not in heatmaps:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    if format not in ("png", "npy"):
+        raise HTTPException(status_code=400, detail="format 은 png 또는 npy")
+    heatmap = heatmaps[stream]
+    headers = {"Cache-Control": "no-cache"}
+    try:
+        if format == "npy":
+            grid = heatmap.grid(cls)
+            if grid is None:
+                return Response(status_code=503, headers={"Retry-After": "1"})
+            buffer = io.BytesIO()
+            np.save(buffer, grid)
+            return Response(content=buffer.getvalue(), media_type="application/octet-stream", headers=headers)
+        
+        background = None
+        snap = snapshot_cache.get(stream) if overlay else None
+        if snap is not None:
+            background = cv2.imdecode(np.frombuffer(snap.body, np.uint8), cv2.IMREAD_COLOR)
+        image = heatmap.render(cls, background)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"히트맵에 없는 클래스: {cls}")
+    if image is None:
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    _, buffer = cv2.imencode('.png', image)
+    return Response(content=buffer.tobytes(), media_type="image/png", headers=headers)
+
+@app.post("/heatmap/reset")
+def heatmap_reset(stream: str = STREAM_NAME):
+    if stream not in heatmaps:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    heatmaps[stream].reset()
+    return {"ok": True}
+
+@app.get("/dwell")
+def dwell(stream: str = STREAM_NAME):
+    """추적 중인 객체별 영역 체류 시간 + 끝난 방문의 클래스별 통계 + 히트맵 클래스별 합계"""
+    if stream not in dwell_times:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    return {"stream": stream, **dwell_times[stream].summary(),
+            "heatmap_totals": heatmaps[stream].classes()}
+
+#============================================
+# API: 최근 프레임 감지 요약
+#============================================
+@app.get("/detections/summary")
+def detections_summary(stream: str = STREAM_NAME):
+    if stream != STREAM_NAME:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    summary = detection_summaries.get(stream)
+    if summary is None:
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    return {"stream": stream, "predict_config": PREDICT_CONFIG[stream], **summary,
+            "entered": dict(count)}
@@ -0,0 +1,73 @@
+"""
+테스트 공용 fixture
+
+fake_ultralytics: 임시 디렉토리에 만든 가짜 ultralytics 패키지 (프레임 전체를 덮는 박스 하나를 돌려주는 모델)
+spawn 으로 띄우는 추론 워커도 부모의 sys.path 를 물려받아서 이 패키지를 쓴다.
+"""
+import sys
+import textwrap
+
+import pytest
+
+FAKE_ULTRALYTICS = '''
+import os
+import time
+
+import numpy as np
+
+
+class _Array:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = _Array(data)
+        self.id = None
+        self._len = len(data)
+
+    def __len__(self):
+        return self._len
+
+
+class _Result:
+    def __init__(self, frame):
+        height, width = frame.shape[:2]
+        self.names = {0: "person"}
+        self.boxes = _Boxes(np.array([[0, 0, width, height, 0.9, 0]], dtype=np.float32))
+        self.masks = None
+
+
+class YOLO:
+    def __init__(self, path):
+        self.names = {0: "person"}
+        self.callbacks = {}
+
+    def __call__(self, source, **kwargs):
+        # 첫 픽셀 255: 바로 죽음, 254: 잠깐 멈췄다가 죽음 (OOM/CUDA 에러 흉내), 253: 이 이미지만 예외
+        if not isinstance(source, list) and source[0, 0, 0] >= 254:
+            time.sleep(1.5 if source[0, 0, 0] == 254 else 0)
+            os._exit(1)
+        if not isinstance(source, list) and source[0, 0, 0] == 253:
+            raise ValueError("bad image")
+        return [_Result(frame) for frame in (source if isinstance(source, list) else [source])]
+
+    track = __call__
+'''
+
+
+@pytest.fixture(scope="session")
+def fake_ultralytics(tmp_path_factory):
+    root = tmp_path_factory.mktemp("fake_ultralytics")
+    (root / "ultralytics").mkdir()
+    (root / "ultralytics" / "__init__.py").write_text(textwrap.dedent(FAKE_ULTRALYTICS))
+    sys.path.insert(0, str(root))
+    yield root
+    sys.path.remove(str(root))
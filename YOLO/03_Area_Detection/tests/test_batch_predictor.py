@@ -0,0 +1,90 @@
+"""
+batch_predictor 묶음 추론 테스트
+
+같은 배치로 묶인 요청 중 한 이미지가 실패해도 그 이미지를 올린 요청만 실패하는지,
+max_pixels 를 넘는 업로드를 디코딩 단계에서 거르는지 확인한다.
+"""
+import sys
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from batch_predictor import BatchPredictor, ImagePredictError, ImageTooLargeError  # noqa: E402
+
+BAD = 255  # 첫 픽셀이 이 값이면 추론 실패
+
+
+def _frame(value=0):
+    frame = np.zeros((8, 8, 3), np.uint8)
+    frame[0, 0, 0] = value
+    return frame
+
+
+def _predict_concurrently(predictor, requests):
+    """요청 여러 개를 동시에 넣어서 한 배치로 묶이게 하고 요청별 결과(또는 예외) 반환"""
+    outcomes = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def run(i):
+        barrier.wait()
+        try:
+            outcomes[i] = predictor.predict(requests[i], timeout=10)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_failing_batch_only_fails_offending_request():
+    calls = []
+
+    def predict_fn(frames):
+        calls.append(len(frames))
+        if any(frame[0, 0, 0] == BAD for frame in frames):
+            raise ValueError("bad frame")
+        return [int(frame[0, 0, 0]) for frame in frames]
+
+    predictor = BatchPredictor(predict_fn, max_batch=8, max_wait=0.3)
+    try:
+        good, bad = _predict_concurrently(predictor, [[_frame(1), _frame(2)], [_frame(3), _frame(BAD)]])
+    finally:
+        predictor.close()
+    assert good == [1, 2]
+    assert isinstance(bad, ImagePredictError) and bad.index == 1
+    assert calls[0] == 4  # 한 배치로 묶였다가 한 장씩 다시
+
+
+def test_per_image_exception_results():
+    def predict_fn(frames):
+        return [ValueError("too big") if frame[0, 0, 0] == BAD else "ok" for frame in frames]
+
+    predictor = BatchPredictor(predict_fn, max_batch=8, max_wait=0.3)
+    try:
+        good, bad = _predict_concurrently(predictor, [[_frame()], [_frame(BAD)]])
+    finally:
+        predictor.close()
+    assert good == ["ok"]
+    assert isinstance(bad.error, ValueError) and bad.index == 0
+
+
+def test_decode_rejects_too_many_pixels():
+    predictor = BatchPredictor(lambda frames: frames, max_pixels=100 * 100)
+    try:
+        small = cv2.imencode(".png", np.zeros((100, 100, 3), np.uint8))[1].tobytes()
+        large = cv2.imencode(".png", np.zeros((100, 101, 3), np.uint8))[1].tobytes()
+        assert len(predictor.decode([small])) == 1
+        with pytest.raises(ImageTooLargeError) as excinfo:
+            predictor.decode([small, large])
+        assert (excinfo.value.index, excinfo.value.width, excinfo.value.height) == (1, 101, 100)
+    finally:
+        predictor.close()
@@ -0,0 +1,132 @@
+"""
+batch_process 추적 상태 테스트
+
+ultralytics 의 track() persist 동작을 흉내 낸 모델로, 배치 경계에서 추적 ID 가 유지되는지와
+소스가 바뀔 때 추적기가 초기화되는지 확인한다.
+"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import batch_process  # noqa: E402
+
+BOXES = {"A": [0.0, 0.0, 10.0, 10.0], "B": [20.0, 20.0, 30.0, 30.0]}
+
+
+class _Array:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = _Array(data)
+        self.id = _Array(data[:, 4])
+        self._len = len(data)
+
+    def __len__(self):
+        return self._len
+
+
+class FakeTracker:
+    """처음 보는 객체에 감지 순서대로 ID 부여, reset() 하면 ID 도 1부터 (BYTETracker 와 같음)"""
+
+    def __init__(self):
+        self.resets = 0
+        self.reset()
+        self.resets = 0
+
+    def reset(self):
+        self.known = {}
+        self.next_id = 1
+        self.resets += 1
+
+    def update(self, keys):
+        for key in keys:
+            if key not in self.known:
+                self.known[key] = self.next_id
+                self.next_id += 1
+        return [self.known[key] for key in keys]
+
+
+class FakeTrackingModel:
+    """
+    ultralytics track() 흉내
+    - 추적기는 첫 호출 때 만들어지고 그때의 persist 값을 계속 쓴다
+    - persist=False 면 입력 경로(배치 안 위치 image0, image1, ...)가 바뀔 때마다 추적기 초기화
+    """
+
+    def __init__(self):
+        self.predictor = None
+        self.persist_calls = []
+
+    def track(self, frames, persist=False, **kwargs):
+        self.persist_calls.append(persist)
+        if self.predictor is None:
+            self.predictor = SimpleNamespace(trackers=[FakeTracker()], persist=persist, vid_path=None)
+        tracker = self.predictor.trackers[0]
+        results = []
+        for i, frame in enumerate(frames):
+            path = f"image{i}"
+            if not self.predictor.persist and self.predictor.vid_path != path:
+                tracker.reset()
+            self.predictor.vid_path = path
+            # 프레임마다 감지 순서가 바뀐다 -> 초기화된 추적기는 다른 ID 를 붙인다
+            keys = ["A", "B"] if int(frame[0, 0, 0]) % 2 == 0 else ["B", "A"]
+            ids = tracker.update(keys)
+            data = np.array([BOXES[key] + [track_id, 0.9, 0] for key, track_id in zip(keys, ids)],
+                            dtype=np.float32)
+            results.append(SimpleNamespace(names={0: "person"}, boxes=_Boxes(data), masks=None))
+        return results
+
+
+class ListWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def _run(model, name, frames, batch):
+    args = SimpleNamespace(batch=batch, imgsz=640, conf=0.25, classes=None, device=None)
+    source = SimpleNamespace(path=Path(f"{name}.mp4"), name=name)
+    reader = [(i, i / 15, np.full((8, 8, 3), i, np.uint8)) for i in range(frames)]
+    writer = ListWriter()
+    done = batch_process.process_source(model, source, reader, None, args, writer, None)
+    assert done == frames
+    ids = {}
+    for record in writer.records:
+        for obj in record["objects"]:
+            key = "A" if obj["box"] == BOXES["A"] else "B"
+            ids.setdefault(key, set()).add(obj["track_id"])
+    return ids
+
+
+def test_track_ids_stable_across_batches():
+    model = FakeTrackingModel()
+    ids = _run(model, "cam1", frames=11, batch=4)
+    assert all(model.persist_calls)
+    assert len(ids["A"]) == 1 and len(ids["B"]) == 1
+    assert ids["A"] != ids["B"]
+
+
+def test_tracker_reset_between_sources():
+    model = FakeTrackingModel()
+    _run(model, "cam1", frames=5, batch=2)
+    tracker = model.predictor.trackers[0]
+    tracker.update(["C"])  # 이전 소스에만 있던 추적
+    ids = _run(model, "cam2", frames=5, batch=2)
+    assert tracker.resets == 1
+    assert "C" not in tracker.known
+    assert ids == {"A": {1}, "B": {2}}
@@ -0,0 +1,105 @@
+"""
+heatmap 누적 테스트
+
+레터박스 마스크가 원본 프레임 위치에 그대로 쌓이는지, 감쇠가 프레임이 없는 동안에도 실제 경과 시간만큼
+진행되는지, 더 큰 클래스 번호가 나와도 쌓인 값이 유지되는지, 체류 시간이 짧은 끊김은 이어서 세고 긴 끊김은 새 방문으로 나누는지 확인한다.
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from heatmap import DwellTimes, OccupancyHeatmap  # noqa: E402
+from inference_worker import Detections  # noqa: E402
+
+NAMES = {0: "person"}
+
+
+def _detections(masks=None, box=(0.0, 0.0, 16.0, 16.0)):
+    return Detections(
+        xyxy=np.array([box], dtype=np.float32),
+        conf=np.array([0.9], dtype=np.float32),
+        cls=np.array([0], dtype=np.int32),
+        ids=None,
+        masks=masks,
+        names=NAMES,
+    )
+
+
+def test_mask_letterbox_padding_removed():
+    # 360x640 프레임 -> 384x640 마스크 (위아래 12픽셀씩 패딩), 프레임 맨 위 줄 셀(0~16px)만 채운 마스크
+    mask = np.zeros((1, 384, 640), np.uint8)
+    mask[0, 12:28, 0:16] = 1
+    heatmap = OccupancyHeatmap(cell=16, half_life=None)
+    now = time.time()
+    heatmap.update(_detections(), (360, 640, 3), now - 0.5)
+    heatmap.update(_detections(mask), (360, 640, 3), now)
+    grid = heatmap.grid("person")
+    assert grid.shape == (23, 40)
+    assert np.isclose(grid.sum(), 0.5, atol=1e-4)
+    assert grid[0, 0] > 0.45
+
+
+def test_decay_uses_wall_clock_gap():
+    heatmap = OccupancyHeatmap(cell=16, half_life=10.0)
+    now = time.time()
+    heatmap.update(_detections(), (64, 64, 3), now - 30.5)
+    heatmap.update(_detections(), (64, 64, 3), now - 30.0)
+    before = float(heatmap._grid.sum())
+    # 30초 동안 프레임이 없어도 (스트림 중단) 조회 시점까지 세 번 반감
+    assert np.isclose(heatmap.grid().sum(), before / 8, rtol=1e-3)
+    # 끊긴 뒤 첫 프레임은 점유 누적을 MAX_FRAME_GAP 까지만, 감쇠는 이미 반영된 만큼 다시 하지 않는다
+    heatmap.update(_detections(), (64, 64, 3), now)
+    assert np.isclose(heatmap.grid().sum(), before / 8 + 1.0, rtol=1e-3)
+
+
+def test_decay_persists_across_restart(tmp_path):
+    path = tmp_path / "cam.npz"
+    heatmap = OccupancyHeatmap(cell=16, half_life=10.0, persist_path=path)
+    now = time.time()
+    heatmap.update(_detections(), (64, 64, 3), now - 21.0)
+    heatmap.update(_detections(), (64, 64, 3), now - 20.0)
+    heatmap.save()
+    restored = OccupancyHeatmap(cell=16, half_life=10.0, persist_path=path)
+    assert np.isclose(restored.grid().sum(), 0.25, rtol=1e-3)
+
+
+def test_new_class_keeps_accumulated_grid():
+    heatmap = OccupancyHeatmap(cell=16, half_life=None)
+    now = time.time()
+    heatmap.update(_detections(), (64, 64, 3), now - 1.0)
+    heatmap.update(_detections(), (64, 64, 3), now - 0.5)
+    car = Detections(xyxy=np.array([[32.0, 32.0, 48.0, 48.0]], dtype=np.float32),
+                     conf=np.array([0.9], dtype=np.float32), cls=np.array([2], dtype=np.int32),
+                     ids=None, masks=None, names={0: "person", 2: "car"})
+    heatmap.update(car, (64, 64, 3), now)
+    assert heatmap._grid.shape[0] == 3
+    assert np.isclose(heatmap.grid("person").sum(), 0.5, atol=1e-4)
+    assert np.isclose(heatmap.grid("car").sum(), 0.5, atol=1e-4)
+
+
+def test_dwell_counts_short_gaps_and_splits_long_ones():
+    dwell = DwellTimes(expire=5.0)
+    now = time.time()
+    inside = [{"track_id": 1, "cls": "person", "inside": True}]
+    dwell.update(inside, now - 20.0)
+    dwell.update(inside, now - 17.0)  # 3초 끊김 (expire 이내) -> 그대로 체류
+    dwell.update(inside, now - 2.0)   # 15초 끊김 -> 이전 방문 종료, 새 방문 시작
+    dwell.update(inside, now)
+    summary = dwell.summary()
+    assert summary["completed"]["person"] == {"visits": 1, "total_sec": 3.0, "avg_sec": 3.0, "max_sec": 3.0}
+    assert summary["active"] == [{"track_id": 1, "cls": "person", "dwell_sec": 2.0, "inside": True}]
+
+
+def test_dwell_summary_expires_idle_tracks():
+    dwell = DwellTimes(expire=5.0)
+    now = time.time()
+    inside = [{"track_id": 7, "cls": "person", "inside": True}]
+    dwell.update(inside, now - 12.0)
+    dwell.update(inside, now - 10.0)
+    summary = dwell.summary()
+    assert summary["active"] == []
+    assert summary["completed"]["person"]["visits"] == 1
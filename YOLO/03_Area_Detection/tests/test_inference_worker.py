@@ -0,0 +1,101 @@
+"""
+inference_worker 워커 풀 테스트
+
+가짜 ultralytics(conftest.py, 프레임 전체를 덮는 박스 하나를 돌려주는 모델)로 실제 워커 프로세스를 띄워서
+슬롯보다 큰 프레임이 줄여서 추론되고 박스가 원본 좌표로 돌아오는지, 워커가 죽으면 호출이 바로 실패하고
+슬롯을 회수해서 다시 띄운 워커로 계속 추론하는지 확인한다.
+"""
+import itertools
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference_worker import InferencePool, fit_frame, mask_size_for, predict_config_from_env  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def pool(fake_ultralytics):
+    pool = InferencePool("fake.pt", workers=1, slots=2, max_width=320, max_height=180).start(timeout=60)
+    yield pool
+    pool.close()
+
+
+def _frame(value=0):
+    frame = np.zeros((90, 160, 3), np.uint8)
+    frame[0, 0, 0] = value
+    return frame
+
+
+@pytest.mark.parametrize("value, imgsz, mask_size", [("640", 640, 640), ("640,480", [640, 480], 640),
+                                                      (" 720 , 1280 ", [720, 1280], 1280)])
+def test_detect_imgsz_from_env(monkeypatch, value, imgsz, mask_size):
+    monkeypatch.setenv("DETECT_IMGSZ", value)
+    config = predict_config_from_env()
+    assert config["imgsz"] == imgsz
+    assert mask_size_for(config) == mask_size
+
+
+@pytest.mark.parametrize("name, value", [("DETECT_IMGSZ", "64o"), ("DETECT_IMGSZ", "1,2,3"),
+                                         ("DETECT_IMGSZ", "0"), ("DETECT_CONF", "high"), ("DETECT_CLASSES", "person")])
+def test_invalid_detect_env_names_variable(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValueError, match=name):
+        predict_config_from_env()
+
+
+def test_fit_frame_keeps_aspect():
+    frame = np.zeros((1200, 2000, 3), np.uint8)
+    resized, scale = fit_frame(frame, 1920, 1080)
+    assert resized.shape == (1080, 1800, 3)
+    assert scale == pytest.approx((2000 / 1800, 1200 / 1080))
+    assert fit_frame(frame[:1080, :1920], 1920, 1080)[1] is None
+
+
+def test_oversized_frame_is_downscaled(pool):
+    detections = pool.infer(np.zeros((400, 1000, 3), np.uint8))
+    np.testing.assert_allclose(detections.xyxy[0], [0, 0, 1000, 400], rtol=1e-3)
+
+
+def test_frame_within_slot_unchanged(pool):
+    detections = pool.infer(np.zeros((180, 240, 3), np.uint8))
+    np.testing.assert_allclose(detections.xyxy[0], [0, 0, 240, 180])
+
+
+def test_dead_worker_fails_fast_and_restarts(fake_ultralytics):
+    pool = InferencePool("fake.pt", workers=1, slots=1, max_width=320, max_height=180).start(timeout=60)
+    try:
+        started = time.monotonic()
+        with pytest.raises(RuntimeError, match="워커 프로세스 종료"):
+            pool.infer(_frame(255), timeout=30)
+        assert time.monotonic() - started < 10
+        # 슬롯 하나를 돌려받아 다시 띄운 워커에서 추론
+        assert len(pool.infer(_frame(), timeout=30).cls) == 1
+
+        # 타임아웃으로 포기한 호출의 슬롯도 워커가 죽으면 회수
+        with pytest.raises(TimeoutError):
+            pool.infer(_frame(254), timeout=0.5)
+        assert len(pool.infer(_frame(), timeout=30).cls) == 1
+    finally:
+        pool.close()
+
+
+def test_worker_dropped_after_repeated_crashes(fake_ultralytics):
+    pool = InferencePool("fake.pt", workers=2, slots=1, max_width=320, max_height=180, max_restarts=1)
+    pool.start(timeout=60)
+    try:
+        pool._round_robin = itertools.repeat(0)  # 살아 있는 워커 중 첫 번째로만
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                pool.infer(_frame(255), timeout=30)
+        deadline = time.monotonic() + 10
+        while 0 not in pool._dead and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert pool._dead == {0}
+        assert all(len(pool.infer(_frame(), timeout=30).cls) == 1 for _ in range(3))
+    finally:
+        pool.close()
@@ -0,0 +1,92 @@
+"""
+/predict 워커 풀 경로 테스트
+
+INFERENCE_WORKERS=1 에 슬롯을 작게(320x180) 잡은 앱에 슬롯보다 큰 이미지를 올려서 200 과 원본 좌표 박스를 받는지,
+PREDICT_MAX_PIXELS 를 넘는 이미지는 413, 추론에 실패하는 이미지는 그 파일 이름으로 500 이고
+같은 배치로 묶인 다른 요청은 정상 응답하는지 확인한다.
+"""
+import importlib
+import os
+import sys
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+ENV = {
+    "INFERENCE_WORKERS": "1",
+    "INFERENCE_MAX_WIDTH": "320",
+    "INFERENCE_MAX_HEIGHT": "180",
+    "PREDICT_MAX_PIXELS": "1000000",
+    "PREDICT_MAX_WAIT_MS": "200",
+}
+
+
+@pytest.fixture(scope="module")
+def app_main(fake_ultralytics):
+    saved = {key: os.environ.get(key) for key in ENV}
+    os.environ.update(ENV)
+    sys.modules.pop("main", None)
+    main = importlib.import_module("main")
+    try:
+        yield main
+    finally:
+        if main.inference_pool is not None:
+            main.inference_pool.close()
+        main.predictor.close()
+        sys.modules.pop("main", None)
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+@pytest.fixture(scope="module")
+def client(app_main):
+    return TestClient(app_main.app)
+
+
+def _png(height, width, value=0):
+    image = np.zeros((height, width, 3), np.uint8)
+    image[0, 0, 0] = value
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def test_image_larger_than_slot(client):
+    response = client.post("/predict", files=[("files", ("wide.png", _png(400, 1000), "image/png"))])
+    assert response.status_code == 200
+    result = response.json()["results"][0]
+    assert (result["width"], result["height"]) == (1000, 400)
+    np.testing.assert_allclose(result["objects"][0]["box"], [0, 0, 1000, 400], atol=0.5)
+
+
+def test_too_many_pixels_is_413(client):
+    response = client.post("/predict", files=[("files", ("ok.png", _png(90, 160), "image/png")),
+                                              ("files", ("huge.png", _png(1000, 1001), "image/png"))])
+    assert response.status_code == 413
+    assert "huge.png" in response.json()["detail"]
+
+
+def test_failed_image_does_not_fail_batched_requests(client):
+    responses = {}
+    barrier = threading.Barrier(2)
+
+    def post(name, value):
+        barrier.wait()
+        responses[name] = client.post("/predict", files=[("files", (name, _png(90, 160, value), "image/png"))])
+
+    threads = [threading.Thread(target=post, args=("good.png", 0)),
+               threading.Thread(target=post, args=("bad.png", 253))]  # 가짜 모델이 예외를 내는 이미지
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert responses["good.png"].status_code == 200
+    assert responses["bad.png"].status_code == 500
+    assert "bad.png" in responses["bad.png"].json()["detail"]
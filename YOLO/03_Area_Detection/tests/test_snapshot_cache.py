@@ -0,0 +1,53 @@
+"""
+snapshot_cache 공유 프레임 생성기 테스트
+
+/video_feed 시청자가 여럿이어도 프레임 생성기(파이프라인)는 하나만 돌고 시청자마다 같은 프레임을 받는지,
+시청자가 모두 나가면 생성기가 멈추는지 확인한다.
+"""
+import itertools
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from snapshot_cache import SnapshotProducer  # noqa: E402
+
+
+def test_viewers_share_one_generator():
+    started = []
+
+    def gen_factory(cancel):
+        started.append(cancel)
+        for i in itertools.count():
+            if cancel.is_set():
+                return
+            time.sleep(0.01)
+            yield i
+
+    producer = SnapshotProducer(gen_factory, idle_timeout=0.0, check_interval=0.05)
+    received = [[], []]
+
+    def watch(i):
+        viewer = producer.viewer()
+        for frame in viewer:
+            received[i].append(frame)
+            if len(received[i]) == 10:
+                break
+        viewer.close()
+
+    threads = [threading.Thread(target=watch, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(started) == 1
+    for frames in received:
+        assert len(frames) == 10 and frames == sorted(set(frames))
+    assert set(received[0]) & set(received[1])  # 같은 생성기의 프레임
+
+    deadline = time.monotonic() + 5
+    while producer.running and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not producer.running and producer.viewers == 0
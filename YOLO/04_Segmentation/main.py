@@ -1,10 +1,12 @@
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse, StreamingResponse
 import cv2
+from functools import partial
 # ----------------------------
 # YOLOv8n  추가
 # ----------------------------
 from ultralytics import YOLO
+from frame_pipeline import FramePipeline, FramePool, Packet, Stage
 
 app = FastAPI()
 STREAM_URL = "https://safecity.busan.go.kr/playlist/cnRzcDovL2d1ZXN0Omd1ZXN0QDEwLjEuMjEwLjIxMDo1NTQvdXM2NzZyM0RMY0RuczYwdE1ESXdMVEk9/index.m3u8"
@@ -19,20 +21,46 @@ def get_model():
         model = YOLO("best.pt") # model = YOLO("yolov8n.pt")
     return model
 
-def gen_frames():
+def capture_frames(pool):
     cap = cv2.VideoCapture(STREAM_URL)
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        # ----------------------------
-        # YOLOv8n  추가
-        # ----------------------------
-        results = get_model()(frame)
-        frame = results[0].plot()
-        _, buffer = cv2.imencode('.jpg', frame)
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+    try:
+        while True:
+            ret, frame = pool.read(cap)  # cap.read(image=...) 로 프레임 버퍼 재사용
+            if not ret:
+                break
+            yield Packet(frame, pool=pool)
+    finally:
+        cap.release()
+
+# ----------------------------
+# YOLOv8n  추가
+# ----------------------------
+def infer_stage(packet):
+    packet.results = get_model()(packet.frame)
+    return packet
+
+def render_stage(packet):
+    packet.frame = packet.results[0].plot()
+    return packet
+
+def encode_stage(packet):
+    _, buffer = cv2.imencode('.jpg', packet.frame)
+    # 인코딩 버퍼를 파트에 한 번만 복사 (tobytes() + 이어 붙이기 대신)
+    packet.part = b''.join((b'--frame\r\nContent-Type: image/jpeg\r\n\r\n', buffer, b'\r\n'))
+    return packet
+
+def gen_frames():
+    # 캡처 / 추론 / 그리기 / 인코딩을 각자 스레드에서 겹쳐 실행 (추론이 밀리면 오래된 프레임부터 버림)
+    pipeline = FramePipeline(partial(capture_frames, FramePool()), [
+        Stage("infer", infer_stage, policy="drop_oldest"),
+        Stage("render", render_stage),
+        Stage("encode", encode_stage),
+    ]).start()
+    try:
+        for packet in pipeline:
+            yield packet.part
+    finally:
+        pipeline.close()
 
 @app.get("/init", response_class=HTMLResponse)
 def init():
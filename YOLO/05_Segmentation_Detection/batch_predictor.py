@@ -0,0 +1,165 @@
+"""
+정지 이미지 추론 요청 묶음 처리 (/predict 용)
+
+- 업로드된 이미지는 스레드 풀에서 디코딩 (cv2.imdecode 는 GIL 을 놓는다)
+- 동시에 들어온 요청의 이미지를 모아서 모델을 한 번에 호출
+  첫 이미지가 들어온 뒤 max_wait 초 안에 들어온 것까지, 최대 max_batch 장
+- 모델 호출은 전용 스레드 하나에서만 (predict_fn 은 스레드 안전하지 않아도 된다)
+- 한 이미지의 실패는 그 이미지를 올린 요청만 실패시킨다 (같은 배치로 묶인 다른 요청은 그대로 결과를 받는다)
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ImageDecodeError(ValueError):
+    """이미지로 디코딩할 수 없는 업로드"""
+
+    def __init__(self, index):
+        super().__init__(f"{index}번째 파일을 이미지로 읽을 수 없습니다.")
+        self.index = index
+
+
+class ImageTooLargeError(ValueError):
+    """max_pixels 보다 큰 업로드"""
+
+    def __init__(self, index, width, height, max_pixels):
+        super().__init__(f"{index}번째 이미지 {width}x{height} 가 최대 {max_pixels} 픽셀을 넘습니다.")
+        self.index = index
+        self.width = width
+        self.height = height
+
+
+class ImagePredictError(RuntimeError):
+    """이미지 한 장의 추론 실패 (error: 원래 예외)"""
+
+    def __init__(self, index, error):
+        super().__init__(f"{index}번째 이미지 추론 실패: {error}")
+        self.index = index
+        self.error = error
+
+
+class BatchPredictor:
+    """
+    predict_fn: [BGR 프레임, ...] -> [결과, ...] (같은 순서, 보통 Detections 리스트)
+                이미지별로 실패하면 그 자리에 예외 객체를 넣어도 된다
+    max_batch: 한 번에 모델에 넣을 최대 이미지 수
+    max_wait: 배치를 채우려고 기다리는 최대 시간(초) = 요청당 추가 지연 상한
+    decode_workers: 디코딩 스레드 수
+    max_pixels: 디코딩한 이미지 최대 픽셀 수 (넘으면 ImageTooLargeError, None 이면 제한 없음)
+    """
+
+    def __init__(self, predict_fn, max_batch=8, max_wait=0.02, decode_workers=4, max_pixels=None):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.max_pixels = max_pixels
+        self.batches = 0
+        self.images = 0
+        self._queue = queue.Queue()
+        self._decoder = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="predict-decode")
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _decode(data):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def decode(self, datas):
+        """업로드 바이트 목록 -> BGR 프레임 목록 (실패하면 ImageDecodeError, 너무 크면 ImageTooLargeError)"""
+        frames = list(self._decoder.map(self._decode, datas))
+        for index, frame in enumerate(frames):
+            if frame is None:
+                raise ImageDecodeError(index)
+            height, width = frame.shape[:2]
+            if self.max_pixels is not None and height * width > self.max_pixels:
+                raise ImageTooLargeError(index, width, height, self.max_pixels)
+        return frames
+
+    def predict(self, frames, timeout=60.0):
+        """
+        프레임 목록 추론 (다른 요청과 같은 배치로 묶일 수 있다), 결과는 입력 순서대로
+        실패한 이미지가 있으면 첫 번째 것의 ImagePredictError
+        """
+        self._ensure_started()
+        futures = []
+        for frame in frames:
+            future = Future()
+            self._queue.put((frame, future))
+            futures.append(future)
+        results = []
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result(timeout=timeout))
+            except Exception as e:
+                raise ImagePredictError(index, e) from e
+        return results
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._decoder.shutdown(wait=False)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="predict-batcher")
+                self._thread.start()
+
+    def _collect(self):
+        """첫 요청을 기다린 뒤 max_wait 안에 들어온 요청까지 모은다 (None 이 있으면 종료 표시)"""
+        first = self._queue.get()
+        if first is None:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if not batch:
+                continue
+            try:
+                results = self.predict_fn([frame for frame, _ in batch])
+            except Exception as e:
+                logger.error(f"배치 추론 오류 ({len(batch)}장): {e}")
+                if len(batch) == 1:
+                    results = [e]
+                else:
+                    # 어느 이미지 때문인지 모르니 한 장씩 다시 -> 실패한 이미지의 요청만 실패
+                    results = [self._predict_one(frame) for frame, _ in batch]
+            self.batches += 1
+            self.images += len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _predict_one(self, frame):
+        try:
+            return self.predict_fn([frame])[0]
+        except Exception as e:
+            return e
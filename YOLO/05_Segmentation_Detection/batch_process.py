@@ -0,0 +1,182 @@
+"""
+녹화 영상 / 이미지 오프라인 배치 처리 (세그멘테이션 + 라벨 영역 이탈 판정)
+
+실시간 스트림 대신 로컬 파일을 최대 속도로 처리한다.
+- 소스별 백그라운드 디코딩 + 다음 소스 미리 디코딩
+- 여러 프레임을 묶어서 한 번에 추론 (--batch)
+- 기본은 그리기 없음, --render 를 주면 주석 영상/이미지 저장
+
+사용 예:
+    python batch_process.py recordings/ --output results.jsonl
+    python batch_process.py cam1.mp4 cam2.mp4 --output results.parquet --batch 16 --render annotated/
+"""
+import argparse
+import logging
+import time
+from contextlib import closing
+from pathlib import Path
+
+import cv2
+from ultralytics import YOLO
+
+import main
+from batch_io import ResultWriter, discover_sources, iter_batches, open_sources
+from inference_worker import extract_detections
+
+logger = logging.getLogger("batch_process")
+
+# Parquet 출력용 객체 필드 (JSONL 은 같은 키를 그대로 기록)
+OBJECT_FIELDS = [
+    ("class_id", "int32"),
+    ("name", "string"),
+    ("confidence", "float32"),
+    ("overstep_ratio", "float32"),
+    ("level", "string"),
+    ("label_class_id", "int32"),
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="녹화 영상 세그멘테이션/이탈 판정 배치 처리")
+    parser.add_argument("inputs", nargs="+", help="동영상 파일 또는 동영상/이미지 디렉토리")
+    parser.add_argument("--output", default="results.jsonl", help="결과 파일 (.jsonl 또는 .parquet)")
+    parser.add_argument("--model", default=main.MODEL_PATH, help="YOLO 세그멘테이션 모델")
+    parser.add_argument("--labels-dir", default=main.LABELS_DIR, help="기준 라벨 영역 디렉토리")
+    parser.add_argument("--data-yaml", default=main.DATA_YAML, help="클래스 정보 파일")
+    parser.add_argument("--batch", type=int, default=8, help="한 번에 추론할 프레임 수")
+    parser.add_argument("--imgsz", type=int, default=640, help="추론 입력 크기")
+    parser.add_argument("--conf", type=float, default=0.25, help="모델 신뢰도 임계값")
+    parser.add_argument("--classes", type=lambda v: [int(c) for c in v.split(",")], default=None,
+                        help="처리할 클래스 ID (쉼표 구분, 없으면 전체)")
+    parser.add_argument("--device", default=None, help="추론 장치 (예: cpu, 0)")
+    parser.add_argument("--stride", type=int, default=1, help="N 프레임마다 1장만 처리")
+    parser.add_argument("--decode-workers", type=int, default=4, help="이미지 디코딩 스레드 수")
+    parser.add_argument("--prefetch", type=int, default=16, help="소스별 미리 디코딩할 최대 프레임 수")
+    parser.add_argument("--prefetch-mb", type=float, default=128, help="소스별 미리 디코딩한 프레임의 최대 메모리 (MB)")
+    parser.add_argument("--read-ahead", type=int, default=1, help="처리 중인 소스 외에 미리 디코딩을 시작할 소스 수")
+    parser.add_argument("--render", default=None, help="주석 영상/이미지를 저장할 디렉토리")
+    return parser.parse_args(argv)
+
+
+def build_record(source, index, time_sec, detections, segments):
+    """프레임 하나의 결과 레코드"""
+    return {
+        "source": str(source.path),
+        "frame": index,
+        "time_sec": round(time_sec, 3) if time_sec is not None else None,
+        "counts": main.count_detected_objects(detections),
+        "objects": main.detections_to_objects(detections, segments),
+    }
+
+
+class Renderer:
+    """주석 프레임 저장 (동영상 소스는 mp4, 이미지 소스는 jpg)"""
+
+    def __init__(self, output_dir, fps=15.0, stride=1):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.default_fps = fps
+        self.stride = max(1, stride)
+        self.fps = fps / self.stride
+        self.writer = None
+        self.source = None
+
+    def open(self, source):
+        self.close()
+        self.source = source
+        if source.kind == "video":
+            cap = cv2.VideoCapture(str(source.path))
+            # stride 프레임마다 1장만 쓰므로 재생 속도가 원본과 같도록 fps 도 stride 로 나눈다
+            self.fps = (cap.get(cv2.CAP_PROP_FPS) or self.default_fps) / self.stride
+            cap.release()
+        else:
+            (self.output_dir / source.name).mkdir(parents=True, exist_ok=True)
+
+    def write(self, index, frame, detections, segments):
+        frame, masks_info = main.draw_predefined_masks(frame)
+        frame = main.draw_segmentation_contours(frame, detections, masks_info, segments)
+        frame = main.draw_detection_info(frame, detections)
+
+        if self.source.kind == "images":
+            name = self.source.images[index].stem if index < len(self.source.images) else str(index)
+            cv2.imwrite(str(self.output_dir / self.source.name / f"{name}.jpg"), frame)
+            return
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            path = self.output_dir / f"{self.source.name}_annotated.mp4"
+            self.writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+def process_source(model, source, reader, args, writer, renderer):
+    """소스 하나 처리, 처리한 프레임 수 반환"""
+    frames_done = 0
+    for batch in iter_batches(reader, args.batch):
+        frames = [frame for _, _, frame in batch]
+        results = model(frames, verbose=False, imgsz=args.imgsz, conf=args.conf,
+                        classes=args.classes, device=args.device, batch=len(frames))
+
+        for (index, time_sec, frame), result in zip(batch, results):
+            detections = extract_detections(result)
+            height, width = frame.shape[:2]
+            segments = main.analyze_segments(detections, main.predefined_masks, width, height,
+                                             with_contours=renderer is not None)
+            writer.write(build_record(source, index, time_sec, detections, segments))
+            if renderer is not None:
+                renderer.write(index, frame, detections, segments)
+        frames_done += len(batch)
+    return frames_done
+
+
+def run(argv=None):
+    args = parse_args(argv)
+
+    main.LABELS_DIR = args.labels_dir
+    main.DATA_YAML = args.data_yaml
+    main.load_class_names_from_yaml()
+    main.load_label_files()
+
+    sources = discover_sources(args.inputs)
+    if not sources:
+        logger.error("처리할 입력이 없습니다.")
+        return 1
+    logger.info(f"{len(sources)}개 소스 처리 시작: {sources}")
+
+    model = YOLO(args.model)
+    renderer = Renderer(args.render, stride=args.stride) if args.render else None
+    started = time.time()
+    total = 0
+
+    # 중간에 예외로 빠져나가도 미리 디코딩 중인 리더까지 정리되도록 제너레이터를 바로 닫는다
+    opened = closing(open_sources(sources, args.stride, args.prefetch, args.decode_workers,
+                                  read_ahead=args.read_ahead, max_bytes=int(args.prefetch_mb * 2**20)))
+    with ResultWriter(args.output, OBJECT_FIELDS) as writer, opened as readers:
+        for source, reader in readers:
+            source_started = time.time()
+            if renderer is not None:
+                renderer.open(source)
+            try:
+                frames_done = process_source(model, source, reader, args, writer, renderer)
+            except Exception as e:
+                logger.error(f"소스 처리 실패 ({source.path}): {e}")
+                continue
+            finally:
+                if renderer is not None:
+                    renderer.close()
+            elapsed = time.time() - source_started
+            total += frames_done
+            logger.info(f"{source.name}: {frames_done}프레임, {elapsed:.1f}초 "
+                        f"({frames_done / max(elapsed, 1e-6):.1f} FPS)")
+
+    elapsed = time.time() - started
+    logger.info(f"완료: 총 {total}프레임, {elapsed:.1f}초 ({total / max(elapsed, 1e-6):.1f} FPS)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run())
@@ -0,0 +1,308 @@
+"""
+best.pt 모델을 labels/ 정답(YOLO-seg 다각형)과 비교 평가
+
+- 이미지 읽기 + 정답 다각형 래스터화는 스레드 풀에서 병렬 처리
+- 여러 장을 묶어서 한 번에 추론 (--batch)
+- 지표 계산은 numpy 배열 연산으로 한 번에 (객체 간 IoU 는 행렬곱)
+- 읽을 수 없는 이미지/라벨은 경고 후 건너뛰고 리포트에 개수와 파일 이름을 남긴다
+
+지표:
+- 클래스별 마스크 IoU (데이터셋 전체 픽셀 기준 교집합/합집합)
+- 클래스별 precision / recall / F1 / AP50 (객체 단위, IoU >= --iou 이면 정답)
+- 클래스별 이탈(overstep) 통계: 예측 마스크 중 같은 클래스 정답 영역 밖의 비율 (평균/중앙값/p95, 단계별 개수)
+
+사용 예:
+    python evaluate.py --images images/val --labels labels --output report.json
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+import main
+from batch_io import IMAGE_EXTS, iter_batches
+from inference_worker import extract_detections
+
+logger = logging.getLogger("evaluate")
+
+
+def bounded_map(pool, fn, items, window):
+    """pool.map 과 같지만 최대 window 개만 미리 제출 (전체 이미지를 한꺼번에 메모리에 올리지 않음)"""
+    pending = []
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="세그멘테이션 모델 평가 (labels/ 정답 기준)")
+    parser.add_argument("--images", required=True, help="평가 이미지 디렉토리 (라벨 파일과 같은 이름)")
+    parser.add_argument("--labels", default=main.LABELS_DIR, help="YOLO-seg 라벨 디렉토리")
+    parser.add_argument("--data-yaml", default=main.DATA_YAML, help="클래스 정보 파일")
+    parser.add_argument("--model", default=main.MODEL_PATH, help="평가할 모델")
+    parser.add_argument("--batch", type=int, default=8, help="한 번에 추론할 이미지 수")
+    parser.add_argument("--imgsz", type=int, default=640, help="추론 입력 크기")
+    parser.add_argument("--conf", type=float, default=0.25, help="예측 신뢰도 임계값")
+    parser.add_argument("--iou", type=float, default=0.5, help="객체 매칭 IoU 임계값")
+    parser.add_argument("--eval-width", type=int, default=640, help="마스크 비교 해상도 (너비, 비율 유지)")
+    parser.add_argument("--device", default=None, help="추론 장치 (예: cpu, 0)")
+    parser.add_argument("--workers", type=int, default=8, help="로딩/지표 계산 스레드 수")
+    parser.add_argument("--output", default="eval_report.json", help="결과 리포트 JSON")
+    return parser.parse_args(argv)
+
+
+def find_pairs(images_dir, labels_dir):
+    """같은 이름(stem)의 (이미지, 라벨) 쌍 찾기"""
+    images = {p.stem: p for p in Path(images_dir).iterdir() if p.suffix.lower() in IMAGE_EXTS}
+    pairs = []
+    for label_file in sorted(Path(labels_dir).glob("*.txt")):
+        image = images.get(label_file.stem)
+        if image is None:
+            logger.warning(f"이미지 없음, 건너뜀: {label_file.name}")
+            continue
+        pairs.append((image, label_file))
+    return pairs
+
+
+def eval_size(image, eval_width):
+    height, width = image.shape[:2]
+    eval_w = min(eval_width, width)
+    eval_h = max(1, int(round(height * eval_w / width)))
+    return eval_w, eval_h
+
+
+def load_sample(pair, eval_width):
+    """이미지 읽기 + 정답 다각형을 평가 해상도의 객체별 마스크로 래스터화"""
+    image_path, label_path = pair
+    image = cv2.imread(str(image_path))
+    if image is None:
+        raise IOError(f"이미지 읽기 실패: {image_path}")
+    eval_w, eval_h = eval_size(image, eval_width)
+
+    gt = main.parse_label_file(label_path)
+    gt_masks = np.zeros((len(gt), eval_h, eval_w), dtype=np.uint8)
+    scale = np.array([eval_w, eval_h], dtype=np.float32)
+    for i, mask_info in enumerate(gt):
+        points = np.round(np.asarray(mask_info['points'], dtype=np.float32) * scale).astype(np.int32)
+        cv2.fillPoly(gt_masks[i], [points], 1)
+    gt_cls = np.array([m['class_id'] for m in gt], dtype=np.int32)
+    return image, gt_cls, gt_masks.reshape(len(gt), -1).astype(bool)
+
+
+def try_load_sample(pair, eval_width, skipped):
+    """load_sample 과 같지만 실패하면 경고 후 skipped 에 이미지 이름을 넣고 None"""
+    try:
+        return load_sample(pair, eval_width)
+    except (OSError, ValueError, cv2.error) as e:
+        logger.warning(f"건너뜀: {pair[0].name} ({e})")
+        skipped.append(pair[0].name)
+        return None
+
+
+def prediction_masks(detections, eval_w, eval_h):
+    """예측 마스크를 평가 해상도로 한 번에 변환 -> (n, eval_h * eval_w) bool"""
+    n = len(detections.cls)
+    if n == 0 or detections.masks is None:
+        return np.zeros((0, eval_h * eval_w), dtype=bool)
+    stacked = np.ascontiguousarray(detections.masks.transpose(1, 2, 0))
+    resized = main.resize_mask_to_frame(stacked, eval_w, eval_h)
+    if resized.ndim == 2:
+        resized = resized[:, :, None]
+    return resized.reshape(-1, n).T > 0
+
+
+def evaluate_sample(num_classes, iou_threshold, gt_cls, gt_masks, pred_cls, pred_conf, pred_masks):
+    """이미지 한 장의 지표 (모두 배열 연산)"""
+    classes = np.arange(num_classes)
+
+    # 클래스별 의미론적 마스크 (클래스마다 객체 마스크 합집합)
+    gt_onehot = gt_cls[None, :] == classes[:, None]          # (C, g)
+    pred_onehot = pred_cls[None, :] == classes[:, None]      # (C, n)
+    gt_union = (gt_onehot.astype(np.float32) @ gt_masks.astype(np.float32)) > 0        # (C, HW)
+    pred_union = (pred_onehot.astype(np.float32) @ pred_masks.astype(np.float32)) > 0  # (C, HW)
+    intersection = np.logical_and(gt_union, pred_union).sum(axis=1)
+    union = np.logical_or(gt_union, pred_union).sum(axis=1)
+
+    # 객체 단위 IoU 행렬 (행렬곱으로 교집합 계산)
+    pred_f = pred_masks.astype(np.float32)
+    gt_f = gt_masks.astype(np.float32)
+    inter = pred_f @ gt_f.T                                   # (n, g)
+    area_p = pred_f.sum(axis=1)
+    area_g = gt_f.sum(axis=1)
+    iou = inter / np.maximum(area_p[:, None] + area_g[None, :] - inter, 1.0)
+    iou[pred_cls[:, None] != gt_cls[None, :]] = 0.0           # 다른 클래스끼리는 매칭 안 함
+
+    # 신뢰도 순으로 탐욕적 매칭
+    tp = np.zeros(len(pred_cls), dtype=bool)
+    matched = np.zeros(len(gt_cls), dtype=bool)
+    for p in np.argsort(-pred_conf):
+        if iou.shape[1] == 0:
+            break
+        candidates = np.where(matched, 0.0, iou[p])
+        g = int(np.argmax(candidates))
+        if candidates[g] >= iou_threshold:
+            tp[p] = True
+            matched[g] = True
+
+    # 이탈 비율: 예측 마스크 중 같은 클래스 정답 영역 밖 비율
+    if len(pred_cls):
+        own_gt = gt_union[np.clip(pred_cls, 0, num_classes - 1)]
+        outside = np.logical_and(pred_masks, ~own_gt).sum(axis=1)
+        overstep = outside / np.maximum(area_p, 1.0)
+    else:
+        overstep = np.zeros(0, dtype=np.float32)
+
+    return {
+        "intersection": intersection,
+        "union": union,
+        "gt_count": gt_onehot.sum(axis=1),
+        "pred_cls": pred_cls,
+        "pred_conf": pred_conf,
+        "tp": tp,
+        "overstep": overstep.astype(np.float32),
+    }
+
+
+def average_precision(conf, tp, gt_count):
+    """AP (모든 점 보간, VOC 방식)"""
+    if gt_count == 0 or len(conf) == 0:
+        return 0.0
+    order = np.argsort(-conf)
+    tp_cum = np.cumsum(tp[order])
+    fp_cum = np.cumsum(~tp[order])
+    recall = tp_cum / gt_count
+    precision = tp_cum / np.maximum(tp_cum + fp_cum, 1)
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+
+def build_report(samples, names, args, elapsed, skipped=()):
+    """이미지별 결과를 모아서 클래스별 리포트 생성"""
+    num_classes = len(names)
+    intersection = np.sum([s["intersection"] for s in samples], axis=0)
+    union = np.sum([s["union"] for s in samples], axis=0)
+    gt_count = np.sum([s["gt_count"] for s in samples], axis=0)
+    pred_cls = np.concatenate([s["pred_cls"] for s in samples])
+    pred_conf = np.concatenate([s["pred_conf"] for s in samples])
+    tp = np.concatenate([s["tp"] for s in samples])
+    overstep = np.concatenate([s["overstep"] for s in samples])
+
+    classes = {}
+    for c in range(num_classes):
+        selected = pred_cls == c
+        n_pred = int(selected.sum())
+        n_tp = int(tp[selected].sum())
+        n_gt = int(gt_count[c])
+        precision = n_tp / n_pred if n_pred else 0.0
+        recall = n_tp / n_gt if n_gt else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        ratios = overstep[selected]
+        levels = {"normal": 0, "warning": 0, "danger": 0}
+        for level in map(main.get_overstep_level, ratios.tolist()):
+            levels[level] += 1
+        classes[names[c]] = {
+            "mask_iou": float(intersection[c] / union[c]) if union[c] else None,
+            "gt": n_gt,
+            "pred": n_pred,
+            "tp": n_tp,
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(f1, 4),
+            "ap50": round(average_precision(pred_conf[selected], tp[selected], n_gt), 4),
+            "overstep_mean": round(float(ratios.mean()), 4) if n_pred else None,
+            "overstep_p50": round(float(np.percentile(ratios, 50)), 4) if n_pred else None,
+            "overstep_p95": round(float(np.percentile(ratios, 95)), 4) if n_pred else None,
+            "overstep_levels": levels,
+        }
+
+    ious = [v["mask_iou"] for v in classes.values() if v["mask_iou"] is not None]
+    return {
+        "model": args.model,
+        "images": len(samples),
+        "skipped_images": len(skipped),
+        "skipped_files": sorted(skipped),
+        "conf": args.conf,
+        "iou_threshold": args.iou,
+        "eval_width": args.eval_width,
+        "elapsed_sec": round(elapsed, 1),
+        "mean_mask_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "mean_ap50": round(float(np.mean([v["ap50"] for v in classes.values() if v["gt"]] or [0.0])), 4),
+        "classes": classes,
+    }
+
+
+def print_report(report):
+    skipped = f", 건너뜀 {report['skipped_images']}장" if report["skipped_images"] else ""
+    print(f"\n모델: {report['model']}  이미지: {report['images']}장{skipped}  ({report['elapsed_sec']}초)")
+    print(f"{'class':<14}{'IoU':>8}{'P':>8}{'R':>8}{'AP50':>8}{'gt':>6}{'pred':>6}{'overstep':>10}")
+    for name, v in report["classes"].items():
+        iou = f"{v['mask_iou']:.3f}" if v["mask_iou"] is not None else "-"
+        over = f"{v['overstep_mean']:.3f}" if v["overstep_mean"] is not None else "-"
+        print(f"{name:<14}{iou:>8}{v['precision']:>8.3f}{v['recall']:>8.3f}{v['ap50']:>8.3f}"
+              f"{v['gt']:>6}{v['pred']:>6}{over:>10}")
+    print(f"mean IoU: {report['mean_mask_iou']}  mAP50: {report['mean_ap50']}\n")
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    main.DATA_YAML = args.data_yaml
+    main.load_class_names_from_yaml()
+
+    pairs = find_pairs(args.images, args.labels)
+    if not pairs:
+        logger.error("평가할 (이미지, 라벨) 쌍이 없습니다.")
+        return 1
+    logger.info(f"{len(pairs)}장 평가 시작")
+
+    model = YOLO(args.model)
+    names = main.class_names_from_yaml or dict(model.names)
+    num_classes = max(names) + 1
+    names = {c: names.get(c, f"Class_{c}") for c in range(num_classes)}
+
+    started = time.time()
+    samples = []
+    skipped = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        loaded = bounded_map(pool, lambda pair: try_load_sample(pair, args.eval_width, skipped), pairs,
+                             window=args.batch * 2)
+        loaded = (sample for sample in loaded if sample is not None)
+        futures = []
+        for batch in iter_batches(loaded, args.batch):
+            images = [image for image, _, _ in batch]
+            results = model(images, verbose=False, imgsz=args.imgsz, conf=args.conf,
+                            device=args.device, batch=len(images))
+            for (image, gt_cls, gt_masks), result in zip(batch, results):
+                detections = extract_detections(result)
+                eval_w, eval_h = eval_size(image, args.eval_width)
+                pred_masks = prediction_masks(detections, eval_w, eval_h)
+                futures.append(pool.submit(
+                    evaluate_sample, num_classes, args.iou, gt_cls, gt_masks,
+                    detections.cls[:len(pred_masks)], detections.conf[:len(pred_masks)], pred_masks,
+                ))
+        samples = [f.result() for f in futures]
+
+    if not samples:
+        logger.error(f"읽을 수 있는 이미지가 없습니다 (건너뜀 {len(skipped)}장).")
+        return 1
+    report = build_report(samples, names, args, time.time() - started, skipped)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    logger.info(f"리포트 저장: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run())
@@ -0,0 +1,183 @@
+"""
+저대역폭 H.264 출력 (MJPEG 와 함께 제공)
+
+- 주석이 그려진 프레임을 스트림당 한 번만 H.264 로 인코딩 (PyAV / libx264, zerolatency)
+- FFmpeg HLS 먹서로 fMP4 세그먼트(init_S.mp4 + seg_S_NNNNN.m4s)와 index.m3u8 을 작업 디렉토리에 쓴다
+  S 는 인코딩 세션 번호 -> 재시작/해상도 변경 후에도 캐시된 이전 세그먼트와 이름이 겹치지 않는다.
+- 시청자는 몇 명이든 같은 세그먼트 파일을 받아 간다 (인코딩 비용은 시청자 수와 무관)
+- 타임스탬프는 프레임 캡처 시각 기준 (가변 프레임레이트), 세그먼트 길이마다 키프레임을 강제
+- 작업 디렉토리는 첫 프레임을 쓸 때 만들고, close() 하면 그 세션 파일을 지우고, cleanup() 하면 디렉토리까지 지운다.
+"""
+import logging
+import re
+import shutil
+import tempfile
+import threading
+import time
+from fractions import Fraction
+from pathlib import Path
+
+import av
+from av.video.frame import PictureType
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "index.m3u8"
+# 밖에서 요청할 수 있는 파일 이름 (경로 조작 방지)
+_FILE_PATTERN = re.compile(r"^(index\.m3u8|init_\d+\.mp4|seg_\d+_\d+\.m4s)$")
+MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mp4": "video/mp4",
+    ".m4s": "video/iso.segment",
+}
+
+
+class HlsOutput:
+    """
+    프레임 -> H.264 fMP4 HLS
+
+    output_dir: 세그먼트를 쓸 디렉토리 (없으면 처음 인코딩할 때 임시 디렉토리를 만들고 cleanup() 때 삭제)
+    segment_duration: 세그먼트 길이(초) = 키프레임 간격
+    list_size: 플레이리스트에 남길 세그먼트 수 (오래된 세그먼트 파일은 삭제)
+    crf / preset: libx264 화질/속도
+    """
+
+    def __init__(self, output_dir=None, segment_duration=1.0, list_size=6, crf=26, preset="veryfast"):
+        self.output_dir = Path(output_dir) if output_dir else None
+        self._owns_dir = output_dir is None
+        self._disposed = False
+        self.segment_duration = segment_duration
+        self.list_size = list_size
+        self.crf = crf
+        self.preset = preset
+        self.frames = 0
+        self._container = None
+        self._stream = None
+        self._session = int(time.time())
+        self._start = None
+        self._last_pts = -1
+        self._last_key = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_name(name):
+        """밖에서 요청할 수 있는 파일 이름인지"""
+        return bool(_FILE_PATTERN.match(name))
+
+    @property
+    def playlist_path(self):
+        return self.output_dir / PLAYLIST_NAME if self.output_dir is not None else None
+
+    def path(self, name):
+        """요청 파일 이름 -> 실제 경로 (허용되지 않은 이름이거나 아직 인코딩 전이면 None)"""
+        if not self.valid_name(name) or self.output_dir is None:
+            return None
+        return self.output_dir / name
+
+    def ready(self):
+        path = self.playlist_path
+        return path is not None and path.exists()
+
+    def wait_ready(self, timeout=15.0):
+        """지금 세션의 플레이리스트가 생길 때까지(첫 세그먼트 완성) 대기"""
+        deadline = time.time() + timeout
+        while not self.ready():
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _open(self, width, height):
+        if self.output_dir is None:
+            self.output_dir = Path(tempfile.mkdtemp(prefix="h264_output_"))
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._clear_files()
+        self._session += 1
+        self._container = av.open(str(self.playlist_path), mode="w", format="hls", options={
+            "hls_time": str(self.segment_duration),
+            "hls_list_size": str(self.list_size),
+            "hls_flags": "delete_segments+independent_segments+omit_endlist",
+            "hls_segment_type": "fmp4",
+            "hls_fmp4_init_filename": f"init_{self._session}.mp4",
+            "hls_segment_filename": str(self.output_dir / f"seg_{self._session}_%05d.m4s"),
+        })
+        stream = self._container.add_stream("libx264", rate=15)
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = "yuv420p"
+        stream.time_base = Fraction(1, 1000)
+        stream.codec_context.time_base = Fraction(1, 1000)
+        stream.options = {"preset": self.preset, "tune": "zerolatency", "crf": str(self.crf)}
+        self._stream = stream
+        self._start = None
+        self._last_pts = -1
+        self._last_key = None
+        logger.info(f"H.264 출력 시작 ({width}x{height}): {self.playlist_path}")
+
+    def write(self, frame, captured_at):
+        """BGR 프레임 하나 인코딩 (호출이 끝나면 frame 버퍼를 재사용해도 된다)"""
+        with self._lock:
+            if self._disposed:
+                return
+            height, width = frame.shape[:2]
+            width, height = width // 2 * 2, height // 2 * 2  # yuv420p 는 짝수 크기만
+            if self._container is not None and (self._stream.width, self._stream.height) != (width, height):
+                logger.info(f"H.264 출력 해상도 변경 {self._stream.width}x{self._stream.height} -> {width}x{height}")
+                self._close_container()
+            if self._container is None:
+                self._open(width, height)
+
+            if self._start is None:
+                self._start = captured_at
+            pts = max(int((captured_at - self._start) * 1000), self._last_pts + 1)
+            self._last_pts = pts
+
+            video_frame = av.VideoFrame.from_ndarray(frame[:height, :width], format="bgr24")
+            video_frame.pts = pts
+            video_frame.time_base = self._stream.codec_context.time_base
+            if self._last_key is None or captured_at - self._last_key >= self.segment_duration:
+                video_frame.pict_type = PictureType.I  # 세그먼트 경계마다 키프레임
+                self._last_key = captured_at
+            for packet in self._stream.encode(video_frame):
+                self._container.mux(packet)
+            self.frames += 1
+
+    def _close_container(self):
+        try:
+            for packet in self._stream.encode():
+                self._container.mux(packet)
+            self._container.close()
+        except Exception as e:
+            logger.warning(f"H.264 출력 종료 중 오류: {e}")
+        self._container = None
+        self._stream = None
+
+    def _clear_files(self):
+        """작업 디렉토리의 플레이리스트/세그먼트 삭제 (플레이리스트부터 -> 끝난 세션을 ready 로 보지 않음)"""
+        if self.output_dir is None or not self.output_dir.exists():
+            return
+        names = sorted((p for p in self.output_dir.iterdir() if self.valid_name(p.name)),
+                       key=lambda p: p.name != PLAYLIST_NAME)
+        for path in names:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def close(self):
+        """인코딩 마무리 후 이번 세션 파일 삭제 (다음 write() 때 새 세션으로 다시 연다)"""
+        with self._lock:
+            if self._container is None:
+                return
+            self._close_container()
+            self._clear_files()
+            logger.info(f"H.264 출력 종료 ({self.frames} 프레임)")
+
+    def cleanup(self):
+        """close() + 직접 만든 임시 디렉토리 삭제 (앱 종료 시)"""
+        self.close()
+        with self._lock:
+            self._disposed = True
+            if self._owns_dir and self.output_dir is not None:
+                shutil.rmtree(self.output_dir, ignore_errors=True)
+                self.output_dir = None
@@ -0,0 +1,605 @@
+"""
+별도 프로세스 추론 워커 풀
+
+- 웹 프로세스(uvicorn)와 YOLO 추론을 분리해서 GIL 경쟁을 없앤다.
+- 프레임은 multiprocessing.shared_memory 링 버퍼로 전달한다 (numpy 배열 피클링 없음).
+- 결과는 같은 슬롯의 결과 영역에 압축 배열(박스/신뢰도/클래스/추적 ID/비트마스크)로 돌려준다.
+- 큐로는 (슬롯 번호, 높이, 너비) 같은 작은 튜플만 오간다.
+- 슬롯보다 큰 프레임은 비율을 유지해서 줄여 보내고, 박스 좌표는 원본 프레임 기준으로 되돌린다.
+- 워커 프로세스가 죽으면(OOM, CUDA 에러 등) 기다리던 호출을 바로 실패시키고 슬롯을 회수한 뒤 다시 띄운다.
+"""
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_DETECTIONS = 100   # 프레임당 최대 객체 수 (model 호출 시 max_det 로 전달)
+BOX_FIELDS = 7         # x1, y1, x2, y2, conf, cls, track_id
+HEADER_FIELDS = 4      # 객체 수, 마스크 높이, 마스크 너비, 플래그(bit0: ID, bit1: 마스크)
+
+FLAG_IDS = 1
+FLAG_MASKS = 2
+
+WORKER_CHECK_INTERVAL = 1.0  # 워커 프로세스 생존 확인 주기 (초)
+
+DEFAULT_IMGSZ = 640    # imgsz 를 지정하지 않았을 때 ultralytics 기본 입력 크기
+MODEL_STRIDE = 32      # 입력 크기는 이 배수로 올림 (마스크도 입력 크기)
+
+
+class Detections(NamedTuple):
+    """한 프레임의 추론 결과 (ultralytics Results 대신 쓰는 numpy 배열 묶음)"""
+    xyxy: np.ndarray             # (n, 4) float32, 원본 프레임 픽셀 좌표
+    conf: np.ndarray             # (n,) float32
+    cls: np.ndarray              # (n,) int32
+    ids: Optional[np.ndarray]    # (n,) int32, 추적 ID (track 모드가 아니면 None)
+    masks: Optional[np.ndarray]  # (n, mh, mw) uint8 0/1, 세그멘테이션 모델이 아니면 None
+    names: dict                  # 클래스 ID -> 이름
+
+
+def empty_detections(names):
+    """객체가 하나도 없는 결과"""
+    return Detections(
+        xyxy=np.zeros((0, 4), dtype=np.float32),
+        conf=np.zeros(0, dtype=np.float32),
+        cls=np.zeros(0, dtype=np.int32),
+        ids=None,
+        masks=None,
+        names=names,
+    )
+
+
+def extract_detections(result):
+    """ultralytics Results 하나를 Detections 로 변환 (텐서 -> numpy 한 번에)"""
+    names = dict(result.names)
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return empty_detections(names)
+
+    data = boxes.data.cpu().numpy()
+    ids = None
+    if boxes.id is not None:
+        ids = boxes.id.cpu().numpy().astype(np.int32)
+
+    masks = None
+    if result.masks is not None:
+        masks = (result.masks.data.cpu().numpy() > 0.5).astype(np.uint8)
+
+    return Detections(
+        xyxy=np.ascontiguousarray(data[:, :4], dtype=np.float32),
+        conf=data[:, -2].astype(np.float32),
+        cls=data[:, -1].astype(np.int32),
+        ids=ids,
+        masks=masks,
+        names=names,
+    )
+
+
+def parse_imgsz(value):
+    """imgsz 문자열 -> int ("640") 또는 [h, w] ("640,480", ultralytics 와 같은 순서)"""
+    sizes = [int(v) for v in value.split(",") if v.strip()]
+    if len(sizes) not in (1, 2) or min(sizes) <= 0:
+        raise ValueError(value)
+    return sizes[0] if len(sizes) == 1 else sizes
+
+
+def _env_value(name, parse, expected):
+    """환경 변수 name 을 parse 로 변환 (없으면 None, 잘못된 값이면 변수 이름과 기대 형식을 담은 ValueError)"""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return parse(value)
+    except ValueError:
+        raise ValueError(f"{name}={value!r} 를 해석할 수 없습니다 ({expected})") from None
+
+
+def predict_config_from_env(classes=None, conf=None, imgsz=None):
+    """
+    모델 호출 인자(classes / conf / imgsz) 구성 - DETECT_CLASSES, DETECT_CONF, DETECT_IMGSZ 환경 변수 우선
+    모델 안에서 걸러야 필요 없는 객체가 NMS 이후 마스크 생성/후처리까지 가지 않는다.
+    인자는 환경 변수가 없을 때의 기본값 (None 이면 모델 기본값 사용)
+    """
+    value = _env_value("DETECT_CLASSES", lambda v: [int(c) for c in v.split(",") if c.strip()],
+                       "쉼표로 구분한 클래스 ID, 예: 0,2")
+    if value is not None:
+        classes = value
+    value = _env_value("DETECT_CONF", float, "0~1 사이 실수, 예: 0.4")
+    if value is not None:
+        conf = value
+    value = _env_value("DETECT_IMGSZ", parse_imgsz, "정수 또는 높이,너비, 예: 640 / 640,480")
+    if value is not None:
+        imgsz = value
+
+    config = {}
+    if classes is not None:
+        config["classes"] = list(classes)
+    if conf is not None:
+        config["conf"] = conf
+    if imgsz is not None:
+        config["imgsz"] = imgsz
+    return config
+
+
+def count_classes(detections, min_confidence=None):
+    """클래스명별 객체 수 (클래스 배열에 np.bincount 한 번, 클래스 ID 순)"""
+    cls = detections.cls
+    if min_confidence is not None:
+        cls = cls[detections.conf > min_confidence]
+    if len(cls) == 0:
+        return {}
+    counts = np.bincount(cls)
+    names = detections.names
+    return {names.get(class_id, f"Class_{class_id}"): int(counts[class_id])
+            for class_id in np.flatnonzero(counts).tolist()}
+
+
+def mask_size_for(predict_kwargs, max_width=1920, max_height=1080):
+    """
+    모델 호출 인자로 나올 수 있는 세그멘테이션 마스크의 최대 변 길이
+    마스크는 모델 입력(imgsz 를 stride 배수로 올린 크기, 레터박스) 해상도, retina_masks 면 원본 프레임 해상도
+    """
+    predict_kwargs = predict_kwargs or {}
+    if predict_kwargs.get("retina_masks"):
+        return max(max_width, max_height)
+    imgsz = predict_kwargs.get("imgsz") or DEFAULT_IMGSZ
+    size = max(imgsz) if isinstance(imgsz, (list, tuple)) else int(imgsz)
+    return -(-size // MODEL_STRIDE) * MODEL_STRIDE
+
+
+def fit_frame(frame, max_width, max_height):
+    """
+    슬롯(max_width x max_height)보다 큰 프레임을 비율 유지하며 줄인다
+    -> (프레임, 배율) - 배율은 줄인 프레임 좌표에 곱하면 원본 좌표가 되는 (x, y) 값, 줄이지 않았으면 None
+    """
+    height, width = frame.shape[:2]
+    if height <= max_height and width <= max_width:
+        return frame, None
+    scale = min(max_width / width, max_height / height)
+    size = (max(1, min(max_width, int(round(width * scale)))), max(1, min(max_height, int(round(height * scale)))))
+    resized = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return resized, (width / size[0], height / size[1])
+
+
+def predict_untracked(model, source, **kwargs):
+    """
+    추적 없이 모델 호출 (정지 이미지 추론용)
+    ultralytics 는 track() 를 한 번 호출한 모델에 추적기 후처리 콜백을 계속 붙여 두어서 일반 호출에도 추적기가 돈다.
+    호출 동안만 그 콜백을 떼어 놓는다 -> 같은 모델의 track() 과 동시에 부르면 안 된다 (호출자가 직렬화).
+    """
+    callbacks = getattr(model, "callbacks", {}).get("on_predict_postprocess_end")
+    if not callbacks:
+        return model(source, **kwargs)
+    saved = list(callbacks)
+    # predictor 도 같은 리스트를 참조하므로 제자리에서 바꾼다
+    callbacks[:] = [cb for cb in saved
+                    if getattr(getattr(cb, "func", cb), "__module__", "") != "ultralytics.trackers.track"]
+    try:
+        return model(source, **kwargs)
+    finally:
+        callbacks[:] = saved
+
+
+class FrameRing:
+    """
+    워커 1개 전용 공유 메모리 링 버퍼
+
+    슬롯 하나 = [프레임 영역 | 결과 헤더 | 박스 배열 | 비트 패킹된 마스크]
+    name 이 없으면 새로 만들고(부모 프로세스), 있으면 기존 블록에 붙는다(워커 프로세스).
+    """
+
+    def __init__(self, slots, max_height, max_width, mask_size, name=None):
+        self.slots = slots
+        self.max_height = max_height
+        self.max_width = max_width
+        self.mask_size = mask_size
+
+        self.frame_bytes = max_height * max_width * 3
+        self.header_bytes = HEADER_FIELDS * 4
+        self.box_bytes = MAX_DETECTIONS * BOX_FIELDS * 4
+        self.packed_width = (mask_size + 7) // 8
+        self.mask_bytes = MAX_DETECTIONS * mask_size * self.packed_width
+        self.slot_bytes = self.frame_bytes + self.header_bytes + self.box_bytes + self.mask_bytes
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _offset(self, slot):
+        return slot * self.slot_bytes
+
+    def frame_view(self, slot, height, width):
+        """슬롯의 프레임 영역을 (height, width, 3) uint8 배열로 본다 (복사 없음)"""
+        return np.ndarray((height, width, 3), dtype=np.uint8,
+                          buffer=self.shm.buf, offset=self._offset(slot))
+
+    def _result_views(self, slot):
+        base = self._offset(slot) + self.frame_bytes
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int32, buffer=self.shm.buf, offset=base)
+        boxes = np.ndarray((MAX_DETECTIONS, BOX_FIELDS), dtype=np.float32,
+                           buffer=self.shm.buf, offset=base + self.header_bytes)
+        masks = np.ndarray((MAX_DETECTIONS, self.mask_size, self.packed_width), dtype=np.uint8,
+                           buffer=self.shm.buf, offset=base + self.header_bytes + self.box_bytes)
+        return header, boxes, masks
+
+    def write_result(self, slot, detections):
+        """Detections 를 슬롯 결과 영역에 기록 (워커 프로세스에서 호출)"""
+        header, boxes, masks = self._result_views(slot)
+        n = min(len(detections.conf), MAX_DETECTIONS)
+        flags = 0
+
+        boxes[:n, :4] = detections.xyxy[:n]
+        boxes[:n, 4] = detections.conf[:n]
+        boxes[:n, 5] = detections.cls[:n]
+        if detections.ids is not None:
+            boxes[:n, 6] = detections.ids[:n]
+            flags |= FLAG_IDS
+
+        mask_h = mask_w = 0
+        if detections.masks is not None and n > 0:
+            mask_h, mask_w = detections.masks.shape[1:3]
+            if mask_h > self.mask_size or mask_w > self.mask_size:
+                raise ValueError(f"마스크 크기 {mask_w}x{mask_h} 가 최대 {self.mask_size} 를 넘습니다.")
+            packed = np.packbits(detections.masks[:n], axis=2)
+            masks[:n, :mask_h, :packed.shape[2]] = packed
+            flags |= FLAG_MASKS
+
+        header[:] = (n, mask_h, mask_w, flags)
+
+    def read_result(self, slot, names):
+        """슬롯 결과 영역을 Detections 로 읽기 (부모 프로세스, 작은 배열만 복사)"""
+        header, boxes, masks = self._result_views(slot)
+        n, mask_h, mask_w, flags = (int(v) for v in header)
+        if n == 0:
+            return empty_detections(names)
+
+        rows = boxes[:n].copy()
+        ids = rows[:, 6].astype(np.int32) if flags & FLAG_IDS else None
+        mask_arr = None
+        if flags & FLAG_MASKS:
+            packed = masks[:n, :mask_h, :(mask_w + 7) // 8]
+            mask_arr = np.unpackbits(packed, axis=2, count=mask_w)
+
+        return Detections(
+            xyxy=rows[:, :4],
+            conf=rows[:, 4],
+            cls=rows[:, 5].astype(np.int32),
+            ids=ids,
+            masks=mask_arr,
+            names=names,
+        )
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(index, model_path, mode, ring_args, predict_kwargs, tasks, results):
+    """워커 프로세스 본체: 모델 로딩 후 슬롯 번호를 받아 추론하고 결과를 슬롯에 기록"""
+    ring = FrameRing(*ring_args)
+    try:
+        from ultralytics import YOLO
+        model = YOLO(model_path)
+        results.put(("ready", index, -1, dict(model.names)))
+    except Exception as e:
+        results.put(("failed", index, -1, str(e)))
+        ring.close()
+        return
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, height, width, task_mode = task
+            frame = ring.frame_view(slot, height, width)
+            try:
+                if (task_mode or mode) == "track":
+                    output = model.track(frame, persist=True, verbose=False, **predict_kwargs)
+                else:
+                    output = predict_untracked(model, frame, verbose=False, **predict_kwargs)
+                ring.write_result(slot, extract_detections(output[0]))
+                results.put(("done", index, slot, None))
+            except Exception as e:
+                results.put(("error", index, slot, str(e)))
+            frame = None  # 공유 메모리 뷰 참조 해제 (close 전에 필요)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class _Pending:
+    __slots__ = ("event", "error", "abandoned")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+        self.abandoned = False
+
+
+class InferencePool:
+    """
+    추론 워커 프로세스 풀
+
+    - workers 개의 프로세스가 각자 모델을 한 번씩만 로딩한다 (HTTP 워커 수와 무관).
+    - 워커마다 slots 개의 공유 메모리 슬롯이 있고, 빈 슬롯이 없으면 infer() 가 기다린다 (백프레셔).
+    - mode="track" 이면 같은 key 의 프레임은 항상 같은 워커로 보낸다 (추적기 상태 유지).
+    - mask_size 를 주지 않으면 predict_kwargs 의 imgsz 로 정한다 (mask_size_for).
+    - max_width x max_height 는 슬롯 프레임 크기, 이보다 큰 프레임은 줄여서 추론한다 (fit_frame).
+    - 죽은 워커는 다시 띄운다. 추론을 한 번도 못 하고 max_restarts 번 연달아 죽으면 그 워커는 빼고 나머지로만 보낸다.
+    """
+
+    def __init__(self, model_path, workers=1, slots=4, mode="predict",
+                 max_width=1920, max_height=1080, mask_size=None, predict_kwargs=None, max_restarts=5):
+        self.model_path = model_path
+        self.workers = workers
+        self.slots = slots
+        self.mode = mode
+        self.max_width = max_width
+        self.max_height = max_height
+        self.predict_kwargs = dict(predict_kwargs or {})
+        self.predict_kwargs.setdefault("max_det", MAX_DETECTIONS)
+        self.mask_size = mask_size or mask_size_for(self.predict_kwargs, max_width, max_height)
+        self.max_restarts = max_restarts
+
+        self.names = {}
+        self._ctx = mp.get_context("spawn")
+        self._rings = []
+        self._tasks = []
+        self._processes = []
+        self._free = []
+        self._ready = []
+        self._load_errors = {}
+        self._restarts = []     # 워커별 연속 재시작 횟수 (추론이 한 번 성공하면 0)
+        self._dead = set()      # 재시작 한도를 넘겨 더 이상 쓰지 않는 워커
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._results = None
+        self._dispatcher = None
+        self._executor = None
+        self._closed = False
+        self._resize_logged = False
+
+    def start(self, timeout=120.0):
+        """워커 프로세스를 띄우고 모델 로딩이 끝날 때까지 대기"""
+        self._results = self._ctx.Queue()
+        for index in range(self.workers):
+            free = queue.Queue()
+            for slot in range(self.slots):
+                free.put(slot)
+
+            self._rings.append(FrameRing(self.slots, self.max_height, self.max_width, self.mask_size))
+            self._tasks.append(None)
+            self._processes.append(None)
+            self._free.append(free)
+            self._ready.append(threading.Event())
+            self._restarts.append(0)
+            self._spawn(index)
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True, name="inference-dispatch")
+        self._dispatcher.start()
+
+        for index, ready in enumerate(self._ready):
+            if not ready.wait(timeout):
+                self.close()
+                raise TimeoutError(f"추론 워커 {index} 가 {timeout}초 안에 준비되지 않았습니다.")
+            if index in self._load_errors:
+                self.close()
+                raise RuntimeError(f"추론 워커 {index} 모델 로딩 실패: {self._load_errors[index]}")
+        logger.info(f"추론 워커 {self.workers}개 준비 완료 (모드: {self.mode}, 슬롯: {self.slots})")
+        return self
+
+    def _spawn(self, index):
+        """워커 프로세스 하나 시작 (새 작업 큐, 공유 메모리 링은 그대로 재사용)"""
+        ring = self._rings[index]
+        tasks = self._ctx.Queue()
+        ring_args = (self.slots, self.max_height, self.max_width, self.mask_size, ring.name)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.model_path, self.mode, ring_args,
+                  self.predict_kwargs, tasks, self._results),
+            daemon=True,
+            name=f"inference-worker-{index}",
+        )
+        process.start()
+        self._tasks[index] = tasks
+        self._processes[index] = process
+
+    def _check_workers(self):
+        """죽은 워커 처리: 기다리던 호출 실패, 포기한 호출의 슬롯 회수, 다시 띄우기 (dispatcher 스레드에서)"""
+        for index, process in enumerate(self._processes):
+            if self._closed or index in self._dead or process.is_alive():
+                continue
+            process.join(timeout=0)
+            self._drain()  # 죽기 직전에 보낸 결과부터 처리 (같은 슬롯을 다시 쓰는 호출과 섞이지 않도록)
+            reason = self._load_errors.pop(index, None) or f"exit code {process.exitcode}"
+            with self._lock:
+                for key, pending in list(self._pending.items()):
+                    if key[0] != index:
+                        continue
+                    if pending.abandoned:
+                        del self._pending[key]
+                        self._free[index].put(key[1])
+                    elif not pending.event.is_set():
+                        pending.error = f"워커 프로세스 종료 ({reason})"
+                        pending.event.set()
+                self._restarts[index] += 1
+                if self._restarts[index] > self.max_restarts:
+                    self._dead.add(index)
+                    logger.error(f"추론 워커 {index} 가 {self.max_restarts}번 연달아 죽어서 더 이상 쓰지 않습니다 ({reason})")
+                    continue
+                logger.error(f"추론 워커 {index} 종료 ({reason}), 다시 시작합니다 "
+                             f"({self._restarts[index]}/{self.max_restarts})")
+                # 작업 큐를 바꾸는 동안 infer() 가 옛 큐에 작업을 넣지 않도록 잠금 안에서
+                self._spawn(index)
+
+    def _drain(self):
+        """결과 큐에 이미 와 있는 메시지 처리 (종료 표시는 dispatcher 루프가 보도록 다시 넣는다)"""
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return
+            if message is None:
+                self._results.put(None)
+                return
+            self._handle(message)
+
+    def _dispatch(self):
+        """결과 큐를 읽어서 기다리는 infer() 호출을 깨우는 스레드 (WORKER_CHECK_INTERVAL 마다 워커 생존 확인)"""
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= WORKER_CHECK_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            self._handle(message)
+
+    def _handle(self, message):
+        kind, index, slot, payload = message
+        if kind == "ready":
+            self.names = payload
+            if self._ready[index].is_set():
+                logger.info(f"추론 워커 {index} 재시작 완료")
+            self._ready[index].set()
+            return
+        if kind == "failed":
+            self._load_errors[index] = payload
+            self._ready[index].set()
+            return
+
+        with self._lock:
+            pending = self._pending.get((index, slot))
+            if pending is None:
+                return
+            if pending.abandoned:
+                # 타임아웃으로 포기한 요청: 이제야 슬롯을 돌려준다
+                del self._pending[(index, slot)]
+                self._free[index].put(slot)
+                return
+        if kind == "error":
+            pending.error = payload
+        else:
+            self._restarts[index] = 0
+        pending.event.set()
+
+    def _pick_worker(self, key):
+        alive = [index for index in range(self.workers) if index not in self._dead]
+        if not alive:
+            raise RuntimeError("사용할 수 있는 추론 워커가 없습니다.")
+        if key is not None and self.mode == "track":
+            return alive[hash(key) % len(alive)]
+        return alive[next(self._round_robin) % len(alive)]
+
+    def infer(self, frame, key=None, timeout=10.0, mode=None):
+        """
+        프레임 하나를 워커에서 추론하고 Detections 반환 (호출 스레드는 결과까지 블록)
+        mode: 이 프레임만 풀 모드 대신 "predict" / "track" 으로 (track 풀에 추적 없는 정지 이미지 추론 등)
+        """
+        if self._closed:
+            raise RuntimeError("추론 풀이 이미 종료되었습니다.")
+        frame, scale = fit_frame(frame, self.max_width, self.max_height)
+        if scale is not None and not self._resize_logged:
+            self._resize_logged = True
+            logger.warning(f"슬롯 크기 {self.max_width}x{self.max_height} 보다 큰 프레임은 줄여서 추론합니다 "
+                           f"(원본 {round(frame.shape[1] * scale[0])}x{round(frame.shape[0] * scale[1])}, "
+                           f"INFERENCE_MAX_WIDTH / INFERENCE_MAX_HEIGHT 로 슬롯 크기 조정)")
+        height, width = frame.shape[:2]
+
+        index = self._pick_worker(key)
+        try:
+            slot = self._free[index].get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"추론 워커 {index} 에 빈 슬롯이 없습니다.")
+
+        ring = self._rings[index]
+        np.copyto(ring.frame_view(slot, height, width), frame)
+
+        pending = _Pending()
+        with self._lock:
+            self._pending[(index, slot)] = pending
+            self._tasks[index].put((slot, height, width, mode))
+
+        if not pending.event.wait(timeout):
+            with self._lock:
+                if pending.event.is_set():
+                    pass  # 타임아웃 직후 결과 도착
+                else:
+                    pending.abandoned = True
+                    raise TimeoutError(f"추론 워커 {index} 응답 시간 초과")
+
+        try:
+            if pending.error is not None:
+                raise RuntimeError(f"추론 워커 {index} 에러: {pending.error}")
+            detections = ring.read_result(slot, self.names)
+        finally:
+            with self._lock:
+                self._pending.pop((index, slot), None)
+            self._free[index].put(slot)
+        if scale is not None and len(detections.cls):
+            detections = detections._replace(xyxy=detections.xyxy * np.array(scale * 2, dtype=np.float32))
+        return detections
+
+    def infer_many(self, frames, timeout=10.0, mode=None, return_exceptions=False):
+        """
+        여러 프레임을 빈 슬롯/워커에 나눠 동시에 추론, 결과는 입력 순서 (key 없이 라운드 로빈)
+        return_exceptions: 실패한 프레임 자리에 예외 객체를 넣어서 돌려준다 (False 면 모두 끝난 뒤 첫 예외를 다시 던짐)
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers * self.slots,
+                                                    thread_name_prefix="inference-many")
+        futures = [self._executor.submit(self.infer, frame, timeout=timeout, mode=mode) for frame in frames]
+        results = [future.exception() or future.result() for future in futures]
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+        return results
+
+    def close(self):
+        """워커 종료 및 공유 메모리 해제"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self._results is not None:
+            self._results.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=2)
+        for ring in self._rings:
+            ring.close()
+        logger.info("추론 워커 풀 종료")
@@ -1,31 +1,70 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 import cv2
 import time
 import logging
 import numpy as np
 import os
+import threading
+from functools import partial
 from pathlib import Path
+from typing import List
 import yaml
 # ----------------------------
 # YOLOv8n  추가
 # ----------------------------
 from ultralytics import YOLO
+from batch_predictor import BatchPredictor, ImageDecodeError, ImagePredictError, ImageTooLargeError
+from frame_pipeline import FramePipeline, FramePool, Packet, Stage
+from h264_output import MEDIA_TYPES, PLAYLIST_NAME, HlsOutput
+from inference_worker import InferencePool, count_classes, extract_detections, predict_config_from_env
+from snapshot_cache import RENDITIONS, SnapshotCache, SnapshotProducer
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
-STREAM_URL = "https://safecity.busan.go.kr/playlist/cnRzcDovL2d1ZXN0Omd1ZXN0QDEwLjEuMjEwLjIxMDo1NTQvdXM2NzZyM0RMY0RuczYwdE1ESXdMVEk9/index.m3u8"
+STREAM_URL = os.environ.get("STREAM_URL", "https://safecity.busan.go.kr/playlist/cnRzcDovL2d1ZXN0Omd1ZXN0QDEwLjEuMjEwLjIxMDo1NTQvdXM2NzZyM0RMY0RuczYwdE1ESXdMVEk9/index.m3u8")
+# 스트림 수신 방식: "opencv" (cv2.VideoCapture / FFmpeg) 또는 "hls" (플레이리스트 직접 폴링 + PyAV 디코딩)
+STREAM_BACKEND = os.environ.get("STREAM_BACKEND", "opencv")
+STREAM_NAME = os.environ.get("STREAM_NAME", "default")  # /snapshot?stream= 에 쓰는 이름
+SNAPSHOT_MAX_AGE = 2.0  # 이보다 오래된 스냅샷이면 백그라운드 생성 시작 (초)
 LABELS_DIR = "labels"  # 라벨 파일 디렉토리
 DATA_YAML = "data.yaml"  # 클래스 정보 파일
+MODEL_PATH = "best.pt"
+# 0이면 기존처럼 웹 프로세스 안에서 추론, 1 이상이면 별도 프로세스 워커 풀 사용
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+INFERENCE_SLOTS = int(os.environ.get("INFERENCE_SLOTS", "4"))  # 워커당 공유 메모리 프레임 슬롯 수
+# 워커 슬롯 프레임 크기 (이보다 큰 프레임/이미지는 비율 유지하며 줄여서 추론, 박스는 원본 좌표로 되돌림)
+INFERENCE_MAX_WIDTH = int(os.environ.get("INFERENCE_MAX_WIDTH", "1920"))
+INFERENCE_MAX_HEIGHT = int(os.environ.get("INFERENCE_MAX_HEIGHT", "1080"))
+# 스트림별 모델 호출 인자 (DETECT_CLASSES / DETECT_CONF / DETECT_IMGSZ), 신뢰도 0.3 미만은 모델 안에서 제외
+PREDICT_CONFIG = {STREAM_NAME: predict_config_from_env(conf=0.3)}
+PIPELINE_QUEUE_SIZE = 2  # 파이프라인 단계 사이 큐 크기 (작을수록 지연이 짧다)
+# 1이면 MJPEG 와 함께 H.264 fMP4 HLS 출력 제공 (/hls/index.m3u8, 스트림당 인코딩 1회를 모든 시청자가 공유)
+H264_OUTPUT = os.environ.get("H264_OUTPUT", "0") == "1"
+H264_SEGMENT_DURATION = 1.0  # 세그먼트 길이(초), 시청 지연은 대략 세그먼트 2~3개
+H264_CRF = 26  # libx264 화질 (클수록 작고 흐림)
+H264_IDLE_TIMEOUT = 30.0  # 마지막 HLS 요청 후 이 시간(초)이 지나면 H.264 인코딩 중지
+# /predict: 동시에 들어온 이미지를 최대 PREDICT_MAX_BATCH 장까지 묶어서 추론 (묶으려고 최대 PREDICT_MAX_WAIT_MS 대기)
+PREDICT_MAX_BATCH = int(os.environ.get("PREDICT_MAX_BATCH", "8"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "20"))
+PREDICT_MAX_PIXELS = int(os.environ.get("PREDICT_MAX_PIXELS", "40000000"))  # 이보다 큰 업로드 이미지는 413 (약 8K)
 # ----------------------------
 # YOLOv8n  추가
 # ----------------------------
 model = None
+model_lock = threading.Lock()  # 프로세스 내 모델 호출 직렬화 (스트림 시청자 여러 명 + /predict)
+inference_pool = None
+inference_pool_lock = threading.Lock()
 predefined_masks = []  # 미리 정의된 마스크 저장
+snapshot_cache = SnapshotCache()  # 스트림별 최신 JPEG
+h264_output = None  # H.264 HLS 출력 (처음 /hls 요청 때 생성)
+h264_output_lock = threading.Lock()
+h264_last_request = 0.0  # 마지막 /hls 요청 시각 (이때부터 H264_IDLE_TIMEOUT 동안만 인코딩)
 class_names_from_yaml = {}  # data.yaml에서 읽은 클래스명
+detection_summaries = {}  # 스트림별 최근 프레임 클래스별 감지 개수
 
 # 클래스별 색상 정의 (클래스 ID: BGR 색상)
 CLASS_COLORS = {
@@ -73,6 +112,33 @@ def load_class_names_from_yaml():
     except Exception as e:
         logger.error(f"data.yaml 읽기 오류: {e}")
 
+def parse_label_file(label_file):
+    """YOLO-seg 라벨 파일 하나 파싱 -> [{'class_id', 'points', 'file'}, ...]"""
+    masks = []
+    with open(label_file, 'r') as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) < 5:  # 최소한 class_id + 2개 좌표 필요
+                continue
+            
+            class_id = int(parts[0])
+            # 나머지는 x, y 좌표 쌍 (정규화된 값 0~1)
+            coords = list(map(float, parts[1:]))
+            
+            # x, y 좌표 쌍으로 분리
+            points = []
+            for i in range(0, len(coords), 2):
+                if i + 1 < len(coords):
+                    points.append((coords[i], coords[i+1]))
+            
+            if len(points) >= 3:  # 최소 3개 점 필요
+                masks.append({
+                    'class_id': class_id,
+                    'points': points,
+                    'file': Path(label_file).name
+                })
+    return masks
+
 def load_label_files():
     """labels 폴더의 모든 라벨 파일 로드"""
     global predefined_masks
@@ -87,28 +153,7 @@ def load_label_files():
     
     for label_file in label_files:
         try:
-            with open(label_file, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) < 5:  # 최소한 class_id + 2개 좌표 필요
-                        continue
-                    
-                    class_id = int(parts[0])
-                    # 나머지는 x, y 좌표 쌍 (정규화된 값 0~1)
-                    coords = list(map(float, parts[1:]))
-                    
-                    # x, y 좌표 쌍으로 분리
-                    points = []
-                    for i in range(0, len(coords), 2):
-                        if i + 1 < len(coords):
-                            points.append((coords[i], coords[i+1]))
-                    
-                    if len(points) >= 3:  # 최소 3개 점 필요
-                        predefined_masks.append({
-                            'class_id': class_id,
-                            'points': points,
-                            'file': label_file.name
-                        })
+            predefined_masks.extend(parse_label_file(label_file))
         except Exception as e:
             logger.error(f"라벨 파일 읽기 오류 ({label_file}): {e}")
     
@@ -117,7 +162,7 @@ def load_label_files():
 def draw_predefined_masks(frame):
     """프레임에 미리 정의된 영역을 클래스별 색상 박스로 그리기"""
     if not predefined_masks:
-        return frame
+        return frame, predefined_masks
     
     height, width = frame.shape[:2]
     
@@ -191,17 +236,17 @@ def draw_predefined_masks(frame):
     
     return frame, predefined_masks
 
-def calculate_overlap_and_overstep(seg_mask, label_mask):
-    """세그멘테이션과 라벨 영역의 겹침 및 이탈 정도 계산"""
+def calculate_overlap_and_overstep(seg_mask, label_mask, scratch=None):
+    """세그멘테이션과 라벨 영역의 겹침 및 이탈 정도 계산 (scratch: 재사용할 프레임 크기 작업 버퍼)"""
     if seg_mask is None or label_mask is None:
         return 0.0
     
     # 라벨 영역 내부
-    inside = cv2.bitwise_and(seg_mask, label_mask)
-    inside_area = np.sum(inside > 0)
+    inside = cv2.bitwise_and(seg_mask, label_mask, dst=scratch)
+    inside_area = cv2.countNonZero(inside)
     
     # 세그멘테이션 전체 영역
-    seg_area = np.sum(seg_mask > 0)
+    seg_area = cv2.countNonZero(seg_mask)
     
     if seg_area == 0:
         return 0.0
@@ -220,40 +265,28 @@ def get_lighter_color(color):
     lighter_r = min(255, r + int((255 - r) * 0.5))
     return (lighter_b, lighter_g, lighter_r)
 
-def find_matching_label_class(seg_mask, predefined_masks, width, height):
-    """세그멘테이션이 어느 라벨 영역과 가장 많이 겹치는지 찾기"""
+def find_matching_label_class(seg_mask, predefined_masks, width, height, buffers=None):
+    """세그멘테이션이 어느 라벨 영역과 가장 많이 겹치는지 찾기 (buffers: 라벨별 마스크를 캐시한 SegmentBuffers)"""
     max_overlap = 0
     matching_class_id = None
     
-    for mask_info in predefined_masks:
-        # 라벨 마스크 생성
-        label_mask = np.zeros((height, width), dtype=np.uint8)
-        normalized_points = mask_info['points']
-        points = np.array([
-            [int(x * width), int(y * height)] 
-            for x, y in normalized_points
-        ], dtype=np.int32)
-        cv2.fillPoly(label_mask, [points], 255)
-        
+    if buffers is None:
+        buffers = SegmentBuffers()
+        buffers.prepare(predefined_masks, width, height)
+    
+    for class_id, label_mask in buffers.class_label_masks:
         # 겹침 정도 계산
-        overlap = cv2.bitwise_and(seg_mask, label_mask)
-        overlap_area = np.sum(overlap > 0)
+        overlap = cv2.bitwise_and(seg_mask, label_mask, dst=buffers.scratch)
+        overlap_area = cv2.countNonZero(overlap)
         
         if overlap_area > max_overlap:
             max_overlap = overlap_area
-            matching_class_id = mask_info['class_id']
+            matching_class_id = class_id
     
     return matching_class_id
 
-def draw_segmentation_contours(frame, results, predefined_masks):
-    """세그멘테이션 윤곽선만 그리기 (이탈 정도에 따라 색상 변경)"""
-    if not results or len(results) == 0:
-        return frame
-    
-    result = results[0]
-    height, width = frame.shape[:2]
-    
-    # 전체 라벨 영역 마스크 생성
+def build_label_mask(predefined_masks, width, height):
+    """전체 라벨 영역 마스크 생성"""
     label_mask = np.zeros((height, width), dtype=np.uint8)
     for mask_info in predefined_masks:
         normalized_points = mask_info['points']
@@ -262,72 +295,176 @@ def draw_segmentation_contours(frame, results, predefined_masks):
             for x, y in normalized_points
         ], dtype=np.int32)
         cv2.fillPoly(label_mask, [points], 255)
+    return label_mask
+
+class SegmentBuffers:
+    """
+    세그멘테이션 분석용 프레임 크기 작업 버퍼 (스트림/파이프라인마다 하나, 프레임마다 새로 할당하지 않는다)
+    라벨 마스크(전체/라벨별)는 라벨 목록이나 프레임 크기가 바뀔 때만 다시 만든다.
+    """
+
+    def __init__(self):
+        self.size = None
+        self.labels = None
+        self.label_count = 0
+        self.label_mask = None
+        self.class_label_masks = []
+        self.resized = None
+        self.binary = None
+        self.scratch = None
+
+    def prepare(self, predefined_masks, width, height):
+        if self.size != (width, height):
+            self.size = (width, height)
+            self.resized = np.empty((height, width), dtype=np.uint8)
+            self.binary = np.empty((height, width), dtype=np.uint8)
+            self.scratch = np.empty((height, width), dtype=np.uint8)
+            self.labels = None
+        # /labels/reload 는 새 리스트로 교체하므로 객체가 같고 개수도 같으면 그대로 사용
+        if self.labels is not predefined_masks or self.label_count != len(predefined_masks):
+            self.labels = predefined_masks
+            self.label_count = len(predefined_masks)
+            self.label_mask = build_label_mask(predefined_masks, width, height)
+            self.class_label_masks = [
+                (mask_info['class_id'], build_label_mask([mask_info], width, height))
+                for mask_info in predefined_masks
+            ]
+
+    def mask_to_frame(self, mask_np):
+        """0/1 추론 마스크 -> 프레임 크기 0/255 마스크 (self.binary 에 덮어쓴다)"""
+        width, height = self.size
+        resize_mask_to_frame(mask_np, width, height, dst=self.resized)
+        return cv2.compare(self.resized, 0, cv2.CMP_GT, dst=self.binary)
+
+def get_overstep_level(overstep_ratio):
+    """이탈 비율 -> 단계 (normal / warning / danger)"""
+    if overstep_ratio < 0.1:  # 10% 미만 이탈 - 정상
+        return "normal"
+    elif overstep_ratio < 0.3:  # 30% 미만 이탈 - 경고
+        return "warning"
+    return "danger"  # 30% 이상 이탈 - 위험
+
+def get_overstep_color(level, matching_class_id):
+    """이탈 단계에 따른 윤곽선 색상"""
+    if level == "normal":
+        if matching_class_id is not None:
+            # 해당 클래스 색상의 연한 버전
+            base_color = CLASS_COLORS.get(matching_class_id, (255, 255, 255))
+            return get_lighter_color(base_color)
+        return (128, 255, 128)  # 연한 초록
+    elif level == "warning":
+        return (0, 165, 255)  # 주황색
+    return (0, 0, 255)  # 빨간색
+
+def resize_mask_to_frame(masks, width, height, dst=None):
+    """
+    추론 해상도(레터박스 패딩 포함) 마스크를 프레임 크기로 변환
+    masks: (mh, mw) 또는 (mh, mw, n) - 채널 축으로 여러 개를 한 번에 확대
+    dst: 결과를 쓸 버퍼 (크기/타입이 맞으면 새로 할당하지 않음)
+    """
+    mask_h, mask_w = masks.shape[:2]
+    gain = min(mask_h / height, mask_w / width)
+    pad_x = (mask_w - width * gain) / 2
+    pad_y = (mask_h - height * gain) / 2
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    bottom, right = int(round(mask_h - pad_y + 0.1)), int(round(mask_w - pad_x + 0.1))
+    return cv2.resize(masks[top:bottom, left:right], (width, height), dst=dst)
+
+def analyze_segments(detections, predefined_masks, width, height, with_contours=True, buffers=None):
+    """
+    세그멘테이션별 이탈 비율/매칭 라벨 클래스 계산 (그리기 없음)
+    buffers: 스트림별 SegmentBuffers (없으면 이번 호출용으로 새로 만든다)
+    반환: 객체 순서(detections 와 동일)의 dict 리스트
+    """
+    segments = []
+    if detections is None or detections.masks is None:
+        return segments
     
-    # 세그멘테이션 결과 처리
-    if result.masks is not None:
-        for i, mask in enumerate(result.masks.data):
-            # 마스크를 numpy 배열로 변환
-            mask_np = mask.cpu().numpy()
-            mask_resized = cv2.resize(mask_np, (width, height))
-            mask_binary = (mask_resized > 0.5).astype(np.uint8) * 255
-            
-            # 이탈 정도 계산
-            overstep_ratio = calculate_overlap_and_overstep(mask_binary, label_mask)
-            
-            # 매칭되는 라벨 클래스 찾기
-            matching_class_id = find_matching_label_class(mask_binary, predefined_masks, width, height)
-            
-            # 이탈 정도에 따른 색상 결정
-            if overstep_ratio < 0.1:  # 10% 미만 이탈 - 정상
-                if matching_class_id is not None:
-                    # 해당 클래스 색상의 연한 버전
-                    base_color = CLASS_COLORS.get(matching_class_id, (255, 255, 255))
-                    color = get_lighter_color(base_color)
-                else:
-                    color = (128, 255, 128)  # 연한 초록
-            elif overstep_ratio < 0.3:  # 30% 미만 이탈 - 경고
-                color = (0, 165, 255)  # 주황색
-            else:  # 30% 이상 이탈 - 위험
-                color = (0, 0, 255)  # 빨간색
-            
+    if buffers is None:
+        buffers = SegmentBuffers()
+    buffers.prepare(predefined_masks, width, height)
+    
+    for mask_np in detections.masks:
+        # 0/1 마스크를 프레임 크기로 확대 (작업 버퍼 재사용)
+        mask_binary = buffers.mask_to_frame(mask_np)
+        
+        # 이탈 정도 계산
+        overstep_ratio = calculate_overlap_and_overstep(mask_binary, buffers.label_mask, buffers.scratch)
+        
+        # 매칭되는 라벨 클래스 찾기
+        matching_class_id = find_matching_label_class(mask_binary, predefined_masks, width, height, buffers)
+        
+        segment = {
+            'overstep_ratio': float(overstep_ratio),
+            'level': get_overstep_level(overstep_ratio),
+            'matching_class_id': matching_class_id,
+        }
+        if with_contours:
             # 윤곽선 찾기
-            contours, _ = cv2.findContours(mask_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # 윤곽선 그리기 (굵기 2)
-            cv2.drawContours(frame, contours, -1, color, 2)
+            segment['contours'], _ = cv2.findContours(mask_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        segments.append(segment)
+    
+    return segments
+
+def draw_segmentation_contours(frame, detections, predefined_masks, segments=None):
+    """세그멘테이션 윤곽선만 그리기 (이탈 정도에 따라 색상 변경)"""
+    if detections is None:
+        return frame
+    
+    height, width = frame.shape[:2]
+    if segments is None:
+        segments = analyze_segments(detections, predefined_masks, width, height)
+    
+    for segment in segments:
+        color = get_overstep_color(segment['level'], segment['matching_class_id'])
+        # 윤곽선 그리기 (굵기 2)
+        cv2.drawContours(frame, segment['contours'], -1, color, 2)
     
     return frame
 
-def draw_detection_info(frame, results):
+def detections_to_objects(detections, segments):
+    """객체별 결과 dict 리스트 (/predict 응답, 배치 처리 레코드 공통)"""
+    objects = []
+    for i, (box, class_id, confidence) in enumerate(zip(detections.xyxy.tolist(),
+                                                        detections.cls.tolist(),
+                                                        detections.conf.tolist())):
+        segment = segments[i] if i < len(segments) else None
+        objects.append({
+            "class_id": class_id,
+            "name": detections.names.get(class_id, f"Class_{class_id}"),
+            "confidence": round(confidence, 4),
+            "box": [round(v, 1) for v in box],
+            "overstep_ratio": round(segment['overstep_ratio'], 4) if segment else None,
+            "level": segment['level'] if segment else None,
+            "label_class_id": segment['matching_class_id'] if segment else None,
+        })
+    return objects
+
+def count_detected_objects(detections, min_confidence=None):
+    """
+    클래스명별 감지 개수 (오버레이 / 요약 API / 배치 결과가 같이 사용)
+    신뢰도 필터는 모델 호출(PREDICT_CONFIG)에서 이미 적용되므로 기본은 추가 필터 없음
+    """
+    if detections is None:
+        return {}
+    return count_classes(detections, min_confidence)
+
+def draw_detection_info(frame, detections, detected_objects=None):
     """상단에 감지된 객체 정보 표시 (박스 없이 텍스트만)"""
-    if not results or len(results) == 0:
+    if detections is None:
         return frame
     
-    result = results[0]
-    
     # 감지된 객체 정보 수집
-    detected_objects = {}
-    
-    if result.boxes is not None and len(result.boxes) > 0:
-        for box in result.boxes:
-            # 클래스 ID와 이름
-            class_id = int(box.cls[0])
-            class_name = result.names[class_id] if class_id in result.names else f"Class_{class_id}"
-            confidence = float(box.conf[0])
-            
-            # 신뢰도가 일정 이상인 것만 카운트
-            if confidence > 0.3:
-                if class_name not in detected_objects:
-                    detected_objects[class_name] = 0
-                detected_objects[class_name] += 1
+    if detected_objects is None:
+        detected_objects = count_detected_objects(detections)
     
     # 상단에 반투명 배경 그리기
     if detected_objects:
-        overlay = frame.copy()
         # 배경 높이 계산 (객체 개수에 따라)
         info_height = 40 + (len(detected_objects) * 35)
-        cv2.rectangle(overlay, (0, 0), (frame.shape[1], info_height), (0, 0, 0), -1)
-        frame = cv2.addWeighted(overlay, 0.6, frame, 0.4, 0)
+        # 검은 배경 60% 합성 = 해당 영역 밝기 40% (프레임 복사 없이 제자리에서)
+        banner = frame[:info_height + 1]  # cv2.rectangle 의 끝 좌표 포함
+        cv2.convertScaleAbs(banner, dst=banner, alpha=0.4)
         
         # 제목
         cv2.putText(frame, "Detected Objects:", (10, 30), 
@@ -361,14 +498,60 @@ def draw_detection_info(frame, results):
 def get_model():
     global model
     if model is None:
-        model = YOLO("best.pt") # model = YOLO("yolov8n.pt")
+        model = YOLO(MODEL_PATH) # model = YOLO("yolov8n.pt")
         # 앱 시작 시 클래스명 및 라벨 파일 로드
         load_class_names_from_yaml()
         load_label_files()
     return model
 
+def get_inference_pool():
+    """별도 프로세스 추론 워커 풀 (처음 호출 시 워커 시작)"""
+    global inference_pool
+    with inference_pool_lock:
+        if inference_pool is None:
+            inference_pool = InferencePool(
+                MODEL_PATH,
+                workers=INFERENCE_WORKERS,
+                slots=INFERENCE_SLOTS,
+                max_width=INFERENCE_MAX_WIDTH,
+                max_height=INFERENCE_MAX_HEIGHT,
+                mode="predict",
+                predict_kwargs=PREDICT_CONFIG[STREAM_NAME],
+            ).start()
+            # 웹 프로세스는 모델을 로딩하지 않으므로 클래스명/라벨만 여기서 로드
+            load_class_names_from_yaml()
+            load_label_files()
+    return inference_pool
+
+def run_inference(frame):
+    """프레임 추론 후 Detections 반환 (INFERENCE_WORKERS 설정에 따라 프로세스 내/워커 풀)"""
+    if INFERENCE_WORKERS > 0:
+        return get_inference_pool().infer(frame)
+    with model_lock:
+        return extract_detections(get_model()(frame, **PREDICT_CONFIG[STREAM_NAME])[0])
+
+def predict_batch(frames):
+    """
+    정지 이미지 여러 장 추론 (스트리밍과 같은 모델 / 모델 호출 인자)
+    워커 풀을 쓰면 웹 프로세스에 모델을 따로 올리지 않고 프레임을 워커 슬롯에 나눠 보낸다.
+    """
+    if INFERENCE_WORKERS > 0:
+        return get_inference_pool().infer_many(frames, return_exceptions=True)
+    with model_lock:
+        results = get_model()(frames, verbose=False, **PREDICT_CONFIG[STREAM_NAME])
+    return [extract_detections(result) for result in results]
+
+# /predict 요청 묶음 처리 (모델 호출은 전용 스레드 하나)
+predictor = BatchPredictor(predict_batch, max_batch=PREDICT_MAX_BATCH, max_wait=PREDICT_MAX_WAIT_MS / 1000,
+                           max_pixels=PREDICT_MAX_PIXELS)
+
 def create_video_capture():
     """비디오 캡처 객체 생성"""
+    if STREAM_BACKEND == "hls":
+        # 라이브 엣지부터 바로 시작, 연결 풀 재사용 (재연결 1초 이내)
+        from hls_ingest import HlsCapture
+        return HlsCapture(STREAM_URL)
+    
     cap = cv2.VideoCapture(STREAM_URL)
     
     # 버퍼 크기 최소화
@@ -386,7 +569,21 @@ def create_video_capture():
     
     return cap
 
-def gen_frames():
+def frame_part(jpeg, captured_at):
+    """
+    MJPEG 파트 하나 (X-Capture-Time: 프레임 캡처 시각, 종단 지연 측정용)
+    jpeg: bytes 또는 cv2.imencode 결과 버퍼 - 파트를 만들 때 한 번만 복사한다
+    """
+    header = (b'--frame\r\n'
+              b'Content-Type: image/jpeg\r\n'
+              b'X-Capture-Time: ' + f'{captured_at:.3f}'.encode() + b'\r\n\r\n')
+    return b''.join((header, jpeg, b'\r\n'))
+
+def capture_frames(pool):
+    """
+    스트림 연결/재연결을 처리하며 Packet(frame, captured_at) 생성 (파이프라인 캡처 단계)
+    pool: 스트림별 FramePool (프레임 버퍼 재사용)
+    """
     cap = None
     retry_count = 0
     max_retries = 3
@@ -409,6 +606,7 @@ def gen_frames():
                         logger.error("최대 재시도 횟수 초과")
                         break
                     time.sleep(2)  # 재연결 대기
+                    yield None  # 재시도 중에도 파이프라인 중지 요청 확인
                     continue
                 
                 logger.info("스트림 연결 성공")
@@ -416,7 +614,7 @@ def gen_frames():
                 consecutive_failures = 0
             
             # 프레임 읽기
-            ret, frame = cap.read()
+            ret, frame = pool.read(cap)
             
             if not ret:
                 consecutive_failures += 1
@@ -429,58 +627,109 @@ def gen_frames():
                     cap = None
                     consecutive_failures = 0
                     time.sleep(1)
+                yield None
                 continue
             
             # 프레임 읽기 성공
             consecutive_failures = 0
-            
-            try:
-                # ----------------------------
-                # 1. YOLOv8n 실시간 감지 (원본 프레임에서 먼저 실행)
-                # ----------------------------
-                results = get_model()(frame)
-                
-                # ----------------------------
-                # 2. 미리 정의된 라벨 영역을 클래스별 색상 박스로 그리기
-                # ----------------------------
-                frame, masks_info = draw_predefined_masks(frame)
-                
-                # ----------------------------
-                # 3. 세그멘테이션 윤곽선만 그리기 (이탈 정도에 따라 색상 변경)
-                # ----------------------------
-                frame = draw_segmentation_contours(frame, results, masks_info)
-                
-                # ----------------------------
-                # 4. 상단에 감지된 객체 정보 텍스트 표시
-                # ----------------------------
-                frame = draw_detection_info(frame, results)
-                
-                # JPEG 인코딩
-                ret_encode, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                
-                if not ret_encode:
-                    logger.warning("프레임 인코딩 실패")
-                    continue
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                
-            except Exception as e:
-                logger.error(f"프레임 처리 중 오류: {e}")
-                continue
-                
-    except GeneratorExit:
-        logger.info("클라이언트 연결 종료")
-    except Exception as e:
-        logger.error(f"스트리밍 중 오류 발생: {e}")
+            yield Packet(frame, time.time(), pool=pool)
     finally:
         # 리소스 정리
         if cap is not None:
             cap.release()
             logger.info("비디오 캡처 리소스 해제")
 
+def infer_stage(packet):
+    """1. YOLO 세그멘테이션 추론 (원본 프레임에서 먼저 실행)"""
+    packet.detections = run_inference(packet.frame)
+    return packet
+
+def postprocess_stage(packet, buffers):
+    """2. 클래스별 개수 집계 + 세그멘테이션별 이탈 분석 (그리기 없음, buffers: 스트림별 SegmentBuffers)"""
+    detections = packet.detections
+    packet.detected_objects = count_detected_objects(detections)
+    detection_summaries[STREAM_NAME] = {
+        "timestamp": packet.captured_at,
+        "total": int(len(detections.cls)),
+        "counts": packet.detected_objects,
+    }
+    
+    height, width = packet.frame.shape[:2]
+    packet.masks_info = predefined_masks
+    packet.segments = analyze_segments(detections, packet.masks_info, width, height, buffers=buffers)
+    return packet
+
+def render_stage(packet):
+    """3. 라벨 영역 / 세그멘테이션 윤곽선 / 상단 감지 정보 그리기"""
+    frame, _ = draw_predefined_masks(packet.frame)
+    frame = draw_segmentation_contours(frame, packet.detections, packet.masks_info, packet.segments)
+    packet.frame = draw_detection_info(frame, packet.detections, packet.detected_objects)
+    return packet
+
+def encode_stage(packet):
+    """4. JPEG 인코딩 -> MJPEG 파트 + 스냅샷 캐시 갱신 (캐시는 파트 안의 JPEG 를 복사 없이 참조)"""
+    ret_encode, buffer = cv2.imencode('.jpg', packet.frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    if not ret_encode:
+        logger.warning("프레임 인코딩 실패")
+        return None
+    packet.part = frame_part(buffer, packet.captured_at)
+    snapshot_cache.put(STREAM_NAME, memoryview(packet.part)[-2 - len(buffer):-2])
+    return packet
+
+def h264_stage(packet):
+    """5. 그려진 프레임을 H.264 로도 인코딩 (HLS 요청이 H264_IDLE_TIMEOUT 안에 있었을 때만, 끊기면 출력 세션 종료)"""
+    if time.time() - h264_last_request <= H264_IDLE_TIMEOUT:
+        get_h264_output().write(packet.frame, packet.captured_at)
+    elif h264_output is not None:
+        h264_output.close()
+    return packet
+
+def build_pipeline(cancel=None):
+    """
+    캡처 -> 추론 -> 후처리 -> 그리기 -> 인코딩 (-> H.264) (캡처 뒤에서만 오래된 프레임을 버려 라이브 유지)
+    프레임 버퍼 풀과 세그멘테이션 작업 버퍼는 파이프라인(스트림 연결)마다 하나씩
+    H264_OUTPUT 이면 MJPEG 와 같은 그려진 프레임을 H.264 단계에 넘긴다 (추론/그리기는 한 번)
+    cancel: 공유 생성기 중지 이벤트
+    """
+    pool = FramePool()
+    stages = [
+        Stage("infer", infer_stage, maxsize=PIPELINE_QUEUE_SIZE, policy="drop_oldest"),
+        Stage("postprocess", partial(postprocess_stage, buffers=SegmentBuffers()), maxsize=PIPELINE_QUEUE_SIZE),
+        Stage("render", render_stage, maxsize=PIPELINE_QUEUE_SIZE),
+        Stage("encode", encode_stage, maxsize=PIPELINE_QUEUE_SIZE),
+    ]
+    if H264_OUTPUT:
+        stages.append(Stage("h264", h264_stage, maxsize=PIPELINE_QUEUE_SIZE))
+    return FramePipeline(partial(capture_frames, pool), stages, name=f"pipeline-{STREAM_NAME}", cancel=cancel)
+
+def gen_frames(cancel=None):
+    pipeline = build_pipeline(cancel=cancel).start()
+    try:
+        for packet in pipeline:
+            yield packet.part
+    except Exception as e:
+        logger.error(f"스트리밍 중 오류 발생: {e}")
+    finally:
+        pipeline.close()
+        if h264_output is not None:
+            h264_output.close()  # 이번 세션 파일 삭제 -> 다시 시작하면 새 플레이리스트를 기다린다
+        logger.info("스트림 파이프라인 종료")
+
+def get_h264_output():
+    """H.264 출력 (처음 호출 시 생성, 작업 디렉토리는 첫 프레임을 쓸 때 만든다)"""
+    global h264_output
+    with h264_output_lock:
+        if h264_output is None:
+            h264_output = HlsOutput(segment_duration=H264_SEGMENT_DURATION, crf=H264_CRF)
+    return h264_output
+
+# 스트림당 파이프라인 하나 (/video_feed 시청자, /snapshot, /hls 가 같이 쓴다)
+snapshot_producer = SnapshotProducer(gen_frames, idle_timeout=H264_IDLE_TIMEOUT)
+
 @app.get("/init", response_class=HTMLResponse)
 def init():
+    hls_button = ("""<button class="button" onclick="location.href='/hls_viewer'">H.264 뷰어 (저대역폭)</button>"""
+                  if H264_OUTPUT else "")
     return """
     <html>
         <head>
@@ -515,15 +764,156 @@ def init():
                 <p><strong>상단 텍스트</strong>: 감지된 객체명과 개수 정보</p>
                 <button class="button" onclick="window.location.reload()">새로고침</button>
                 <button class="button" onclick="location.href='/labels/info'">라벨 정보</button>
+                {hls_button}
             </div>
             <img src="/video_feed" style='width:100%; max-width:1280px; border: 2px solid #333;'>
         </body>
     </html>
-    """
+    """.replace("{hls_button}", hls_button)
 
 @app.get("/video_feed")
 def video_feed():
-    return StreamingResponse(gen_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+    # 시청자마다 파이프라인을 돌리지 않고 공유 파이프라인의 프레임을 받아 간다
+    return StreamingResponse(snapshot_producer.viewer(),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
+
+@app.on_event("shutdown")
+def shutdown_inference_pool():
+    """앱 종료 시 추론 워커와 공유 메모리 정리"""
+    if inference_pool is not None:
+        inference_pool.close()
+
+@app.on_event("shutdown")
+def shutdown_h264_output():
+    """H.264 출력 컨테이너 마무리 및 작업 디렉토리 삭제"""
+    if h264_output is not None:
+        h264_output.cleanup()
+
+@app.on_event("shutdown")
+def shutdown_predictor():
+    predictor.close()
+
+@app.get("/snapshot")
+def snapshot(request: Request, stream: str = STREAM_NAME, rendition: str = "full"):
+    """가장 최근에 인코딩된 주석 프레임 (ETag / Last-Modified 조건부 GET 지원)"""
+    if stream != STREAM_NAME:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    if rendition not in RENDITIONS:
+        raise HTTPException(status_code=400, detail=f"렌디션은 {list(RENDITIONS)} 중 하나")
+    
+    snap = snapshot_cache.get(stream, rendition)
+    # 시청자가 없어서 캐시가 비었거나 오래됐으면 백그라운드 생성기를 돌려서 채운다
+    if snapshot_producer.running or snap is None or snap.age() > SNAPSHOT_MAX_AGE:
+        snapshot_producer.touch()
+    if snap is None:
+        snap = snapshot_cache.wait(stream, rendition, timeout=10.0)
+    if snap is None:
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    
+    headers = {
+        "ETag": snap.etag,
+        "Last-Modified": snap.last_modified,
+        "Cache-Control": "no-cache",
+    }
+    if snap.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snap.body, media_type="image/jpeg", headers=headers)
+
+@app.get("/hls/{filename}")
+def hls_file(filename: str):
+    """H.264 fMP4 HLS 출력 (index.m3u8 / init.mp4 / seg_NNNNN.m4s) - 요청이 오면 공유 인코딩 시작"""
+    if not H264_OUTPUT:
+        raise HTTPException(status_code=404, detail="H.264 출력이 꺼져 있습니다 (H264_OUTPUT=1)")
+    if not HlsOutput.valid_name(filename):
+        raise HTTPException(status_code=404, detail=f"알 수 없는 파일: {filename}")
+    
+    global h264_last_request
+    h264_last_request = time.time()
+    output = get_h264_output()
+    snapshot_producer.touch()
+    if filename == PLAYLIST_NAME and not output.wait_ready(timeout=15.0):
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    path = output.path(filename)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail=f"만료되었거나 아직 없는 세그먼트: {filename}")
+    
+    # 플레이리스트는 매번 새로, 세그먼트는 내용이 바뀌지 않으므로 캐시 허용
+    cache_control = "no-cache" if filename == PLAYLIST_NAME else "max-age=60"
+    return FileResponse(path, media_type=MEDIA_TYPES[path.suffix], headers={"Cache-Control": cache_control})
+
+@app.get("/hls_viewer", response_class=HTMLResponse)
+def hls_viewer():
+    """H.264 HLS 뷰어 (Safari 는 기본 재생, 그 외 브라우저는 hls.js)"""
+    if not H264_OUTPUT:
+        raise HTTPException(status_code=404, detail="H.264 출력이 꺼져 있습니다 (H264_OUTPUT=1)")
+    return """
+    <html>
+        <head>
+            <title>Stream Viewer (H.264)</title>
+            <script src="https://cdn.jsdelivr.net/npm/hls.js@1"></script>
+        </head>
+        <body style="margin: 0; padding: 20px; font-family: Arial, sans-serif;">
+            <h1>YOLO 세그멘테이션 스트림 뷰어 (H.264)</h1>
+            <video id="video" muted autoplay playsinline controls style='width:100%; max-width:1280px; border: 2px solid #333;'></video>
+            <script>
+                const video = document.getElementById('video');
+                const src = '/hls/index.m3u8';
+                if (video.canPlayType('application/vnd.apple.mpegurl')) {
+                    video.src = src;
+                } else if (Hls.isSupported()) {
+                    const hls = new Hls({ liveSyncDurationCount: 2 });
+                    hls.loadSource(src);
+                    hls.attachMedia(video);
+                }
+            </script>
+        </body>
+    </html>
+    """
+
+@app.post("/predict")
+def predict(files: List[UploadFile] = File(...)):
+    """
+    정지 이미지(한 장 또는 여러 장, multipart "files") 세그멘테이션 + 라벨 영역 이탈 판정
+    다른 요청과 같은 모델 배치로 묶여서 처리된다.
+    """
+    datas = [upload.file.read() for upload in files]
+    try:
+        frames = predictor.decode(datas)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"이미지로 읽을 수 없는 파일: {files[e.index].filename}")
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"이미지가 너무 큽니다 ({e.width}x{e.height}, "
+                                                    f"최대 {PREDICT_MAX_PIXELS} 픽셀): {files[e.index].filename}")
+    try:
+        detections_list = predictor.predict(frames)
+    except ImagePredictError as e:
+        # 추론 워커가 바쁘면 503, 그 밖의 실패는 500 (어느 파일인지 알려 준다)
+        status = 503 if isinstance(e.error, TimeoutError) else 500
+        raise HTTPException(status_code=status, detail=f"추론 실패: {files[e.index].filename}: {e.error}")
+    
+    results = []
+    for upload, frame, detections in zip(files, frames, detections_list):
+        height, width = frame.shape[:2]
+        # 라벨 영역(정규화 좌표)을 이미지 크기에 맞춰 이탈 판정
+        segments = analyze_segments(detections, predefined_masks, width, height, with_contours=False)
+        results.append({
+            "filename": upload.filename,
+            "width": width,
+            "height": height,
+            "counts": count_detected_objects(detections),
+            "objects": detections_to_objects(detections, segments),
+        })
+    return {"results": results}
+
+@app.get("/detections/summary")
+def detections_summary(stream: str = STREAM_NAME):
+    """최근 처리한 프레임의 클래스별 감지 개수"""
+    if stream != STREAM_NAME:
+        raise HTTPException(status_code=404, detail=f"알 수 없는 스트림: {stream}")
+    summary = detection_summaries.get(stream)
+    if summary is None:
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    return {"stream": stream, "predict_config": PREDICT_CONFIG[stream], **summary}
 
 @app.get("/labels/info")
 def labels_info():
@@ -0,0 +1,237 @@
+"""
+최신 주석 프레임(JPEG) 메모리 캐시 (/snapshot 용)
+
+- gen_frames() 가 인코딩한 JPEG 를 스트림별로 보관 (새 프레임마다 교체)
+- 축소 렌디션(small / thumb)은 요청이 올 때 한 번만 만들어서 같은 프레임 동안 재사용
+- ETag / Last-Modified 값을 같이 보관해서 조건부 GET(304) 처리
+  ETag 에는 캐시(프로세스)마다 다른 값을 넣어서, 재시작 후 프레임 번호가 겹쳐도 이전 ETag 와 일치하지 않는다.
+- 프레임 생성기는 스트림당 하나만 돌리고 /video_feed 시청자는 그 출력을 나눠 받는다 (시청자도 스냅샷 요청도 없으면 멈춘다)
+"""
+import logging
+import secrets
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 렌디션 이름 -> 최대 너비 (None 이면 원본 그대로)
+RENDITIONS = {
+    "full": None,
+    "small": 640,
+    "thumb": 320,
+}
+RENDITION_JPEG_QUALITY = 75
+
+
+class Snapshot:
+    """캐시된 JPEG 하나"""
+    __slots__ = ("body", "etag", "timestamp")
+
+    def __init__(self, body, etag, timestamp):
+        self.body = body
+        self.etag = etag
+        self.timestamp = timestamp
+
+    @property
+    def last_modified(self):
+        return formatdate(self.timestamp, usegmt=True)
+
+    def age(self):
+        return time.time() - self.timestamp
+
+    def not_modified(self, if_none_match=None, if_modified_since=None):
+        """조건부 GET 헤더 기준으로 304 를 돌려줘도 되는지"""
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.timestamp) <= int(since)
+        return False
+
+
+class _Entry:
+    __slots__ = ("seq", "jpeg", "timestamp", "renditions")
+
+    def __init__(self):
+        self.seq = 0
+        self.jpeg = None
+        self.timestamp = 0.0
+        self.renditions = {}
+
+
+class SnapshotCache:
+    """스트림별 최신 JPEG 캐시 (스레드 안전)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._cond = threading.Condition()
+        self._nonce = secrets.token_hex(4)  # 프로세스 재시작마다 달라지는 ETag 접두어
+
+    def put(self, stream, jpeg):
+        """
+        새로 인코딩된 JPEG 등록 (bytes 또는 읽기 전용 memoryview)
+        복사하지 않고 참조만 보관 -> 실제 bytes 변환은 스냅샷 요청이 올 때 프레임당 한 번
+        """
+        with self._cond:
+            entry = self._entries.get(stream)
+            if entry is None:
+                entry = self._entries[stream] = _Entry()
+            entry.seq += 1
+            entry.jpeg = jpeg
+            entry.timestamp = time.time()
+            entry.renditions = {}
+            self._cond.notify_all()
+
+    def get(self, stream, rendition="full"):
+        """최신 스냅샷 (없으면 None)"""
+        with self._cond:
+            entry = self._entries.get(stream)
+            if entry is None or entry.jpeg is None:
+                return None
+            seq, jpeg, timestamp = entry.seq, entry.jpeg, entry.timestamp
+            cached = entry.renditions.get(rendition)
+
+        if cached is None:
+            cached = self._render(jpeg, rendition)
+            with self._cond:
+                # 그 사이 새 프레임이 들어왔으면 캐시하지 않음
+                if entry.seq == seq:
+                    entry.renditions[rendition] = cached
+        return Snapshot(cached, f'"{self._nonce}-{stream}-{rendition}-{seq}"', timestamp)
+
+    def wait(self, stream, rendition="full", timeout=5.0, max_age=None):
+        """조건에 맞는 스냅샷이 생길 때까지 최대 timeout 초 대기"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                entry = self._entries.get(stream)
+                if entry is not None and entry.jpeg is not None:
+                    if max_age is None or time.time() - entry.timestamp <= max_age:
+                        break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        return self.get(stream, rendition)
+
+    @staticmethod
+    def _render(jpeg, rendition):
+        max_width = RENDITIONS[rendition]
+        if max_width is None:
+            return bytes(jpeg)
+        image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        height, width = image.shape[:2]
+        if width <= max_width:
+            return bytes(jpeg)
+        size = (max_width, int(height * max_width / width))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, RENDITION_JPEG_QUALITY])
+        return buffer.tobytes() if ok else bytes(jpeg)
+
+
+class SnapshotProducer:
+    """
+    스트림당 하나만 도는 공유 프레임 생성기 (/video_feed 시청자, /snapshot, 그 밖의 백그라운드 출력이 같이 쓴다)
+    - gen_factory(cancel): cancel 이벤트가 set 되면 (프레임이 안 나와도) 끝나는 프레임 생성기
+    - viewer() 시청자는 자기 파이프라인을 돌리지 않고 이 생성기의 최신 프레임을 받아 간다
+      (시청자마다 파이프라인이 돌면 영역 진입/히트맵/체류 시간 같은 상태가 시청자 수만큼 갱신된다)
+    - 시청자가 없고 마지막 touch() 후 idle_timeout 초가 지나면 멈춘다 (프레임 도착과 무관하게 check_interval 마다 확인)
+    - 느린 시청자는 밀린 프레임을 건너뛰고 최신 프레임부터 받는다
+    name: 로그/스레드 이름
+    """
+
+    def __init__(self, gen_factory, idle_timeout=30.0, name="snapshot", check_interval=1.0):
+        self.gen_factory = gen_factory
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self.check_interval = check_interval
+        self._last_request = 0.0
+        self._viewers = 0
+        self._cancel = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._frame_cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def viewers(self):
+        return self._viewers
+
+    def touch(self):
+        """요청이 있었음을 알리고, 생성기가 안 돌고 있으면 시작"""
+        with self._lock:
+            self._last_request = time.time()
+            self._ensure_running()
+
+    def _ensure_running(self):
+        """lock 잡고 호출 - 멈추는 중인 생성기가 끝나기 전에는 새로 띄우지 않는다 (파이프라인 중복 방지)"""
+        if self.running:
+            return
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._cancel,), daemon=True,
+                                        name=f"{self.name}-producer")
+        self._thread.start()
+
+    def viewer(self):
+        """시청자 스트림: 공유 생성기의 새 프레임을 차례로 돌려준다 (연결이 끊기면 생성기에서 빠진다)"""
+        with self._lock:
+            self._viewers += 1
+            self._ensure_running()
+        try:
+            seq = self._seq
+            while True:
+                with self._frame_cond:
+                    if self._seq == seq:
+                        self._frame_cond.wait(self.check_interval)
+                    if self._seq == seq:
+                        frame = None
+                    else:
+                        seq, frame = self._seq, self._frame
+                if frame is None:
+                    with self._lock:
+                        self._ensure_running()  # 멈추는 중이었으면 끝난 뒤 다시 시작
+                    continue
+                yield frame
+        finally:
+            with self._lock:
+                self._viewers -= 1
+
+    def _idle(self):
+        return self._viewers == 0 and time.time() - self._last_request > self.idle_timeout
+
+    def _run(self, cancel):
+        logger.info(f"{self.name} 공유 프레임 생성 시작")
+        frames = self.gen_factory(cancel)
+        consumer = threading.Thread(target=self._consume, args=(frames,), daemon=True,
+                                    name=f"{self.name}-producer-frames")
+        consumer.start()
+        while consumer.is_alive():
+            consumer.join(self.check_interval)
+            if not cancel.is_set() and self._idle():
+                cancel.set()
+        logger.info(f"{self.name} 공유 프레임 생성 종료")
+
+    def _consume(self, frames):
+        try:
+            for frame in frames:
+                with self._frame_cond:
+                    self._frame = frame
+                    self._seq += 1
+                    self._frame_cond.notify_all()
+        except Exception as e:
+            logger.error(f"{self.name} 프레임 생성 오류: {e}")
+        finally:
+            frames.close()